@@ -4,81 +4,347 @@ Simple API Client for GET, POST, and DELETE requests
 Easily configurable base URL and endpoints
 """
 
+import functools
 import requests
 import json
-from typing import Optional, Dict, Any
+import time
+from typing import Optional, Dict, Any, Iterable
+
+from instrumentation import Instrumentation
+from resilience import Resilience
+from response_cache import ResponseCache
+from session_log import SessionLogger
+from transport import Transport, Timeout, get_shared_transport
+from utterance_cache import UtteranceCache
 
 
 class APIClient:
-    def __init__(self, base_url: str):
+    def __init__(self, base_url: str, transport: Optional[Transport] = None,
+                 quiet: bool = False, instrumentation: Optional[Instrumentation] = None,
+                 session_log: Optional[SessionLogger] = None,
+                 cache: Optional[ResponseCache] = None,
+                 utterances: Optional[UtteranceCache] = None,
+                 resilience: Optional[Resilience] = None):
         """
         Initialize the API client with a base URL
 
         Args:
             base_url: Base IP address or URL (e.g., 'http://192.168.1.1:8000')
+            transport: Connection pool to send requests through
+                       (defaults to a keep-alive pool shared by all clients)
+            quiet: Don't print each request or response (errors are still printed)
+            instrumentation: Collects per-endpoint counters and latency histograms
+            session_log: Records every request, plus recording and transcription events
+                         from the audio helpers (adds instrumentation if none is given)
+            cache: Serves repeated GETs of slow-changing endpoints from memory
+            utterances: Lets speak() play pre-rendered audio for phrases it has seen before
+            resilience: Adaptive timeouts, hedged GETs and a circuit breaker, so slow outliers
+                        and an unreachable robot don't stall the caller
         """
         self.base_url = base_url.rstrip('/')
         self.headers = {
             'Content-Type': 'application/json'
         }
+        self.transport = transport if transport is not None else get_shared_transport()
+        self.quiet = quiet
+        self.instrumentation = instrumentation
+        self.session_log = session_log
+        self.cache = cache
+        self.utterances = utterances
+        self.resilience = resilience
+        if session_log is not None:
+            if self.instrumentation is None:
+                self.instrumentation = Instrumentation()
+            self.instrumentation.add_hook(session_log.log_request)
+
+    def log(self, message: str):
+        """
+        Print a progress message unless the client is quiet
+
+        Args:
+            message: Text to print
+        """
+        if not self.quiet:
+            print(message)
+
+    def log_event(self, event: str, **fields):
+        """
+        Record an event in the session log, if the client has one
 
-    def get(self, endpoint: str, params: Optional[Dict[str, Any]] = None) -> requests.Response:
+        Args:
+            event: Event name
+            **fields: JSON-serializable details
+        """
+        if self.session_log is not None:
+            self.session_log.log(event, **fields)
+
+    def request(self, method: str, endpoint: str, cached: bool = True, **kwargs) -> requests.Response:
+        """
+        Send a request and record it with the client's instrumentation
+
+        GETs of endpoints the client's cache has a TTL for may be answered from the
+        cache; a request that changes a cached listing (upload, delete, capture, ...) drops it first.
+
+        Args:
+            method: HTTP verb
+            endpoint: API endpoint
+            cached: Allow a GET to be answered from the cache (False always asks the robot)
+            **kwargs: Passed to Transport.request (params, json, headers, timeout, stream, ...)
+
+        Returns:
+            Response object (shared with other callers when it comes from the cache)
+        """
+        cache = self.cache
+        if cache is None:
+            return self._send(method, endpoint, **kwargs)
+        if cached and method == "GET" and not kwargs.get("stream") and cache.cacheable(endpoint):
+            return self._cached_get(endpoint, **kwargs)
+        # Before sending, so nothing cached serves the old state while this is in flight, and again
+        # after, for a GET answered in the meantime (or that started before and lands after)
+        body = kwargs.get("json")
+        body = body if isinstance(body, dict) else None
+        cache.invalidate_for(method, endpoint, body)
+        try:
+            return self._send(method, endpoint, **kwargs)
+        finally:
+            # Even a failed request may have reached the robot
+            cache.invalidate_for(method, endpoint, body)
+
+    def _cached_get(self, endpoint: str, **kwargs) -> requests.Response:
+        key = self.cache.key(endpoint, kwargs.get("params"))
+        generation = self.cache.generation
+        cached, conditional = self.cache.lookup(key)
+        if cached is not None:
+            if not self.quiet:
+                print(f"GET {self.base_url}{endpoint} (cached)")
+            return cached
+
+        headers = kwargs.get("headers") or self.headers
+        if conditional:
+            kwargs["headers"] = {**headers, **conditional}
+        response = self._send("GET", endpoint, **kwargs)
+        if response.status_code == 304:
+            cached = self.cache.revalidate(key)
+            if cached is not None:
+                return cached
+            # Invalidated while the request was in flight; fetch the full body
+            kwargs["headers"] = headers
+            response = self._send("GET", endpoint, **kwargs)
+        self.cache.store(key, response, generation)
+        return response
+
+    def _send(self, method: str, endpoint: str, **kwargs) -> requests.Response:
+        url = f"{self.base_url}{endpoint}"
+        if not self.quiet:
+            print(f"{method} {url}")
+        kwargs.setdefault("headers", self.headers)
+        if self.resilience is not None:
+            send = functools.partial(self.resilience.send, self.transport, method, url, endpoint)
+        else:
+            send = functools.partial(self.transport.request, method, url)
+        if self.instrumentation is None:
+            return send(**kwargs)
+
+        try:
+            response = send(**kwargs)
+        except requests.RequestException as e:
+            self.instrumentation.record(method, endpoint, error=str(e))
+            raise
+        self.instrumentation.record(method, endpoint, response.status_code, response.timing)
+        return response
+
+    def get(self, endpoint: str, params: Optional[Dict[str, Any]] = None,
+            timeout: Optional[Timeout] = None, cached: bool = True) -> requests.Response:
         """
         Send a GET request
 
         Args:
             endpoint: API endpoint (e.g., '/users' or '/api/data')
             params: Optional query parameters
+            timeout: Optional per-call deadline in seconds or (connect, read)
+            cached: Allow the answer to come from the client's response cache
 
         Returns:
             Response object
         """
-        url = f"{self.base_url}{endpoint}"
-        print(f"GET {url}")
-        response = requests.get(url, params=params, headers=self.headers)
-        return response
+        return self.request("GET", endpoint, cached=cached, params=params, timeout=timeout)
 
-    def post(self, endpoint: str, data: Optional[Dict[str, Any]] = None) -> requests.Response:
+    def post(self, endpoint: str, data: Optional[Dict[str, Any]] = None,
+             timeout: Optional[Timeout] = None) -> requests.Response:
         """
         Send a POST request
 
         Args:
             endpoint: API endpoint
             data: Data to send in request body
+            timeout: Optional per-call deadline in seconds or (connect, read)
 
         Returns:
             Response object
         """
-        url = f"{self.base_url}{endpoint}"
-        print(f"POST {url}")
-        response = requests.post(url, json=data, headers=self.headers)
-        return response
+        return self.request("POST", endpoint, json=data, timeout=timeout)
 
-    def delete(self, endpoint: str, params: Optional[Dict[str, Any]] = None) -> requests.Response:
+    def delete(self, endpoint: str, params: Optional[Dict[str, Any]] = None,
+               timeout: Optional[Timeout] = None) -> requests.Response:
         """
         Send a DELETE request
 
         Args:
             endpoint: API endpoint
             params: Optional query parameters
+            timeout: Optional per-call deadline in seconds or (connect, read)
 
         Returns:
             Response object
         """
-        url = f"{self.base_url}{endpoint}"
-        print(f"DELETE {url}")
-        response = requests.delete(url, params=params, headers=self.headers)
+        return self.request("DELETE", endpoint, params=params, timeout=timeout)
+
+    def speak(self, text: str, timeout: Optional[Timeout] = None, **voice) -> requests.Response:
+        """
+        Say a phrase, from the utterance cache if it has been rendered before
+
+        A cached phrase is started with /api/audio/play, which skips synthesis on the robot
+        and sounds the same every time; anything else goes through live TTS (and, with
+        warm_on_miss, is saved on the robot while it is spoken).
+
+        Args:
+            text: Text to speak
+            timeout: Optional per-call deadline in seconds or (connect, read)
+            **voice: Voice settings (Voice, Pitch, SpeechRate, Language)
+
+        Returns:
+            Response object from /api/audio/play or /api/tts/speak
+        """
+        utterances = self.utterances
+        if utterances is None:
+            return self.post("/api/tts/speak", data={"Text": text, **voice}, timeout=timeout)
+
+        filename = utterances.filename(text, voice)
+        if utterances.lookup(filename):
+            response = self.post("/api/audio/play", data={"FileName": filename}, timeout=timeout)
+            if response.status_code != 404:
+                if response.ok:
+                    utterances.record_hit()
+                self.log_event("speak", text=text, cached=True, file=filename)
+                return response
+            # Deleted on the robot since it was listed; speak it live (and re-render it)
+            utterances.forget(filename)
+
+        body = utterances.speak_params(text, voice)
+        render = utterances.warm_on_miss and utterances.claim(filename)
+        if render:
+            body.update({"UtteranceId": filename[:-len(".wav")], "SaveToFile": True})
+        try:
+            response = self.post("/api/tts/speak", data=body, timeout=timeout)
+        except requests.RequestException:
+            if render:
+                utterances.release(filename)
+            raise
+        if render:
+            if response.ok:
+                # The robot writes the file after speaking; watch for it off the caller's thread
+                utterances.watch(self.confirm_utterances)
+            else:
+                utterances.release(filename)
+        self.log_event("speak", text=text, cached=False, file=filename if render else None)
         return response
 
-    def print_response(self, response: requests.Response):
+    def refresh_utterances(self) -> Optional[int]:
+        """
+        Re-read which utterances are rendered on the robot
+
+        Returns:
+            Number of rendered utterances, or None if the listing failed
+        """
+        # Bypass the response cache: a listing cached before a render would hide the new file
+        response = self._send("GET", "/api/audio/list")
+        if not response.ok:
+            print(f"Error: Failed to list audio (Status: {response.status_code})")
+            return None
+        listing = response.json()
+        if isinstance(listing, dict):
+            listing = listing.get("result") or []
+        return self.utterances.load_listing(listing)
+
+    def confirm_utterances(self, timeout: Optional[float] = None, interval: float = 0.25) -> bool:
+        """
+        Wait for every pending render to show up in the robot's audio listing
+
+        Args:
+            timeout: Seconds after its render request each file may take to appear (defaults to
+                     the cache's confirm_timeout_s); renders still missing after that are given up
+            interval: Seconds between listings
+
+        Returns:
+            True if every pending render showed up
+        """
+        utterances = self.utterances
+        timeout = utterances.confirm_timeout_s if timeout is None else timeout
+        missing = set()
+        while utterances.pending():
+            try:
+                self.refresh_utterances()
+            except requests.RequestException as e:
+                self.log(f"Utterance listing failed: {e}")
+            missing |= utterances.expire(timeout)
+            if not utterances.pending():
+                break
+            time.sleep(interval)
+        return not missing
+
+    def warm_utterances(self, phrases: Iterable[str], wait: bool = True, **voice) -> int:
+        """
+        Render phrases that aren't on the robot yet (call before the session starts)
+
+        Rendering goes through /api/tts/speak with SaveToFile, so on a robot that plays
+        speech while saving it each new phrase is heard once.
+
+        Args:
+            phrases: Texts to render
+            wait: Block until the robot has saved them (or confirm_timeout_s runs out)
+            **voice: Voice settings (Voice, Pitch, SpeechRate, Language)
+
+        Returns:
+            Number of phrases sent for rendering
+        """
+        utterances = self.utterances
+        self.refresh_utterances()
+        rendered = 0
+        for text in phrases:
+            filename = utterances.filename(text, voice)
+            if not utterances.claim(filename):
+                continue
+            body = utterances.speak_params(text, voice)
+            body.update({"UtteranceId": filename[:-len(".wav")], "SaveToFile": True, "Flush": False})
+            try:
+                response = self.post("/api/tts/speak", data=body)
+            except requests.RequestException as e:
+                print(f"Error: Failed to render {text!r}: {e}")
+                utterances.release(filename)
+                continue
+            if not response.ok:
+                print(f"Error: Failed to render {text!r} (Status: {response.status_code})")
+                utterances.release(filename)
+                continue
+            rendered += 1
+        if wait and rendered:
+            self.confirm_utterances()
+        self.log(f"Utterance cache: {rendered} rendered, {utterances.stats()['ready']} ready")
+        return rendered
+
+    def print_response(self, response: requests.Response, headers: bool = True):
         """
-        Pretty print the response
+        Pretty print the response (does nothing when the client is quiet)
 
         Args:
             response: Response object to print
+            headers: Also print the response headers
         """
+        if self.quiet:
+            return
         print(f"Status Code: {response.status_code}")
-        print(f"Headers: {dict(response.headers)}")
+        if headers:
+            print(f"Headers: {dict(response.headers)}")
         try:
             print(f"Response Body:\n{json.dumps(response.json(), indent=2)}")
         except json.JSONDecodeError:
@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+Incremental, parallel upload of local audio clips and images to Misty
+Hashes local files, compares them with the robot's listings and a manifest of earlier
+uploads, streams only new or changed files, and can delete assets that are no longer wanted
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Any, List, Tuple
+
+from audio_api_client import APIClient, file_sha256
+from recording_sync import recording_name, recording_size
+
+MANIFEST_NAME = ".asset_manifest.json"
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# Asset kind -> (listing endpoint, upload/delete endpoint, file extensions)
+ASSET_KINDS: Dict[str, Tuple[str, str, Tuple[str, ...]]] = {
+    "audio": ("/api/audio/list", "/api/audio", (".wav", ".mp3", ".wma", ".aac")),
+    "images": ("/api/images/list", "/api/images", (".jpg", ".jpeg", ".png", ".gif")),
+}
+
+
+class MultipartFileBody:
+    """
+    multipart/form-data body that reads the file as it is sent
+
+    Has a length, so requests sends a Content-Length instead of chunked encoding,
+    and is read in blocks by the connection, so the file is never held in memory.
+    """
+
+    def __init__(self, path: str, fields: Dict[str, str], file_field: str = "File",
+                 filename: Optional[str] = None, content_type: str = "application/octet-stream"):
+        self.boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={self.boundary}"
+        head = b"".join(
+            f'--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+            for name, value in fields.items()
+        )
+        head += (f'--{self.boundary}\r\nContent-Disposition: form-data; name="{file_field}"; '
+                 f'filename="{filename or os.path.basename(path)}"\r\n'
+                 f'Content-Type: {content_type}\r\n\r\n').encode()
+        self._parts = [head, None, f"\r\n--{self.boundary}--\r\n".encode()]
+        self._path = path
+        self._file = None
+        self._part = 0
+        self._offset = 0
+        self.length = len(head) + os.path.getsize(path) + len(self._parts[2])
+
+    def __len__(self) -> int:
+        return self.length
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = self.length
+        out = []
+        while size > 0 and self._part < 3:
+            if self._part == 1:
+                if self._file is None:
+                    self._file = open(self._path, 'rb')
+                block = self._file.read(min(size, UPLOAD_CHUNK_SIZE))
+                if not block:
+                    self._file.close()
+                    self._part += 1
+                    continue
+            else:
+                part = self._parts[self._part]
+                block = part[self._offset:self._offset + size]
+                self._offset += len(block)
+                if self._offset >= len(part):
+                    self._part += 1
+                    self._offset = 0
+            out.append(block)
+            size -= len(block)
+        return b"".join(out)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+@dataclass
+class AssetSyncSummary:
+    uploaded: List[str] = field(default_factory=list)
+    skipped: List[str] = field(default_factory=list)
+    deleted: List[str] = field(default_factory=list)
+    failed: List[str] = field(default_factory=list)
+    bytes_moved: int = 0
+    elapsed_s: float = 0.0
+
+    def __str__(self) -> str:
+        mb = self.bytes_moved / (1024 * 1024)
+        rate = mb / self.elapsed_s if self.elapsed_s > 0 else 0.0
+        return (f"{len(self.uploaded)} uploaded ({mb:.2f} MB), {len(self.skipped)} unchanged, "
+                f"{len(self.deleted)} deleted, {len(self.failed)} failed "
+                f"in {self.elapsed_s:.2f}s ({rate:.2f} MB/s)")
+
+
+class AssetSync:
+    def __init__(self, client: APIClient, asset_dir: str = "./assets", max_workers: int = 4,
+                 delete_stale: bool = False, delete_unmanaged: bool = False):
+        """
+        Initialize an uploader for one local asset folder
+
+        Files are classed as audio or images by extension (see ASSET_KINDS) and uploaded
+        under their file names. The manifest in the folder remembers the hash of what was
+        uploaded to each robot, so a file is re-sent only if its contents change or the
+        robot no longer has it.
+
+        Args:
+            client: Client for the robot to push assets to
+            asset_dir: Directory of assets (audio/ and images/ subfolders are included)
+            max_workers: Number of uploads in flight at once
+            delete_stale: Delete assets this folder uploaded earlier that are no longer in it
+            delete_unmanaged: With delete_stale, also delete any other non-system asset on the
+                              robot that isn't in the folder (e.g. to reset between study conditions)
+        """
+        self.client = client
+        self.asset_dir = asset_dir
+        self.max_workers = max_workers
+        self.delete_stale = delete_stale
+        self.delete_unmanaged = delete_unmanaged
+        self.manifest_path = os.path.join(asset_dir, MANIFEST_NAME)
+        self.manifest: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def load_manifest(self):
+        """
+        Load this robot's entries from the manifest of earlier uploads
+        """
+        try:
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            manifest = {}
+        self.manifest = manifest.get(self.client.base_url, {})
+
+    def save_manifest(self):
+        """
+        Write this robot's entries into the manifest atomically, keeping other robots' entries
+        """
+        try:
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            manifest = {}
+        manifest[self.client.base_url] = self.manifest
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def local_assets(self) -> Dict[str, Dict[str, str]]:
+        """
+        Find the local assets to push
+
+        Returns:
+            Kind -> {asset name: local path}
+        """
+        assets: Dict[str, Dict[str, str]] = {kind: {} for kind in ASSET_KINDS}
+        for root in (self.asset_dir, *(os.path.join(self.asset_dir, kind) for kind in ASSET_KINDS)):
+            if not os.path.isdir(root):
+                continue
+            for entry in os.scandir(root):
+                if not entry.is_file():
+                    continue
+                extension = os.path.splitext(entry.name)[1].lower()
+                for kind, (_, _, extensions) in ASSET_KINDS.items():
+                    if extension in extensions:
+                        assets[kind][entry.name] = entry.path
+        return assets
+
+    def remote_assets(self, kind: str) -> Optional[Dict[str, Dict[str, Any]]]:
+        """
+        List the assets of one kind on the robot
+
+        Args:
+            kind: 'audio' or 'images'
+
+        Returns:
+            Asset name -> {"size": ..., "system": ...}, or None if the listing failed
+        """
+        response = self.client.get(ASSET_KINDS[kind][0])
+        if not response.ok:
+            print(f"Error: Failed to list {kind} (Status: {response.status_code})")
+            return None
+        listing = response.json()
+        if isinstance(listing, dict):
+            listing = listing.get("result") or []
+        remote = {}
+        for item in listing:
+            name = recording_name(item)
+            if name:
+                system = bool(item.get("systemAsset")) if isinstance(item, dict) else False
+                remote[name] = {"size": recording_size(item), "system": system}
+        return remote
+
+    def upload(self, kind: str, path: str, name: Optional[str] = None) -> bool:
+        """
+        Stream one file to the robot, replacing any asset with the same name
+
+        Args:
+            kind: 'audio' or 'images'
+            path: Local file
+            name: Name to store it under on the robot (defaults to the file name)
+
+        Returns:
+            True if the robot accepted it
+        """
+        name = name or os.path.basename(path)
+        fields = {"FileName": name, "OverwriteExisting": "true", "ImmediatelyApply": "false"}
+        body = MultipartFileBody(path, fields, filename=name)
+        try:
+            response = self.client.request("POST", ASSET_KINDS[kind][1], data=body,
+                                           headers={"Content-Type": body.content_type})
+        finally:
+            body.close()
+        if not response.ok:
+            print(f"Error: Failed to upload {name} (Status: {response.status_code})")
+            return False
+        self.client.log_event("upload", kind=kind, name=name, bytes=os.path.getsize(path))
+        return True
+
+    def delete(self, kind: str, name: str) -> bool:
+        response = self.client.delete(ASSET_KINDS[kind][1], params={"FileName": name})
+        if not response.ok:
+            print(f"Error: Failed to delete {name} (Status: {response.status_code})")
+            return False
+        self.client.log_event("delete_asset", kind=kind, name=name)
+        return True
+
+    def _upload(self, kind: str, name: str, path: str, sha256: str, summary: AssetSyncSummary):
+        try:
+            ok = self.upload(kind, path, name)
+        except Exception as e:
+            print(f"Error uploading {name}: {e}")
+            ok = False
+        with self._lock:
+            if not ok:
+                summary.failed.append(name)
+                return
+            size = os.path.getsize(path)
+            self.manifest.setdefault(kind, {})[name] = {"size": size, "sha256": sha256,
+                                                        "uploaded_at": time.time()}
+            summary.uploaded.append(name)
+            summary.bytes_moved += size
+
+    def _delete(self, kind: str, name: str, summary: AssetSyncSummary):
+        try:
+            ok = self.delete(kind, name)
+        except Exception as e:
+            print(f"Error deleting {name}: {e}")
+            ok = False
+        with self._lock:
+            if ok:
+                self.manifest.get(kind, {}).pop(name, None)
+                summary.deleted.append(name)
+            else:
+                summary.failed.append(name)
+
+    def sync(self) -> AssetSyncSummary:
+        """
+        Push every new or changed local asset and, if enabled, delete stale ones
+
+        Returns:
+            Summary of what was uploaded, skipped, deleted and failed
+        """
+        started = time.perf_counter()
+        summary = AssetSyncSummary()
+        self.load_manifest()
+        local = self.local_assets()
+
+        uploads, deletes = [], []
+        for kind, assets in local.items():
+            if not assets and not self.delete_stale:
+                continue
+            remote = self.remote_assets(kind)
+            if remote is None:
+                summary.failed.extend(assets)
+                continue
+            known = self.manifest.setdefault(kind, {})
+            for name, path in sorted(assets.items()):
+                sha256 = file_sha256(path)
+                entry, on_robot = known.get(name), remote.get(name)
+                if (entry is not None and entry["sha256"] == sha256 and on_robot is not None
+                        and on_robot["size"] in (None, entry["size"])):
+                    summary.skipped.append(name)
+                else:
+                    uploads.append((kind, name, path, sha256))
+
+            if self.delete_stale:
+                for name, info in sorted(remote.items()):
+                    if name in assets or info["system"]:
+                        continue
+                    if name in known or self.delete_unmanaged:
+                        deletes.append((kind, name))
+                # Forget uploads that have disappeared from the robot and the folder
+                for name in [n for n in known if n not in assets and n not in remote]:
+                    del known[name]
+
+        self.client.log(f"\n=== Syncing assets to {self.client.base_url}: {len(uploads)} to upload, "
+                        f"{len(deletes)} to delete, {len(summary.skipped)} unchanged "
+                        f"({self.max_workers} workers) ===")
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                for kind, name, path, sha256 in uploads:
+                    pool.submit(self._upload, kind, name, path, sha256, summary)
+                for kind, name in deletes:
+                    pool.submit(self._delete, kind, name, summary)
+        finally:
+            self.save_manifest()
+
+        summary.elapsed_s = time.perf_counter() - started
+        self.client.log(f"\n=== Asset Sync Complete: {summary} ===")
+        return summary
+
+
+def main():
+    # ============ CONFIGURATION - CHANGE THESE ============
+    BASE_URL = "http://192.168.0.111"  # Misty Robot IP Address
+    ASSET_DIR = "./assets"             # Audio clips and menu images for the current condition
+    MAX_WORKERS = 4
+    DELETE_STALE = True                # Remove assets from a previous condition
+
+    client = APIClient(BASE_URL, quiet=True)
+    summary = AssetSync(client, ASSET_DIR, max_workers=MAX_WORKERS, delete_stale=DELETE_STALE).sync()
+    print(summary)
+
+
+if __name__ == "__main__":
+    main()
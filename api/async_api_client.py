@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Asyncio API Client for Misty
+Same get/post/delete and audio helpers as APIClient, plus gather() to send
+independent commands at the same time
+"""
+
+import asyncio
+import functools
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Tuple
+
+from audio_api_client import APIClient
+from instrumentation import Instrumentation
+from resilience import Resilience
+from response_cache import ResponseCache
+from session_log import SessionLogger
+from transport import Transport, Timeout, get_shared_transport
+from utterance_cache import UtteranceCache
+
+# (method, endpoint, data-or-params), e.g. ("POST", "/api/led", {"Red": 255, "Green": 0, "Blue": 0})
+Command = Tuple[str, str, Optional[Dict[str, Any]]]
+
+
+class AsyncAPIClient:
+    def __init__(self, base_url: str, transport: Optional[Transport] = None,
+                 max_concurrency: Optional[int] = None, quiet: bool = False,
+                 instrumentation: Optional[Instrumentation] = None,
+                 session_log: Optional[SessionLogger] = None,
+                 cache: Optional[ResponseCache] = None,
+                 utterances: Optional[UtteranceCache] = None,
+                 resilience: Optional[Resilience] = None):
+        """
+        Initialize the async API client with a base URL
+
+        Requests run on the same keep-alive pool as APIClient; each in-flight
+        call holds one worker thread and one pooled connection.
+
+        Args:
+            base_url: Base IP address or URL (e.g., 'http://192.168.1.1:8000')
+            transport: Connection pool to send requests through (defaults to the shared pool)
+            max_concurrency: Maximum number of requests in flight (defaults to the pool size)
+            quiet: Don't print each request or response (errors are still printed)
+            instrumentation: Collects per-endpoint counters and latency histograms
+            session_log: Records every request and the audio helpers' events
+            cache: Serves repeated GETs of slow-changing endpoints from memory
+            utterances: Lets speak() play pre-rendered audio for phrases it has seen before
+            resilience: Adaptive timeouts, hedged GETs and a circuit breaker
+        """
+        if transport is None:
+            transport = get_shared_transport()
+        self.client = APIClient(base_url, transport=transport, quiet=quiet,
+                                instrumentation=instrumentation, session_log=session_log,
+                                cache=cache, utterances=utterances, resilience=resilience)
+        self.base_url = self.client.base_url
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency or transport.pool_size,
+                                            thread_name_prefix="misty-async")
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    async def get(self, endpoint: str, params: Optional[Dict[str, Any]] = None,
+                  timeout: Optional[Timeout] = None) -> requests.Response:
+        """
+        Send a GET request
+
+        Args:
+            endpoint: API endpoint (e.g., '/api/battery')
+            params: Optional query parameters
+            timeout: Optional per-call deadline in seconds or (connect, read)
+
+        Returns:
+            Response object
+        """
+        return await self._run(self.client.get, endpoint, params, timeout=timeout)
+
+    async def post(self, endpoint: str, data: Optional[Dict[str, Any]] = None,
+                   timeout: Optional[Timeout] = None) -> requests.Response:
+        """
+        Send a POST request
+
+        Args:
+            endpoint: API endpoint
+            data: Data to send in request body
+            timeout: Optional per-call deadline in seconds or (connect, read)
+
+        Returns:
+            Response object
+        """
+        return await self._run(self.client.post, endpoint, data, timeout=timeout)
+
+    async def delete(self, endpoint: str, params: Optional[Dict[str, Any]] = None,
+                     timeout: Optional[Timeout] = None) -> requests.Response:
+        """
+        Send a DELETE request
+
+        Args:
+            endpoint: API endpoint
+            params: Optional query parameters
+            timeout: Optional per-call deadline in seconds or (connect, read)
+
+        Returns:
+            Response object
+        """
+        return await self._run(self.client.delete, endpoint, params, timeout=timeout)
+
+    async def speak(self, text: str, timeout: Optional[Timeout] = None, **voice) -> requests.Response:
+        """
+        Say a phrase, from the utterance cache if it has been rendered before
+
+        Args:
+            text: Text to speak
+            timeout: Optional per-call deadline in seconds or (connect, read)
+            **voice: Voice settings (Voice, Pitch, SpeechRate, Language)
+
+        Returns:
+            Response object from /api/audio/play or /api/tts/speak
+        """
+        return await self._run(self.client.speak, text, timeout=timeout, **voice)
+
+    async def gather(self, *commands: Command, return_exceptions: bool = False) -> List[Any]:
+        """
+        Send independent commands at the same time
+
+        A "speak + nod + smile" beat costs the slowest round trip instead of the sum:
+
+            await client.gather(
+                ("POST", "/api/tts/speak", {"Text": "Excellent choice!"}),
+                ("POST", "/api/head", {"Pitch": 10, "Roll": 0, "Yaw": 0, "Velocity": 80}),
+                ("POST", "/api/led", {"Red": 0, "Green": 255, "Blue": 0}),
+            )
+
+        Args:
+            *commands: (method, endpoint, data) tuples; data is the JSON body for POST
+                       and the query parameters for GET/DELETE
+            return_exceptions: Return exceptions in place of responses instead of raising the first one
+
+        Returns:
+            Responses in the same order as the commands
+        """
+        senders = {"GET": self.get, "POST": self.post, "DELETE": self.delete}
+        # Check every command before creating any coroutine, so a bad one leaves none unawaited
+        for method, _, _ in commands:
+            if method.upper() not in senders:
+                raise ValueError(f"Unsupported method: {method}")
+        calls = [senders[method.upper()](endpoint, data) for method, endpoint, data in commands]
+        return await asyncio.gather(*calls, return_exceptions=return_exceptions)
+
+    def print_response(self, response: requests.Response):
+        """
+        Pretty print the response
+
+        Args:
+            response: Response object to print
+        """
+        self.client.print_response(response)
+
+    async def list_audio_recordings(self) -> Optional[list]:
+        """
+        List all audio recordings available on the device
+
+        Returns:
+            List of audio file names, or None if request fails
+        """
+        return await self._run(self.client.list_audio_recordings)
+
+    async def download_audio_recording(self, filename: str, save_path: Optional[str] = None,
+                                       **kwargs) -> bool:
+        """
+        Download a specific audio recording from the device
+
+        Args:
+            filename: Name of the audio file to download
+            save_path: Local path to save the file (defaults to current directory with same filename)
+            **kwargs: Streaming options passed to APIClient.download_audio_recording
+                      (chunk_size, progress, expected_sha256, resume, on_chunk)
+
+        Returns:
+            True if download successful, False otherwise
+        """
+        return await self._run(self.client.download_audio_recording, filename, save_path, **kwargs)
+
+    async def start_recording(self, filename: str = "capture_speech.wav",
+                              max_speech_length_ms: int = 10000,
+                              silence_timeout_ms: int = 5000,
+                              overwrite_existing: bool = True) -> requests.Response:
+        """
+        Start recording speech from Misty's microphone
+
+        Args:
+            filename: Name to save the recording as (default: "capture_speech.wav")
+            max_speech_length_ms: Maximum recording length in milliseconds (default: 10000 = 10 seconds)
+            silence_timeout_ms: Stop recording after this many ms of silence (default: 5000 = 5 seconds)
+            overwrite_existing: Whether to overwrite existing file with same name (default: True)
+
+        Returns:
+            Response object from the API
+        """
+        return await self._run(self.client.start_recording, filename, max_speech_length_ms,
+                               silence_timeout_ms, overwrite_existing)
+
+    async def stop_recording(self) -> requests.Response:
+        """
+        Stop the current audio recording
+
+        Returns:
+            Response object from the API
+        """
+        return await self._run(self.client.stop_recording)
+
+    def close(self):
+        """
+        Shut down the worker threads (the connection pool is left to its owner)
+        """
+        self._executor.shutdown(wait=False)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.close()
+
+
+async def main():
+    # ============ CONFIGURATION - CHANGE THESE ============
+    BASE_URL = "http://192.168.0.111"  # Misty Robot IP Address
+
+    async with AsyncAPIClient(BASE_URL) as client:
+        # Speak, nod and smile at the same time
+        print("\n=== Speak + Nod + Smile ===")
+        responses = await client.gather(
+            ("POST", "/api/tts/speak", {"Text": "Excellent choice!"}),
+            ("POST", "/api/head", {"Pitch": 10, "Roll": 0, "Yaw": 0, "Velocity": 80}),
+            ("POST", "/api/images/display", {"FileName": "e_Joy.jpg"}),
+        )
+        for response in responses:
+            client.print_response(response)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -4,86 +4,64 @@ Simple API Client for GET, POST, and DELETE requests
 Easily configurable base URL and endpoints
 """
 
-import requests
+import hashlib
 import json
-from typing import Optional, Dict, Any
+import os
+import time
+import requests
+from typing import Callable, Optional
 
+import api_client
 
-class APIClient:
-    def __init__(self, base_url: str):
-        """
-        Initialize the API client with a base URL
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
 
-        Args:
-            base_url: Base IP address or URL (e.g., 'http://192.168.1.1:8000')
-        """
-        self.base_url = base_url.rstrip('/')
-        self.headers = {
-            'Content-Type': 'application/json'
-        }
 
-    def get(self, endpoint: str, params: Optional[Dict[str, Any]] = None) -> requests.Response:
-        """
-        Send a GET request
+def file_sha256(path: str, chunk_size: int = DOWNLOAD_CHUNK_SIZE) -> str:
+    """
+    Hash a file without reading it into memory
 
-        Args:
-            endpoint: API endpoint (e.g., '/users' or '/api/data')
-            params: Optional query parameters
+    Args:
+        path: Path to the file
+        chunk_size: Bytes to read at a time
 
-        Returns:
-            Response object
-        """
-        url = f"{self.base_url}{endpoint}"
-        print(f"GET {url}")
-        response = requests.get(url, params=params, headers=self.headers)
-        return response
+    Returns:
+        Hex SHA-256 digest of the file contents
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
 
-    def post(self, endpoint: str, data: Optional[Dict[str, Any]] = None) -> requests.Response:
-        """
-        Send a POST request
 
-        Args:
-            endpoint: API endpoint
-            data: Data to send in request body
+def _content_range_total(content_range: Optional[str]) -> Optional[int]:
+    # "bytes 100-199/200" or "bytes */200" -> 200
+    if not content_range or '/' not in content_range:
+        return None
+    total = content_range.rsplit('/', 1)[1].strip()
+    return int(total) if total.isdigit() else None
 
-        Returns:
-            Response object
-        """
-        url = f"{self.base_url}{endpoint}"
-        print(f"POST {url}")
-        response = requests.post(url, json=data, headers=self.headers)
-        return response
 
-    def delete(self, endpoint: str, params: Optional[Dict[str, Any]] = None) -> requests.Response:
-        """
-        Send a DELETE request
+def _validator(response: requests.Response) -> Optional[str]:
+    # A strong ETag, else Last-Modified: what If-Range needs to tell the same file from a new one
+    etag = response.headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return response.headers.get("Last-Modified")
 
-        Args:
-            endpoint: API endpoint
-            params: Optional query parameters
 
-        Returns:
-            Response object
-        """
-        url = f"{self.base_url}{endpoint}"
-        print(f"DELETE {url}")
-        response = requests.delete(url, params=params, headers=self.headers)
-        return response
+def _read_validator(path: str) -> Optional[str]:
+    try:
+        with open(path) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
 
-    def print_response(self, response: requests.Response):
-        """
-        Pretty print the response
 
-        Args:
-            response: Response object to print
-        """
-        print(f"Status Code: {response.status_code}")
-        print(f"Headers: {dict(response.headers)}")
-        try:
-            print(f"Response Body:\n{json.dumps(response.json(), indent=2)}")
-        except json.JSONDecodeError:
-            print(f"Response Body:\n{response.text}")
-        print("-" * 50)
+class APIClient(api_client.APIClient):
+    """
+    APIClient with helpers for recording, listing and downloading audio on the robot
+    """
 
     def list_audio_recordings(self) -> Optional[list]:
         """
@@ -92,7 +70,7 @@ class APIClient:
         Returns:
             List of audio file names, or None if request fails
         """
-        print("\n=== Listing All Audio Recordings ===")
+        self.log("\n=== Listing All Audio Recordings ===")
         response = self.get("/api/audio/list")
         self.print_response(response)
 
@@ -113,80 +91,189 @@ class APIClient:
             print(f"Error: Failed to list recordings (Status: {response.status_code})")
             return None
 
-    def download_audio_recording(self, filename: str, save_path: Optional[str] = None) -> bool:
+    def download_audio_recording(self, filename: str, save_path: Optional[str] = None,
+                                 chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+                                 progress: Optional[Callable[[int, Optional[int]], None]] = None,
+                                 expected_sha256: Optional[str] = None,
+                                 resume: bool = True,
+                                 on_chunk: Optional[Callable[[bytes], None]] = None) -> bool:
         """
         Download a specific audio recording from the device
 
+        The file is streamed in fixed-size chunks to '<save_path>.part' and renamed
+        into place only once it is complete, so memory use does not grow with the
+        length of the recording. If a previous transfer left a '.part' file behind,
+        the download resumes from where it stopped, but only with an If-Range validator
+        (ETag or Last-Modified) saved from the first response: capture names are reused,
+        so without one the robot can't tell us the file was re-recorded and the new tail
+        would be spliced onto the old head. Without a validator it starts over.
+
         Args:
             filename: Name of the audio file to download
             save_path: Local path to save the file (defaults to current directory with same filename)
+            chunk_size: Bytes to read from the connection per write (default: 64 KiB)
+            progress: Optional callback called as progress(bytes_done, total_bytes) after each
+                      chunk; total_bytes is None if the robot does not report a length
+            expected_sha256: Optional hex digest the finished file must match
+            resume: Continue an existing '.part' file instead of starting over (default: True)
+            on_chunk: Optional callback given every byte of the file in order as it arrives,
+                      e.g. StreamingTranscriber.feed to decode while downloading; when resuming,
+                      the bytes already in the '.part' file are replayed first
 
         Returns:
             True if download successful, False otherwise
         """
         if save_path is None:
             save_path = filename
+        part_path = save_path + ".part"
+        validator_path = part_path + ".validator"
 
-        url = f"{self.base_url}/api/audio"
-        print(f"\n=== Downloading Audio Recording: {filename} ===")
-        print(f"GET {url}?FileName={filename}")
+        self.log(f"\n=== Downloading Audio Recording: {filename} ===")
+
+        validator = _read_validator(validator_path) if resume and os.path.exists(part_path) else None
+        if validator is None:
+            for stale in (part_path, validator_path):
+                if os.path.exists(stale):
+                    os.remove(stale)
+        offset = os.path.getsize(part_path) if validator is not None else 0
+        started = time.monotonic()
+        # If the file changed since the part was written, If-Range makes the robot send all of it (200)
+        headers = {"Range": f"bytes={offset}-", "If-Range": validator} if offset else None
 
         try:
             # Download the audio file (binary data)
-            response = requests.get(url, params={"FileName": filename})
-
-            if response.status_code == 200:
-                # Save the audio file
-                with open(save_path, 'wb') as f:
-                    f.write(response.content)
-                print(f"Successfully downloaded: {filename} -> {save_path}")
-                print(f"File size: {len(response.content)} bytes")
-                return True
-            else:
-                print(f"Error: Failed to download (Status: {response.status_code})")
-                print(f"Response: {response.text}")
+            response = self.request("GET", "/api/audio", params={"FileName": filename},
+                                    headers=headers, stream=True)
+            with response:
+                if response.status_code == 416:
+                    # Nothing left to send: either the part file is already complete or it is stale
+                    total = _content_range_total(response.headers.get("Content-Range"))
+                    if total is None or total != offset:
+                        self.log("Discarding stale partial download and starting over")
+                        os.remove(part_path)
+                        os.remove(validator_path)
+                        return self.download_audio_recording(filename, save_path, chunk_size,
+                                                             progress, expected_sha256, resume=False,
+                                                             on_chunk=on_chunk)
+                    if on_chunk is not None:
+                        self._replay_part(part_path, chunk_size, on_chunk)
+                elif response.status_code == 206:
+                    self.log(f"Resuming from byte {offset}")
+                    total = _content_range_total(response.headers.get("Content-Range"))
+                    if on_chunk is not None:
+                        self._replay_part(part_path, chunk_size, on_chunk)
+                    self._write_chunks(response, part_path, "ab", offset, total, chunk_size,
+                                       progress, on_chunk)
+                elif response.status_code == 200:
+                    # Full body (the robot may ignore Range, or the file changed), so start the part file over
+                    length = response.headers.get("Content-Length")
+                    total = int(length) if length is not None else None
+                    self._save_validator(validator_path, _validator(response))
+                    self._write_chunks(response, part_path, "wb", 0, total, chunk_size,
+                                       progress, on_chunk)
+                else:
+                    self.log_event("download_failed", filename=filename, status=response.status_code)
+                    print(f"Error: Failed to download (Status: {response.status_code})")
+                    print(f"Response: {response.text}")
+                    return False
+
+            size = os.path.getsize(part_path)
+            if total is not None and size != total:
+                print(f"Error: Incomplete download ({size}/{total} bytes), run again to resume")
                 return False
+            if expected_sha256 is not None:
+                digest = file_sha256(part_path)
+                if digest != expected_sha256.lower():
+                    print(f"Error: Checksum mismatch (expected {expected_sha256}, got {digest})")
+                    os.remove(part_path)
+                    return False
+
+            os.replace(part_path, save_path)
+            if os.path.exists(validator_path):
+                os.remove(validator_path)
+            self.log_event("download", filename=filename, path=save_path, bytes=size,
+                           resumed_from=offset, elapsed_ms=round((time.monotonic() - started) * 1000, 3))
+            self.log(f"Successfully downloaded: {filename} -> {save_path}")
+            self.log(f"File size: {size} bytes")
+            return True
         except Exception as e:
+            self.log_event("download_failed", filename=filename, error=str(e))
             print(f"Error downloading file: {str(e)}")
             return False
 
-    def download_all_recordings(self, output_dir: str = "./recordings") -> int:
+    @staticmethod
+    def _save_validator(validator_path: str, validator: Optional[str]):
+        # Written before the body, so an interrupted transfer leaves it next to the part file
+        if validator is None:
+            if os.path.exists(validator_path):
+                os.remove(validator_path)
+            return
+        with open(validator_path, 'w') as f:
+            f.write(validator)
+
+    @staticmethod
+    def _write_chunks(response: requests.Response, part_path: str, mode: str, offset: int,
+                      total: Optional[int], chunk_size: int,
+                      progress: Optional[Callable[[int, Optional[int]], None]],
+                      on_chunk: Optional[Callable[[bytes], None]] = None):
+        done = offset
+        with open(part_path, mode) as f:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                if not chunk:
+                    continue
+                f.write(chunk)
+                if on_chunk is not None:
+                    on_chunk(chunk)
+                done += len(chunk)
+                if progress is not None:
+                    progress(done, total)
+            f.flush()
+            os.fsync(f.fileno())
+
+    @staticmethod
+    def _replay_part(part_path: str, chunk_size: int, on_chunk: Callable[[bytes], None]):
+        with open(part_path, 'rb') as f:
+            for block in iter(lambda: f.read(chunk_size), b''):
+                on_chunk(block)
+
+    def download_all_recordings(self, output_dir: str = "./recordings", max_workers: int = 4) -> int:
         """
         Download all audio recordings from the device
 
+        Files already pulled by an earlier run and unchanged since are skipped
+        (see recording_sync.RecordingSync); the rest download in parallel.
+
         Args:
             output_dir: Directory to save all recordings (created if doesn't exist)
+            max_workers: Number of downloads in flight at once (default: 4)
 
         Returns:
-            Number of files successfully downloaded
+            Number of files successfully downloaded or already up to date
         """
-        import os
-
-        # Create output directory if it doesn't exist
-        os.makedirs(output_dir, exist_ok=True)
+        from recording_sync import RecordingSync
 
-        # Get list of all recordings
-        recordings = self.list_audio_recordings()
+        summary = RecordingSync(self, output_dir, max_workers=max_workers).sync()
+        return len(summary.downloaded) + len(summary.skipped)
 
-        if not recordings:
-            print("No recordings found or failed to list recordings")
-            return 0
+    def sync_assets(self, asset_dir: str = "./assets", max_workers: int = 4,
+                    delete_stale: bool = False) -> bool:
+        """
+        Upload the audio clips and images in a folder to the device
 
-        print(f"\n=== Downloading {len(recordings)} recordings to {output_dir} ===")
+        Only new or changed files are sent (see asset_sync.AssetSync).
 
-        success_count = 0
-        for i, recording in enumerate(recordings, 1):
-            # Handle both string filenames and dict objects
-            filename = recording if isinstance(recording, str) else recording.get('name', recording.get('fileName', ''))
+        Args:
+            asset_dir: Directory of assets (audio/ and images/ subfolders are included)
+            max_workers: Number of uploads in flight at once (default: 4)
+            delete_stale: Also delete assets uploaded earlier that are no longer in the folder
 
-            if filename:
-                save_path = os.path.join(output_dir, filename)
-                print(f"\n[{i}/{len(recordings)}] Downloading {filename}...")
-                if self.download_audio_recording(filename, save_path):
-                    success_count += 1
+        Returns:
+            True if every upload and delete succeeded
+        """
+        from asset_sync import AssetSync
 
-        print(f"\n=== Download Complete: {success_count}/{len(recordings)} files downloaded ===")
-        return success_count
+        summary = AssetSync(self, asset_dir, max_workers=max_workers, delete_stale=delete_stale).sync()
+        return not summary.failed
 
     def start_recording(self, filename: str = "capture_speech.wav",
                        max_speech_length_ms: int = 10000,
@@ -204,8 +291,8 @@ class APIClient:
         Returns:
             Response object from the API
         """
-        print(f"\n=== Starting Speech Recording: {filename} ===")
-        print(f"Max length: {max_speech_length_ms}ms, Silence timeout: {silence_timeout_ms}ms")
+        self.log(f"\n=== Starting Speech Recording: {filename} ===")
+        self.log(f"Max length: {max_speech_length_ms}ms, Silence timeout: {silence_timeout_ms}ms")
 
         response = self.post("/api/audio/speech/capture", data={
             "FileName": filename,
@@ -214,6 +301,8 @@ class APIClient:
             "OverwriteExisting": overwrite_existing,
             "RequireKeyPhrase": False
         })
+        self.log_event("recording_start", filename=filename, status=response.status_code,
+                       max_speech_length_ms=max_speech_length_ms, silence_timeout_ms=silence_timeout_ms)
         self.print_response(response)
         return response
 
@@ -224,8 +313,9 @@ class APIClient:
         Returns:
             Response object from the API
         """
-        print("\n=== Stopping Speech Recording ===")
+        self.log("\n=== Stopping Speech Recording ===")
         response = self.post("/api/audio/recording/stop")
+        self.log_event("recording_stop", status=response.status_code)
         self.print_response(response)
         return response
 
@@ -358,23 +448,42 @@ def main():
 
     # --- RECORDING WORKFLOW ---
     # Record speech and download it
-    import time
-
-    # Step 1: Start recording (will automatically stop after silence or max length)
+    from events import MistyEventStream
+
+    # Step 1: Subscribe to VoiceRecord before recording so the end of capture cannot be missed
+    events = MistyEventStream(BASE_URL)
+    try:
+        events.connect()
+        capture_done = events.recording_complete("capture_Dialogue.wav")
+    except Exception as e:
+        print(f"Could not open the event stream ({e}), falling back to a fixed wait")
+        events = None
+
+    # Step 2: Start recording (will automatically stop after silence or max length)
     print("\n" + "="*60)
     print("RECORDING WORKFLOW")
     print("="*60)
     client.start_recording(filename="capture_Dialogue.wav", max_speech_length_ms=10000, silence_timeout_ms=5000)
 
-    # Step 2: Wait for recording to complete (it stops automatically)
+    # Step 3: Wait for recording to complete (it stops automatically)
     print("\n🎤 Speak now! Recording will stop after 5 seconds of silence or 10 seconds total...")
-    time.sleep(15)  # Wait for recording to complete
-
-    # Step 3: List all recordings to verify it was saved
-    print("\n" + "="*60)
-    print("LISTING ALL RECORDINGS")
-    print("="*60)
-    recordings = client.list_audio_recordings()
+    if events is not None:
+        message = events.wait_for_recording_complete(future=capture_done, timeout=20)
+        events.close()
+        if message is None:
+            print("Error: No VoiceRecord event within 20 seconds")
+            return
+        if not message.get("success", True):
+            print(f"Error: Recording failed: {message.get('errorMessage')}")
+            return
+    else:
+        time.sleep(15)  # Wait for recording to complete
+
+        # List all recordings to verify it was saved
+        print("\n" + "="*60)
+        print("LISTING ALL RECORDINGS")
+        print("="*60)
+        recordings = client.list_audio_recordings()
 
     # Step 4: Download the recorded file
     print("\n" + "="*60)
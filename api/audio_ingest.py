@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+WAV ingest for the speech-to-text path
+Maps recordings with mmap instead of reading them, and converts any PCM/float WAV to the
+decoder's 16 kHz mono 16-bit format block by block with a NumPy polyphase resampler
+"""
+
+import math
+import mmap
+import struct
+from dataclasses import dataclass
+from typing import Optional, Iterator
+
+import numpy as np
+
+# Pocketsphinx's default acoustic model expects 16 kHz mono 16-bit PCM
+DECODER_SAMPLE_RATE = 16000
+DEFAULT_BLOCK_FRAMES = 64 * 1024
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+@dataclass
+class WavInfo:
+    format_tag: int
+    channels: int
+    sample_rate: int
+    bits: int
+    data_offset: int
+    data_length: int
+
+    @property
+    def frame_size(self) -> int:
+        return self.channels * self.bits // 8
+
+    @property
+    def frames(self) -> int:
+        return self.data_length // self.frame_size
+
+    @property
+    def duration_s(self) -> float:
+        return self.frames / float(self.sample_rate)
+
+    @property
+    def decoder_ready(self) -> bool:
+        """
+        True if the samples can go to the decoder as they are
+        """
+        return (self.format_tag == WAVE_FORMAT_PCM and self.channels == 1
+                and self.sample_rate == DECODER_SAMPLE_RATE and self.bits == 16)
+
+
+def parse_wav_header(buf, size: Optional[int] = None) -> WavInfo:
+    """
+    Find the format and sample data of a RIFF/WAVE file
+
+    Args:
+        buf: The file contents, or any buffer holding at least the header chunks (e.g. an mmap)
+        size: Total file size, used to clamp a data chunk whose length is missing or wrong
+              (as in a recording still being written); defaults to len(buf)
+
+    Returns:
+        Format, and the offset and length of the sample data
+    """
+    size = len(buf) if size is None else size
+    if bytes(buf[:4]) != b"RIFF" or bytes(buf[8:12]) != b"WAVE":
+        raise ValueError("Not a RIFF/WAVE file")
+
+    fmt = None
+    pos = 12
+    while pos + 8 <= len(buf):
+        chunk_id, chunk_size = struct.unpack("<4sI", bytes(buf[pos:pos + 8]))
+        if chunk_id == b"fmt ":
+            format_tag, channels, sample_rate, _, _, bits = struct.unpack("<HHIIHH", bytes(buf[pos + 8:pos + 24]))
+            if format_tag == WAVE_FORMAT_EXTENSIBLE and chunk_size >= 40:
+                # The real format is the first two bytes of the sub-format GUID
+                format_tag = struct.unpack("<H", bytes(buf[pos + 32:pos + 34]))[0]
+            fmt = (format_tag, channels, sample_rate, bits)
+        elif chunk_id == b"data":
+            if fmt is None:
+                raise ValueError("WAV file has no fmt chunk before its data")
+            format_tag, channels, sample_rate, bits = fmt
+            if format_tag not in (WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT):
+                raise ValueError(f"Unsupported WAV format 0x{format_tag:04x} (need PCM or float)")
+            if bits not in (8, 16, 24, 32) or (format_tag == WAVE_FORMAT_IEEE_FLOAT and bits != 32):
+                raise ValueError(f"Unsupported sample width: {bits}-bit")
+            length = min(chunk_size, size - (pos + 8))
+            frame_size = channels * bits // 8
+            return WavInfo(format_tag, channels, sample_rate, bits, pos + 8, length - length % frame_size)
+        # Chunks are word-aligned
+        pos += 8 + chunk_size + (chunk_size % 2)
+    raise ValueError("WAV file has no data chunk")
+
+
+def to_float(raw: np.ndarray, info: WavInfo) -> np.ndarray:
+    """
+    Convert raw sample bytes to float32 in [-1, 1), shape (frames, channels)
+
+    Args:
+        raw: uint8 view of whole frames of sample data
+        info: Format of the data
+
+    Returns:
+        New float32 array
+    """
+    if info.format_tag == WAVE_FORMAT_IEEE_FLOAT:
+        samples = raw.view('<f4').astype(np.float32)
+    elif info.bits == 8:
+        samples = (raw.astype(np.float32) - 128.0) / 128.0
+    elif info.bits == 16:
+        samples = raw.view('<i2').astype(np.float32) / 32768.0
+    elif info.bits == 24:
+        # No 24-bit dtype: place the 3 bytes in the top of an int32 and shift back down
+        triples = raw.reshape(-1, 3).astype(np.int32)
+        samples = ((triples[:, 0] << 8 | triples[:, 1] << 16 | triples[:, 2] << 24) >> 8).astype(np.float32) / 8388608.0
+    else:
+        samples = raw.view('<i4').astype(np.float32) / 2147483648.0
+    return samples.reshape(-1, info.channels)
+
+
+def to_pcm16(samples: np.ndarray) -> bytes:
+    """
+    Convert float samples in [-1, 1) to little-endian 16-bit PCM bytes, clipping overshoot
+    """
+    return np.clip(np.rint(samples * 32768.0), -32768, 32767).astype('<i2').tobytes()
+
+
+class PolyphaseResampler:
+    def __init__(self, from_rate: int, to_rate: int, half_width: int = 10, beta: float = 8.0,
+                 block: int = 8192):
+        """
+        Streaming rational resampler (upsample, low-pass, downsample) in NumPy
+
+        Only the filter taps that line up with real input samples are evaluated, for a
+        whole block of outputs at once. Feed blocks with process() and call flush() at
+        the end; the output is the same as resampling the whole signal in one go.
+
+        Args:
+            from_rate: Input sample rate
+            to_rate: Output sample rate
+            half_width: Filter half-length in zero crossings of the low-pass sinc
+            beta: Kaiser window shape (higher = more stop-band attenuation, wider transition)
+            block: Outputs computed per vectorized step (bounds temporary memory)
+        """
+        g = math.gcd(from_rate, to_rate)
+        self.up = to_rate // g
+        self.down = from_rate // g
+        self.block = block
+        self.received = 0
+        self.produced = 0
+
+        rate = max(self.up, self.down)
+        half = half_width * rate
+        n = np.arange(-half, half + 1)
+        cutoff = 1.0 / rate
+        taps = cutoff * np.sinc(cutoff * n) * np.kaiser(2 * half + 1, beta) * self.up
+        self.taps_per_phase = -(-len(taps) // self.up)
+        taps = np.concatenate([taps, np.zeros(self.taps_per_phase * self.up - len(taps))])
+        # phases[p, j] weighs input x[i - j] for outputs at phase p; reversed so a window
+        # x[i - J + 1 .. i] in ascending order can be dotted directly
+        self.phases = taps.reshape(self.taps_per_phase, self.up).T[:, ::-1].astype(np.float32)
+        self.delay = half
+
+        # Input history; _base is the input index of _buffer[0] (negative = leading zeros)
+        self._buffer = np.zeros(self.taps_per_phase - 1, dtype=np.float32)
+        self._base = -(self.taps_per_phase - 1)
+        self._window = np.arange(-(self.taps_per_phase - 1), 1)
+
+    def _emit(self, available: int, limit: Optional[int] = None) -> np.ndarray:
+        # Outputs whose newest input sample index is below `available`
+        end = (available * self.up - 1 - self.delay) // self.down + 1
+        if limit is not None:
+            end = min(end, limit)
+        out = []
+        for start in range(self.produced, end, self.block):
+            m = np.arange(start, min(start + self.block, end))
+            n = m * self.down + self.delay
+            index = (n // self.up - self._base)[:, None] + self._window
+            out.append(np.einsum('mj,mj->m', self._buffer[index], self.phases[n % self.up]))
+        self.produced = max(self.produced, end)
+
+        # Drop input no future output will need
+        oldest = (self.produced * self.down + self.delay) // self.up - (self.taps_per_phase - 1)
+        drop = oldest - self._base
+        if drop > 0:
+            self._buffer = self._buffer[drop:]
+            self._base += drop
+        return np.concatenate(out) if out else np.zeros(0, dtype=np.float32)
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        """
+        Resample the next block of mono float samples
+
+        Returns:
+            The output samples that can be computed so far
+        """
+        if self.up == self.down:
+            self.received += len(samples)
+            return samples
+        self._buffer = np.concatenate([self._buffer, samples.astype(np.float32, copy=False)])
+        self.received += len(samples)
+        return self._emit(self.received)
+
+    def flush(self) -> np.ndarray:
+        """
+        Finish the stream (pads with silence for the filter tail)
+
+        Returns:
+            The remaining output samples
+        """
+        if self.up == self.down:
+            return np.zeros(0, dtype=np.float32)
+        total = -(-self.received * self.up // self.down)
+        needed = (total * self.down + self.delay) // self.up + 1
+        pad = needed - (self._base + len(self._buffer))
+        if pad > 0:
+            self._buffer = np.concatenate([self._buffer, np.zeros(pad, dtype=np.float32)])
+        return self._emit(self._base + len(self._buffer), limit=total)
+
+
+class WavFile:
+    def __init__(self, path: str):
+        """
+        Memory-map a WAV file (use as a context manager, or call close())
+
+        The samples are not read up front; the OS pages them in as blocks are used,
+        so memory stays flat however long the recording is.
+
+        Args:
+            path: Path to the WAV file
+        """
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.info = parse_wav_header(self._mmap)
+        except Exception:
+            self._file.close()
+            raise
+
+    def raw(self) -> memoryview:
+        """
+        Zero-copy view of the sample data (release it before close())
+        """
+        return memoryview(self._mmap)[self.info.data_offset:self.info.data_offset + self.info.data_length]
+
+    def iter_pcm16(self, target_rate: int = DECODER_SAMPLE_RATE,
+                   block_frames: int = DEFAULT_BLOCK_FRAMES) -> Iterator[bytes]:
+        """
+        Stream the audio as mono 16-bit PCM at target_rate
+
+        Data already in that format is passed through as slices of the mapping without
+        conversion (each slice is only valid until the next block is requested); anything
+        else is downmixed and resampled one block at a time.
+
+        Args:
+            target_rate: Output sample rate
+            block_frames: Input frames converted per block
+
+        Yields:
+            PCM blocks (bytes or memoryview)
+        """
+        info = self.info
+        block_bytes = block_frames * info.frame_size
+        data = self.raw()
+        try:
+            if info.decoder_ready and target_rate == DECODER_SAMPLE_RATE:
+                for start in range(0, len(data), block_bytes):
+                    block = data[start:start + block_bytes]
+                    yield block
+                    block.release()
+                return
+
+            resampler = PolyphaseResampler(info.sample_rate, target_rate)
+            for start in range(0, len(data), block_bytes):
+                with data[start:start + block_bytes] as block:
+                    mono = to_float(np.frombuffer(block, dtype=np.uint8), info).mean(axis=1, dtype=np.float32)
+                out = resampler.process(mono)
+                if len(out):
+                    yield to_pcm16(out)
+            tail = resampler.flush()
+            if len(tail):
+                yield to_pcm16(tail)
+        finally:
+            data.release()
+
+    def read_pcm16(self, target_rate: int = DECODER_SAMPLE_RATE) -> np.ndarray:
+        """
+        Convert the whole recording to mono int16 at target_rate
+
+        Returns:
+            New int16 array
+        """
+        return np.frombuffer(b"".join(bytes(block) for block in self.iter_pcm16(target_rate)), dtype='<i2')
+
+    def close(self):
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def iter_decoder_pcm(path: str, block_frames: int = DEFAULT_BLOCK_FRAMES) -> Iterator[bytes]:
+    """
+    Stream a WAV file of any PCM/float format as 16 kHz mono 16-bit PCM for the decoder
+
+    Args:
+        path: Path to the WAV file
+        block_frames: Input frames converted per block
+
+    Yields:
+        PCM blocks, e.g. for speech_to_text.transcribe_stream
+    """
+    with WavFile(path) as wav:
+        yield from wav.iter_pcm16(DECODER_SAMPLE_RATE, block_frames)
+
+
+def main():
+    # Path to your WAV file
+    wav_file = "./capture_Dialogue.wav"
+
+    with WavFile(wav_file) as wav:
+        info = wav.info
+        print(f"{wav_file}: {info.channels} ch, {info.sample_rate} Hz, {info.bits}-bit, "
+              f"{info.duration_s:.2f}s ({'decoder-ready' if info.decoder_ready else 'needs conversion'})")
+
+
+if __name__ == "__main__":
+    main()
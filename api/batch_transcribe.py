@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Batch Speech-to-Text for a folder of WAV recordings
+Transcribes files on a process pool; each worker loads the Pocketsphinx models once
+"""
+
+import glob
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Dict, Any, List
+
+from audio_ingest import WavFile, iter_decoder_pcm
+from speech_to_text import create_decoder, transcribe_stream
+from transcription_cache import DEFAULT_CACHE_DIR, TranscriptionCache
+
+# Decoder and cache owned by this worker process, created by _init_worker
+_worker_decoder = None
+_worker_config: Dict[str, Any] = {}
+_worker_cache: Optional[TranscriptionCache] = None
+
+
+def _init_worker(decoder_config: Dict[str, Any], cache_dir: Optional[str] = None):
+    global _worker_decoder, _worker_config, _worker_cache
+    _worker_decoder = create_decoder(**decoder_config)
+    _worker_config = decoder_config
+    _worker_cache = TranscriptionCache(cache_dir) if cache_dir else None
+
+
+def wav_duration(wav_file_path: str) -> Optional[float]:
+    """
+    Get the length of a WAV file from its header (PCM or float, any layout the decoder accepts)
+
+    Args:
+        wav_file_path: Path to the WAV file
+
+    Returns:
+        Duration in seconds, or None if the header cannot be read
+    """
+    try:
+        with WavFile(wav_file_path) as wav:
+            return wav.info.duration_s
+    except (ValueError, OSError):
+        return None
+
+
+def transcribe_file(wav_file_path: str) -> Dict[str, Any]:
+    """
+    Transcribe one file with this worker's decoder
+
+    Args:
+        wav_file_path: Path to the WAV file
+
+    Returns:
+        Dict with file, text, duration_s, decode_s, cached and error (None on success)
+    """
+    if _worker_decoder is None:
+        _init_worker({})
+
+    result = {
+        "file": wav_file_path,
+        "text": None,
+        "duration_s": wav_duration(wav_file_path),
+        "decode_s": None,
+        "cached": False,
+        "error": None,
+    }
+    started = time.perf_counter()
+    try:
+        cache_key = None
+        if _worker_cache is not None:
+            cache_key = _worker_cache.key(_worker_cache.audio_digest(wav_file_path),
+                                          {"mode": "stream"}, _worker_config)
+            cached = _worker_cache.get(cache_key)
+            if cached is not None:
+                result["text"] = cached["text"]
+                result["cached"] = True
+
+        if not result["cached"]:
+            result["text"] = transcribe_stream(iter_decoder_pcm(wav_file_path), _worker_decoder)
+            if cache_key is not None:
+                _worker_cache.put(cache_key, {"text": result["text"]})
+    except Exception as e:
+        result["error"] = str(e)
+    result["decode_s"] = round(time.perf_counter() - started, 4)
+    return result
+
+
+def transcribe_pcm(pcm: bytes) -> Optional[str]:
+    """
+    Transcribe raw 16 kHz mono 16-bit PCM with this worker's decoder
+
+    Args:
+        pcm: Audio samples, e.g. one speech segment from vad.detect_speech
+
+    Returns:
+        Transcribed text, or None if no speech was recognized
+    """
+    if _worker_decoder is None:
+        _init_worker({})
+    return transcribe_stream([pcm], _worker_decoder)
+
+
+def batch_transcribe(input_dir: str, output_file: Optional[str] = "transcriptions.json",
+                     max_workers: Optional[int] = None, pattern: str = "*.wav",
+                     decoder_config: Optional[Dict[str, Any]] = None,
+                     cache_dir: Optional[str] = DEFAULT_CACHE_DIR) -> List[Dict[str, Any]]:
+    """
+    Transcribe every recording in a directory
+
+    Args:
+        input_dir: Directory of WAV files (e.g. the output of download_all_recordings)
+        output_file: JSON file to write the results to (None to skip writing)
+        max_workers: Number of worker processes (defaults to the number of CPUs)
+        pattern: Glob pattern for files to include (default: "*.wav")
+        decoder_config: Pocketsphinx options for every worker's decoder (defaults to the bundled models)
+        cache_dir: Transcription cache shared by the workers (None to always decode)
+
+    Returns:
+        One result dict per file, in file name order
+    """
+    files = sorted(glob.glob(os.path.join(input_dir, pattern)))
+    if not files:
+        print(f"No files matching {pattern} in {input_dir}")
+        return []
+
+    max_workers = max_workers or os.cpu_count() or 1
+    print(f"\n=== Transcribing {len(files)} files with {max_workers} workers ===")
+
+    started = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                             initargs=(decoder_config or {}, cache_dir)) as pool:
+        for i, result in enumerate(pool.map(transcribe_file, files), 1):
+            if result["error"]:
+                status = "error: " + result["error"]
+            else:
+                status = "cached" if result["cached"] else f"{result['decode_s']:.2f}s"
+            print(f"[{i}/{len(files)}] {os.path.basename(result['file'])} ({status})")
+            results.append(result)
+    elapsed = time.perf_counter() - started
+
+    audio_s = sum(r["duration_s"] or 0.0 for r in results)
+    print(f"\n=== Batch Complete: {len(results)} files, {audio_s:.1f}s of audio in {elapsed:.1f}s ===")
+
+    if output_file:
+        with open(output_file, 'w') as f:
+            json.dump({
+                "input_dir": input_dir,
+                "workers": max_workers,
+                "elapsed_s": round(elapsed, 4),
+                "audio_s": round(audio_s, 4),
+                "files": results,
+            }, f, indent=2)
+        print(f"Results saved to: {output_file}")
+    return results
+
+
+def main():
+    # ============ CONFIGURATION - CHANGE THESE ============
+    INPUT_DIR = "./recordings"           # e.g. the output of download_all_recordings()
+    OUTPUT_FILE = "transcriptions.json"
+    MAX_WORKERS = None                   # None = one worker per CPU
+
+    batch_transcribe(INPUT_DIR, OUTPUT_FILE, max_workers=MAX_WORKERS)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Latency benchmark for the Misty API clients
+Runs each endpoint through each client mode against the local simulator (or a real robot)
+and reports p50/p95/p99 latency and requests per second
+"""
+
+import asyncio
+import json
+import time
+from typing import Optional, Dict, Any, List, Tuple
+
+import requests
+
+from api_client import APIClient
+from async_api_client import AsyncAPIClient
+from latency_stats import summarize
+from transport import Transport
+
+MODES = ("unpooled", "pooled", "async")
+
+# (method, endpoint, data) exercised by default
+DEFAULT_ENDPOINTS: List[Tuple[str, str, Optional[Dict[str, Any]]]] = [
+    ("GET", "/api/battery", None),
+    ("GET", "/api/audio/list", None),
+    ("POST", "/api/led", {"Red": 255, "Green": 0, "Blue": 0}),
+    ("POST", "/api/head", {"Pitch": 10, "Roll": 0, "Yaw": 0, "Velocity": 80}),
+    ("POST", "/api/tts/speak", {"Text": "Excellent choice!"}),
+]
+
+
+def _send(client: APIClient, method: str, endpoint: str, data: Optional[Dict[str, Any]]) -> requests.Response:
+    if method == "GET":
+        return client.get(endpoint, data)
+    if method == "POST":
+        return client.post(endpoint, data)
+    return client.delete(endpoint, data)
+
+
+def run_unpooled(base_url: str, method: str, endpoint: str, data, requests_per_endpoint: int) -> Tuple[List[float], int]:
+    # A fresh connection per call, as the original module-level requests.get/post did
+    latencies, errors = [], 0
+    for _ in range(requests_per_endpoint):
+        with Transport(pool_size=1, max_retries=0) as transport:
+            client = APIClient(base_url, transport=transport, quiet=True)
+            started = time.perf_counter()
+            try:
+                ok = _send(client, method, endpoint, data).ok
+            except requests.RequestException:
+                ok = False
+            latencies.append((time.perf_counter() - started) * 1000)
+        errors += 0 if ok else 1
+    return latencies, errors
+
+
+def run_pooled(base_url: str, method: str, endpoint: str, data, requests_per_endpoint: int) -> Tuple[List[float], int]:
+    latencies, errors = [], 0
+    with Transport(max_retries=0) as transport:
+        client = APIClient(base_url, transport=transport, quiet=True)
+        for _ in range(requests_per_endpoint):
+            started = time.perf_counter()
+            try:
+                ok = _send(client, method, endpoint, data).ok
+            except requests.RequestException:
+                ok = False
+            latencies.append((time.perf_counter() - started) * 1000)
+            errors += 0 if ok else 1
+    return latencies, errors
+
+
+def run_async(base_url: str, method: str, endpoint: str, data, requests_per_endpoint: int,
+              concurrency: int = 8) -> Tuple[List[float], int]:
+    async def timed(client: AsyncAPIClient) -> Tuple[float, bool]:
+        started = time.perf_counter()
+        try:
+            (response,) = await client.gather((method, endpoint, data))
+            ok = response.ok
+        except requests.RequestException:
+            ok = False
+        return (time.perf_counter() - started) * 1000, ok
+
+    async def run() -> List[Tuple[float, bool]]:
+        transport = Transport(pool_size=concurrency, max_retries=0)
+        try:
+            async with AsyncAPIClient(base_url, transport=transport, max_concurrency=concurrency,
+                                      quiet=True) as client:
+                return await asyncio.gather(*(timed(client) for _ in range(requests_per_endpoint)))
+        finally:
+            transport.close()
+
+    results = asyncio.run(run())
+    return [latency for latency, _ in results], sum(1 for _, ok in results if not ok)
+
+
+def benchmark(base_url: str, endpoints=None, modes=MODES, requests_per_endpoint: int = 200,
+              concurrency: int = 8) -> List[Dict[str, Any]]:
+    """
+    Benchmark every endpoint in every client mode
+
+    Args:
+        base_url: Robot or simulator base URL
+        endpoints: (method, endpoint, data) tuples (defaults to DEFAULT_ENDPOINTS)
+        modes: Client modes to run: 'unpooled' (new connection per call), 'pooled'
+               (keep-alive APIClient), 'async' (AsyncAPIClient with `concurrency` in flight)
+        requests_per_endpoint: Requests to send per endpoint and mode
+        concurrency: Requests in flight for the async mode (its latencies include time spent
+                     queued behind the in-flight requests; compare its rps, not its p50)
+
+    Returns:
+        One row per (mode, endpoint) with count, errors, latency percentiles (ms) and rps
+    """
+    rows = []
+    for mode in modes:
+        for method, endpoint, data in endpoints or DEFAULT_ENDPOINTS:
+            started = time.perf_counter()
+            if mode == "unpooled":
+                latencies, errors = run_unpooled(base_url, method, endpoint, data, requests_per_endpoint)
+            elif mode == "pooled":
+                latencies, errors = run_pooled(base_url, method, endpoint, data, requests_per_endpoint)
+            elif mode == "async":
+                latencies, errors = run_async(base_url, method, endpoint, data,
+                                              requests_per_endpoint, concurrency)
+            else:
+                raise ValueError(f"Unknown mode: {mode}")
+            elapsed = time.perf_counter() - started
+
+            row = {"mode": mode, "method": method, "endpoint": endpoint, "errors": errors,
+                   "rps": round(len(latencies) / elapsed, 1) if elapsed > 0 else 0.0}
+            row.update(summarize(latencies))
+            rows.append(row)
+    return rows
+
+
+def print_report(rows: List[Dict[str, Any]]):
+    """
+    Print benchmark rows as a table
+
+    Args:
+        rows: Output of benchmark()
+    """
+    print(f"{'mode':<9} {'endpoint':<24} {'n':>5} {'err':>4} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'rps':>8}")
+    print("-" * 80)
+    for row in rows:
+        name = f"{row['method']} {row['endpoint']}"
+        print(f"{row['mode']:<9} {name:<24} {row['count']:>5} {row['errors']:>4} "
+              f"{row['p50']:>8.2f} {row['p95']:>8.2f} {row['p99']:>8.2f} {row['rps']:>8.1f}")
+
+
+def main():
+    from misty_simulator import MistySimulator
+
+    # ============ CONFIGURATION - CHANGE THESE ============
+    BASE_URL = None                # None = start a local simulator; or "http://192.168.0.111" for the robot
+    LATENCY_MS = 15.0              # Simulator latency injected per request
+    JITTER_MS = 10.0
+    FAILURE_RATE = 0.0
+    REQUESTS_PER_ENDPOINT = 100
+    CONCURRENCY = 8
+    OUTPUT_FILE = "benchmark_results.json"
+
+    simulator = None
+    base_url = BASE_URL
+    if base_url is None:
+        simulator = MistySimulator(latency_ms=LATENCY_MS, jitter_ms=JITTER_MS,
+                                   failure_rate=FAILURE_RATE, seed=1).start()
+        base_url = simulator.base_url
+        print(f"Benchmarking local simulator at {base_url} ({LATENCY_MS} ms + up to {JITTER_MS} ms jitter)\n")
+
+    try:
+        rows = benchmark(base_url, requests_per_endpoint=REQUESTS_PER_ENDPOINT, concurrency=CONCURRENCY)
+    finally:
+        if simulator is not None:
+            simulator.stop()
+
+    print_report(rows)
+    if OUTPUT_FILE:
+        with open(OUTPUT_FILE, 'w') as f:
+            json.dump(rows, f, indent=2)
+        print(f"\nResults saved to: {OUTPUT_FILE}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+Timeline scheduler for Misty choreography
+Fires speech, head, LED and arm commands at millisecond offsets, sending each one early by
+the measured latency of its endpoint, and reports planned versus estimated firing times
+"""
+
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Any, List
+
+import requests
+
+from api_client import APIClient
+from latency_stats import summarize
+
+# Sleep until this close to a deadline, then spin; time.sleep can overshoot by a few ms
+SPIN_MS = 2.0
+
+
+@dataclass
+class Action:
+    at_ms: float
+    endpoint: str
+    data: Optional[Dict[str, Any]] = None
+    method: str = "POST"
+    label: Optional[str] = None
+
+    @property
+    def name(self) -> str:
+        return self.label or f"{self.method} {self.endpoint}"
+
+
+@dataclass
+class ActionResult:
+    action: Action
+    planned_ms: float
+    dispatched_ms: float
+    estimated_ms: float         # Not observable from here: dispatch + compensation x round trip
+    latency_ms: float
+    status: Optional[int] = None
+    error: Optional[str] = None
+
+    @property
+    def lateness_ms(self) -> float:
+        return self.estimated_ms - self.planned_ms
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "action": self.action.name,
+            "planned_ms": round(self.planned_ms, 3),
+            "dispatched_ms": round(self.dispatched_ms, 3),
+            "estimated_ms": round(self.estimated_ms, 3),
+            "lateness_ms": round(self.lateness_ms, 3),
+            "latency_ms": round(self.latency_ms, 3),
+            "status": self.status,
+            "error": self.error,
+        }
+
+
+class Timeline:
+    def __init__(self):
+        """
+        A list of actions with offsets in milliseconds from the start of the performance
+        """
+        self.actions: List[Action] = []
+
+    def add(self, at_ms: float, endpoint: str, data: Optional[Dict[str, Any]] = None,
+            method: str = "POST", label: Optional[str] = None) -> "Timeline":
+        """
+        Add a raw API call to the timeline
+
+        Args:
+            at_ms: When the robot should act, in ms from the start
+            endpoint: API endpoint
+            data: Request body (POST) or query parameters (GET/DELETE)
+            method: HTTP verb
+            label: Name shown in the report (defaults to "<method> <endpoint>")
+
+        Returns:
+            The timeline, so calls can be chained
+        """
+        self.actions.append(Action(at_ms, endpoint, data, method, label))
+        return self
+
+    def speak(self, at_ms: float, text: str) -> "Timeline":
+        return self.add(at_ms, "/api/tts/speak", {"Text": text}, label=f"speak {text[:24]!r}")
+
+    def head(self, at_ms: float, pitch: float = 0, roll: float = 0, yaw: float = 0,
+             velocity: float = 80) -> "Timeline":
+        return self.add(at_ms, "/api/head",
+                        {"Pitch": pitch, "Roll": roll, "Yaw": yaw, "Velocity": velocity},
+                        label=f"head p={pitch} r={roll} y={yaw}")
+
+    def nod(self, at_ms: float, depth: float = 15, duration_ms: float = 400,
+            velocity: float = 100) -> "Timeline":
+        # Down then back up, split evenly over duration_ms
+        self.head(at_ms, pitch=depth, velocity=velocity)
+        return self.head(at_ms + duration_ms / 2, pitch=0, velocity=velocity)
+
+    def led(self, at_ms: float, red: int, green: int, blue: int) -> "Timeline":
+        return self.add(at_ms, "/api/led", {"Red": red, "Green": green, "Blue": blue},
+                        label=f"led {red},{green},{blue}")
+
+    def led_transition(self, at_ms: float, color1, color2, transition: str = "Breathe",
+                       time_ms: int = 1000) -> "Timeline":
+        (r1, g1, b1), (r2, g2, b2) = color1, color2
+        return self.add(at_ms, "/api/led/transition", {
+            "Red": r1, "Green": g1, "Blue": b1,
+            "Red2": r2, "Green2": g2, "Blue2": b2,
+            "TransitionType": transition,
+            "TimeMs": time_ms,
+        }, label=f"led {transition}")
+
+    def arm(self, at_ms: float, arm: str, position: float, velocity: float = 50) -> "Timeline":
+        return self.add(at_ms, "/api/arms", {"Arm": arm, "Position": position, "Velocity": velocity},
+                        label=f"arm {arm} {position}")
+
+    def image(self, at_ms: float, filename: str) -> "Timeline":
+        return self.add(at_ms, "/api/images/display", {"FileName": filename},
+                        label=f"image {filename}")
+
+    @property
+    def duration_ms(self) -> float:
+        return max((a.at_ms for a in self.actions), default=0.0)
+
+
+@dataclass
+class ChoreographyReport:
+    results: List[ActionResult] = field(default_factory=list)
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Summarize how far the actions drifted from the plan
+
+        Returns:
+            Dict with action and error counts, and lateness stats (ms, positive = late)
+        """
+        lateness = [r.lateness_ms for r in self.results]
+        return {
+            "actions": len(self.results),
+            "errors": sum(1 for r in self.results if r.error or (r.status or 0) >= 400),
+            "lateness_ms": summarize([abs(x) for x in lateness]),
+            "max_late_ms": round(max(lateness, default=0.0), 3),
+            "max_early_ms": round(-min(lateness, default=0.0), 3),
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"summary": self.summary(), "actions": [r.to_dict() for r in self.results]}
+
+    def print_report(self):
+        print("Firing times are estimated (dispatch + compensation x round trip), not measured")
+        print(f"{'planned':>9} {'est.':>9} {'late':>8} {'latency':>8} {'status':>6}  action")
+        print("-" * 72)
+        for r in self.results:
+            status = r.error or r.status
+            print(f"{r.planned_ms:>9.1f} {r.estimated_ms:>9.1f} {r.lateness_ms:>+8.1f} "
+                  f"{r.latency_ms:>8.1f} {status!s:>6}  {r.action.name}")
+        summary = self.summary()
+        print(f"\n{summary['actions']} actions, {summary['errors']} errors, "
+              f"|lateness| p50 {summary['lateness_ms']['p50']:.1f} ms, "
+              f"p95 {summary['lateness_ms']['p95']:.1f} ms, worst late {summary['max_late_ms']:.1f} ms")
+
+
+class Choreographer:
+    def __init__(self, client: APIClient, max_workers: int = 8, compensation: float = 0.5,
+                 default_latency_ms: float = 50.0, smoothing: float = 0.3):
+        """
+        Initialize a scheduler that plays timelines through an APIClient
+
+        A command takes effect roughly when the robot receives it, i.e. part-way through
+        its round trip. Each action is sent `compensation * estimated latency` before its
+        offset. When the robot acted can't be observed from here, so the reported firing time
+        is an estimate: the same fraction of the measured round trip after dispatch.
+
+        Args:
+            client: Client to send commands through (its transport pool should hold at
+                    least max_workers connections)
+            max_workers: Commands that may be in flight at once, so a slow command
+                         (e.g. TTS) doesn't hold up the ones after it
+            compensation: Fraction of the round trip before the robot acts (0.5 = one-way)
+            default_latency_ms: Estimate for endpoints with no measurements yet
+            smoothing: Weight of each new measurement in the per-endpoint moving average
+        """
+        self.client = client
+        self.max_workers = max_workers
+        self.compensation = compensation
+        self.default_latency_ms = default_latency_ms
+        self.smoothing = smoothing
+        self.latency_ms: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._seed_from_instrumentation()
+
+    def _seed_from_instrumentation(self):
+        instrumentation = self.client.instrumentation
+        if instrumentation is None:
+            return
+        for key, stats in instrumentation.snapshot()["endpoints"].items():
+            if stats["total_ms"]["count"]:
+                self.latency_ms[key] = stats["total_ms"]["mean"]
+
+    def estimate(self, action: Action) -> float:
+        """
+        Get the estimated round-trip latency of an action's endpoint
+
+        Args:
+            action: Action to look up
+
+        Returns:
+            Latency in ms
+        """
+        with self._lock:
+            return self.latency_ms.get(f"{action.method} {action.endpoint}", self.default_latency_ms)
+
+    def observe(self, action: Action, latency_ms: float):
+        key = f"{action.method} {action.endpoint}"
+        with self._lock:
+            previous = self.latency_ms.get(key)
+            if previous is None:
+                self.latency_ms[key] = latency_ms
+            else:
+                self.latency_ms[key] = previous + self.smoothing * (latency_ms - previous)
+
+    def calibrate(self, timeline: Timeline, rounds: int = 3):
+        """
+        Measure each endpoint in a timeline by sending its first action a few times
+
+        Sends real commands, so run it before the participant arrives.
+
+        Args:
+            timeline: Timeline whose endpoints should be measured
+            rounds: Requests per endpoint
+        """
+        first: Dict[str, Action] = {}
+        for action in timeline.actions:
+            first.setdefault(f"{action.method} {action.endpoint}", action)
+        for action in first.values():
+            for _ in range(rounds):
+                started = time.perf_counter()
+                try:
+                    self._send(action)
+                except requests.RequestException:
+                    continue
+                self.observe(action, (time.perf_counter() - started) * 1000)
+
+    def _send(self, action: Action) -> requests.Response:
+        return self.client.request(action.method, action.endpoint,
+                                   **({"json": action.data} if action.method == "POST"
+                                      else {"params": action.data}))
+
+    def _fire(self, action: Action, start: float, dispatched: float) -> ActionResult:
+        status, error = None, None
+        try:
+            status = self._send(action).status_code
+        except requests.RequestException as e:
+            error = type(e).__name__
+        finished = time.perf_counter()
+        latency_ms = (finished - dispatched) * 1000
+        if error is None:
+            self.observe(action, latency_ms)
+        dispatched_ms = (dispatched - start) * 1000
+        return ActionResult(action, action.at_ms, dispatched_ms,
+                            dispatched_ms + self.compensation * latency_ms,
+                            latency_ms, status, error)
+
+    def play(self, timeline: Timeline) -> ChoreographyReport:
+        """
+        Perform a timeline and wait for every command to be acknowledged
+
+        Args:
+            timeline: Actions to fire
+
+        Returns:
+            Report of planned versus estimated firing times, in timeline order
+        """
+        # Dispatch in send-time order: an action with a slow endpoint may need to go
+        # out before one planned slightly earlier on a fast endpoint
+        schedule = sorted(((a.at_ms - self.compensation * self.estimate(a), i, a)
+                           for i, a in enumerate(timeline.actions)), key=lambda s: (s[0], s[1]))
+        # Start far enough in the future that the earliest send isn't already overdue
+        lead_ms = max(0.0, -schedule[0][0]) if schedule else 0.0
+
+        futures = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers,
+                                thread_name_prefix="choreography") as pool:
+            start = time.perf_counter() + lead_ms / 1000
+            for send_ms, index, action in schedule:
+                deadline = start + send_ms / 1000
+                remaining = deadline - time.perf_counter()
+                if remaining * 1000 > SPIN_MS:
+                    time.sleep(remaining - SPIN_MS / 1000)
+                while time.perf_counter() < deadline:
+                    pass
+                futures[index] = pool.submit(self._fire, action, start, time.perf_counter())
+            wait(futures.values())
+        return ChoreographyReport([futures[i].result() for i in sorted(futures)])
+
+
+def main():
+    from misty_simulator import MistySimulator
+
+    # ============ CONFIGURATION - CHANGE THESE ============
+    BASE_URL = None                # None = run against a local simulator; or "http://192.168.0.111"
+    OUTPUT_FILE = None             # e.g. "choreography_report.json"
+
+    # Greeting: speak while nodding, glow green, and wave the right arm
+    timeline = (Timeline()
+                .led(0, 0, 255, 0)
+                .speak(0, "Hi! Welcome to the cafe. What would you like today?")
+                .nod(150)
+                .arm(400, "right", -80)
+                .arm(1200, "right", 90)
+                .led_transition(1500, (0, 255, 0), (0, 0, 255), "Breathe", 2000)
+                .head(2200, pitch=-5, yaw=10))
+
+    simulator = None
+    base_url = BASE_URL
+    if base_url is None:
+        simulator = MistySimulator(latency_ms=20, jitter_ms=10,
+                                   endpoint_latency_ms={"/api/tts/speak": 120}).start()
+        base_url = simulator.base_url
+
+    try:
+        client = APIClient(base_url, quiet=True)
+        choreographer = Choreographer(client)
+        choreographer.calibrate(timeline)
+        report = choreographer.play(timeline)
+    finally:
+        if simulator is not None:
+            simulator.stop()
+
+    report.print_report()
+    if OUTPUT_FILE:
+        with open(OUTPUT_FILE, 'w') as f:
+            json.dump(report.to_dict(), f, indent=2)
+        print(f"\nReport saved to: {OUTPUT_FILE}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,507 @@
+#!/usr/bin/env python3
+"""
+Warm control daemon for live sessions
+Holds the robot's connection pool, event stream and STT decoder in one long-lived process and
+runs operator commands sent by misty.py over a local socket, so each one costs a round trip
+to the robot instead of Python start-up, imports, a TCP handshake and model loading
+
+Protocol: one JSON object per line, {"argv": [...], "cwd": "..."} -> {"ok", "output", "result", "elapsed_ms"}
+"""
+
+import argparse
+import json
+import os
+import shlex
+import socketserver
+import tempfile
+import threading
+import time
+from contextlib import nullcontext
+from typing import Optional, Dict, Any, List
+
+from audio_api_client import APIClient
+from events import MistyEventStream
+from misty import default_socket_path, send
+from resilience import Resilience
+from response_cache import ResponseCache
+from session_log import SessionLogger
+from speech_to_text import StreamingTranscriber, get_decoder, transcribe_stream
+from audio_ingest import iter_decoder_pcm
+from utterance_cache import UtteranceCache
+
+# Seconds past the capture budget to wait for the VoiceRecord event before stopping the capture
+RECORDING_GRACE_S = 5.0
+
+
+class CommandError(Exception):
+    """
+    A command that can't be run as given (bad arguments, robot refused it)
+    """
+
+
+def _color_channel(value: str) -> int:
+    channel = int(value)
+    if not 0 <= channel <= 255:
+        raise argparse.ArgumentTypeError(f"{value} is not in 0-255")
+    return channel
+
+
+class _HelpRequested(Exception):
+    pass
+
+
+class _ArgumentParser(argparse.ArgumentParser):
+    # argparse prints and exits on bad input and --help; the daemon has to answer instead
+    def error(self, message):
+        raise CommandError(f"{self.format_usage()}{self.prog}: error: {message}")
+
+    def print_help(self, file=None):
+        raise _HelpRequested(self.format_help())
+
+    def exit(self, status=0, message=None):
+        raise CommandError(message or "")
+
+
+class ControlDaemon:
+    def __init__(self, base_url: str, socket_path: Optional[str] = None, events: bool = True,
+                 events_url: Optional[str] = None, warm_decoder: bool = True,
+                 session_log: Optional[SessionLogger] = None):
+        """
+        Initialize the daemon (call start() or serve_forever() to begin serving)
+
+        Args:
+            base_url: Base URL of the robot (e.g., 'http://192.168.0.111')
+            socket_path: Unix socket to listen on (defaults to misty.default_socket_path())
+            events: Keep an event stream open, so `record` returns as soon as the capture ends
+            events_url: WebSocket URL when it isn't the robot's /pubsub (e.g. the simulator's)
+            warm_decoder: Load the STT models at start-up instead of on the first transcription
+            session_log: Records every request the daemon sends
+        """
+        self.base_url = base_url
+        self.socket_path = socket_path or default_socket_path()
+        self.client = APIClient(base_url, quiet=True, session_log=session_log,
+                                cache=ResponseCache(), utterances=UtteranceCache(),
+                                resilience=Resilience())
+        self.use_events = events
+        self.events_url = events_url or base_url
+        self.events: Optional[MistyEventStream] = None
+        self.warm_decoder = warm_decoder
+        self.decoder_ready = threading.Event()
+        # One decoder, one transcription at a time
+        self._decoder_lock = threading.Lock()
+        self.started_at = time.time()
+        self.commands = 0
+        self.errors = 0
+        self._stats_lock = threading.Lock()
+        self.parser = self._build_parser()
+        self.server: Optional[socketserver.UnixStreamServer] = None
+
+    def start(self) -> "ControlDaemon":
+        """
+        Warm everything up and handle commands on a background thread
+
+        Returns:
+            self
+        """
+        self._warm_up()
+        self._bind()
+        threading.Thread(target=self._serve, name="misty-daemon", daemon=True).start()
+        return self
+
+    def serve_forever(self):
+        """
+        Warm everything up and handle commands until interrupted or sent `shutdown`
+        """
+        self._warm_up()
+        self._bind()
+        print(f"Misty control daemon for {self.base_url} listening on {self.socket_path}")
+        self._serve()
+
+    def shutdown(self):
+        """
+        Stop accepting commands and close the robot connections
+        """
+        if self.server is not None:
+            self.server.shutdown()
+
+    def _serve(self):
+        try:
+            self.server.serve_forever()
+        finally:
+            self._close()
+
+    def _warm_up(self):
+        # Open a pooled connection before the first operator command needs it
+        response = self.client.get("/api/device")
+        if not response.ok:
+            print(f"Warning: {self.base_url} answered /api/device with {response.status_code}")
+        self.client.refresh_utterances()
+
+        if self.use_events:
+            try:
+                self.events = MistyEventStream(self.events_url).connect()
+                # A capture's file appears when it ends, not when `record` returns
+                self.client.cache.follow(self.events)
+            except Exception as e:
+                print(f"Could not open the event stream ({e}), `record` will wait the full capture budget")
+                self.events = None
+
+        if self.warm_decoder:
+            # Loading the models takes seconds; don't hold up robot commands for it
+            threading.Thread(target=self._load_decoder, name="misty-daemon-decoder", daemon=True).start()
+
+    def _load_decoder(self):
+        get_decoder()
+        self.decoder_ready.set()
+
+    def _bind(self):
+        if os.path.exists(self.socket_path):
+            # A socket left by a daemon that died; refuse to steal one that is still answering
+            try:
+                send(["ping"], self.socket_path, timeout=1.0)
+                raise RuntimeError(f"A control daemon is already listening on {self.socket_path}")
+            except OSError:
+                os.unlink(self.socket_path)
+        # Commands move the robot: only this user may send them, from the moment the socket exists
+        umask = os.umask(0o077)
+        try:
+            self.server = socketserver.ThreadingUnixStreamServer(self.socket_path, _Handler)
+        finally:
+            os.umask(umask)
+        self.server.daemon_threads = True
+        self.server.control = self
+        os.chmod(self.socket_path, 0o600)
+
+    def _close(self):
+        self.server.server_close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        if self.events is not None:
+            self.events.close()
+            self.events = None
+
+    def execute(self, argv: List[str], cwd: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Run one command line
+
+        Args:
+            argv: Command and its arguments (e.g. ['led', '255', '0', '0'])
+            cwd: Directory relative paths are resolved against (the caller's)
+
+        Returns:
+            Dict with ok, output (text for the operator), result (JSON value) and elapsed_ms
+        """
+        started = time.perf_counter()
+        ok, output, result = True, "", None
+        try:
+            args = self.parser.parse_args(argv)
+            args.cwd = cwd or os.getcwd()
+            output, result = args.handler(args)
+        except _HelpRequested as e:
+            output = str(e).rstrip()
+        except CommandError as e:
+            ok, output = False, str(e).rstrip()
+        except Exception as e:
+            ok, output = False, f"Error: {type(e).__name__}: {e}"
+
+        with self._stats_lock:
+            self.commands += 1
+            if not ok:
+                self.errors += 1
+        return {
+            "ok": ok,
+            "output": output,
+            "result": result,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 3),
+        }
+
+    def _build_parser(self) -> argparse.ArgumentParser:
+        parser = _ArgumentParser(prog="misty", description="Send commands to the Misty control daemon")
+        commands = parser.add_subparsers(dest="command", metavar="COMMAND", required=True,
+                                       parser_class=_ArgumentParser)
+
+        def command(name, handler, help):
+            sub = commands.add_parser(name, help=help, description=help)
+            sub.set_defaults(handler=handler)
+            return sub
+
+        command("help", self._cmd_help, "List the commands")
+        command("ping", self._cmd_ping, "Check that the daemon is up")
+        command("status", self._cmd_status, "Show the daemon's connections and counters")
+        command("shutdown", self._cmd_shutdown, "Stop the daemon")
+
+        sub = command("led", self._cmd_led, "Set the chest LED color")
+        for channel in ("red", "green", "blue"):
+            sub.add_argument(channel, type=_color_channel, metavar=channel.upper())
+
+        sub = command("say", self._cmd_say, "Speak a line (pre-rendered audio when it has been said before)")
+        sub.add_argument("text", nargs="+")
+        sub.add_argument("--voice")
+        sub.add_argument("--pitch", type=float)
+        sub.add_argument("--rate", type=float)
+
+        sub = command("head", self._cmd_head, "Move the head (degrees)")
+        sub.add_argument("pitch", type=float)
+        sub.add_argument("roll", type=float, nargs="?", default=0.0)
+        sub.add_argument("yaw", type=float, nargs="?", default=0.0)
+        sub.add_argument("--velocity", type=float, default=80.0)
+
+        sub = command("arm", self._cmd_arm, "Move an arm (degrees)")
+        sub.add_argument("arm", choices=("left", "right", "both"))
+        sub.add_argument("position", type=float)
+        sub.add_argument("--velocity", type=float, default=80.0)
+
+        sub = command("play", self._cmd_play, "Play an audio asset on the robot")
+        sub.add_argument("filename")
+        sub.add_argument("--volume", type=int)
+
+        command("stop", self._cmd_stop, "Stop driving")
+        command("battery", self._cmd_battery, "Show the battery level")
+
+        sub = command("record", self._cmd_record, "Capture speech, optionally download and transcribe it")
+        sub.add_argument("--filename", default="capture_speech.wav")
+        sub.add_argument("--seconds", type=float, default=10.0, help="Maximum capture length")
+        sub.add_argument("--silence", type=float, default=5.0, help="Stop after this much silence")
+        sub.add_argument("--download", action="store_true", help="Save the recording locally")
+        sub.add_argument("--save-path", help="Where to save it (default: the filename, in the caller's directory)")
+        sub.add_argument("--transcribe", action="store_true", help="Transcribe while downloading")
+
+        sub = command("transcribe", self._cmd_transcribe, "Transcribe a local WAV file with the warm decoder")
+        sub.add_argument("path")
+
+        for method in ("get", "post", "delete"):
+            sub = command(method, self._cmd_raw, f"Send a raw {method.upper()} request")
+            sub.add_argument("endpoint")
+            sub.add_argument("body", nargs="?", help="JSON body (POST) or query parameters")
+            sub.set_defaults(method=method)
+        return parser
+
+    def _check(self, response, action: str) -> Any:
+        # Raise on anything but 2xx, return the decoded body
+        try:
+            body = response.json()
+        except ValueError:
+            body = response.text
+        if not response.ok:
+            error = body.get("error") if isinstance(body, dict) else body
+            raise CommandError(f"Could not {action}: {response.status_code} {error}")
+        return body
+
+    def _cmd_help(self, args):
+        return self.parser.format_help(), None
+
+    def _cmd_ping(self, args):
+        return "pong", None
+
+    def _cmd_status(self, args):
+        status = {
+            "robot": self.base_url,
+            "socket": self.socket_path,
+            "uptime_s": round(time.time() - self.started_at, 1),
+            "events": self.events is not None,
+            "decoder_ready": self.decoder_ready.is_set(),
+            "commands": self.commands,
+            "errors": self.errors,
+            "utterances": self.client.utterances.stats(),
+            "cache": self.client.cache.stats(),
+            "breaker": self.client.resilience.breaker.stats(),
+        }
+        return json.dumps(status, indent=2), status
+
+    def _cmd_shutdown(self, args):
+        # From a handler thread serve_forever has to return first; give the reply time to go out
+        threading.Timer(0.1, self.server.shutdown).start()
+        return "Shutting down", None
+
+    def _cmd_led(self, args):
+        color = {"Red": args.red, "Green": args.green, "Blue": args.blue}
+        self._check(self.client.post("/api/led", data=color), "set the LED")
+        return f"LED {args.red} {args.green} {args.blue}", color
+
+    def _cmd_say(self, args):
+        voice = {k: v for k, v in (("Voice", args.voice), ("Pitch", args.pitch),
+                                   ("SpeechRate", args.rate)) if v is not None}
+        text = " ".join(args.text)
+        self._check(self.client.speak(text, **voice), "speak")
+        return f"Said {text!r}", {"text": text}
+
+    def _cmd_head(self, args):
+        body = {"Pitch": args.pitch, "Roll": args.roll, "Yaw": args.yaw, "Velocity": args.velocity}
+        self._check(self.client.post("/api/head", data=body), "move the head")
+        return f"Head pitch={args.pitch:g} roll={args.roll:g} yaw={args.yaw:g}", body
+
+    def _cmd_arm(self, args):
+        body = {"Arm": args.arm, "Position": args.position, "Velocity": args.velocity}
+        self._check(self.client.post("/api/arms", data=body), "move the arm")
+        return f"{args.arm.capitalize()} arm to {args.position:g}", body
+
+    def _cmd_play(self, args):
+        body = {"FileName": args.filename}
+        if args.volume is not None:
+            body["Volume"] = args.volume
+        self._check(self.client.post("/api/audio/play", data=body), f"play {args.filename}")
+        return f"Playing {args.filename}", body
+
+    def _cmd_stop(self, args):
+        self._check(self.client.post("/api/drive/stop"), "stop")
+        return "Stopped", None
+
+    def _cmd_battery(self, args):
+        body = self._check(self.client.get("/api/battery"), "read the battery")
+        battery = body.get("result", body) if isinstance(body, dict) else body
+        if isinstance(battery, dict) and "chargePercent" in battery:
+            charging = " (charging)" if battery.get("isCharging") else ""
+            return f"{battery['chargePercent'] * 100:.0f}%{charging}", battery
+        return json.dumps(battery, indent=2), battery
+
+    def _cmd_record(self, args):
+        filename = args.filename
+        max_ms = int(args.seconds * 1000)
+        # Subscribe before starting, so a short capture can't finish unseen
+        future = self.events.recording_complete(filename) if self.events is not None else None
+        self._check(self.client.start_recording(filename, max_speech_length_ms=max_ms,
+                                                silence_timeout_ms=int(args.silence * 1000)),
+                    "start recording")
+
+        started = time.perf_counter()
+        finished = None
+        if future is not None:
+            finished = self.events.wait_for_recording_complete(
+                filename, timeout=args.seconds + RECORDING_GRACE_S, future=future)
+        else:
+            time.sleep(args.seconds)
+        if finished is None:
+            self.client.stop_recording()
+        result: Dict[str, Any] = {"filename": filename,
+                                  "record_ms": round((time.perf_counter() - started) * 1000, 1)}
+        output = f"Recorded {filename} ({result['record_ms'] / 1000:.1f} s)"
+
+        if args.download or args.transcribe:
+            # Transcript only: the file still streams through a scratch path, then goes away
+            save_path = os.path.join(args.cwd, args.save_path or filename) if args.download else \
+                os.path.join(tempfile.gettempdir(), f"misty-daemon-{os.getpid()}-{filename}")
+            with self._decoder_lock if args.transcribe else nullcontext():
+                transcriber = StreamingTranscriber() if args.transcribe else None
+                try:
+                    # Captures reuse their name, so a leftover .part is never the same recording
+                    ok = self.client.download_audio_recording(
+                        filename, save_path, resume=False,
+                        on_chunk=transcriber.feed if transcriber is not None else None)
+                    text = transcriber.finish() if ok and transcriber is not None else None
+                finally:
+                    if transcriber is not None:
+                        transcriber.abort()
+                    if not args.download and os.path.exists(save_path):
+                        os.unlink(save_path)
+            if not ok:
+                raise CommandError(f"{output}, but could not download it")
+            if args.download:
+                result["saved"] = save_path
+                output += f", saved to {save_path}"
+            if transcriber is not None:
+                result["text"] = text
+                output += f"\nYou said: {text!r}" if text else "\n(no speech recognized)"
+        return output, result
+
+    def _cmd_transcribe(self, args):
+        path = os.path.join(args.cwd, args.path)
+        if not os.path.exists(path):
+            raise CommandError(f"No such file: {path}")
+        started = time.perf_counter()
+        with self._decoder_lock:
+            text = transcribe_stream(iter_decoder_pcm(path))
+        decode_ms = round((time.perf_counter() - started) * 1000, 1)
+        return text or "(no speech recognized)", {"text": text, "decode_ms": decode_ms}
+
+    def _cmd_raw(self, args):
+        body = None
+        if args.body:
+            try:
+                body = json.loads(args.body)
+            except ValueError as e:
+                raise CommandError(f"Body is not valid JSON: {e}")
+        if args.method == "get":
+            response = self.client.get(args.endpoint, params=body)
+        elif args.method == "post":
+            response = self.client.post(args.endpoint, data=body)
+        else:
+            response = self.client.delete(args.endpoint, params=body)
+        result = self._check(response, f"{args.method.upper()} {args.endpoint}")
+        return json.dumps(result, indent=2), result
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        daemon: ControlDaemon = self.server.control
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                argv = request["argv"]
+                if isinstance(argv, str):
+                    argv = shlex.split(argv)
+            except (ValueError, KeyError, TypeError) as e:
+                reply = {"ok": False, "output": f"Bad request: {e}", "result": None, "elapsed_ms": 0.0}
+            else:
+                reply = daemon.execute([str(arg) for arg in argv], request.get("cwd"))
+            self.wfile.write(json.dumps(reply).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+
+def run_daemon(argv: List[str]) -> int:
+    """
+    Run a daemon in the foreground from `misty.py daemon ...` arguments
+
+    Args:
+        argv: [BASE_URL] [--socket PATH] [--no-events] [--no-decoder] [--session-log PATH]
+
+    Returns:
+        Exit code
+    """
+    parser = argparse.ArgumentParser(prog="misty daemon", description="Run the Misty control daemon")
+    parser.add_argument("base_url", nargs="?", help="Robot base URL (omit to run against a local simulator)")
+    parser.add_argument("--socket", help="Unix socket to listen on")
+    parser.add_argument("--no-events", action="store_true", help="Don't open the event stream")
+    parser.add_argument("--no-decoder", action="store_true", help="Load the STT models on first use")
+    parser.add_argument("--session-log", help="Record every request to this JSONL file")
+    args = parser.parse_args(argv)
+
+    simulator = None
+    base_url, events_url = args.base_url, None
+    if base_url is None:
+        from misty_simulator import MistySimulator
+        simulator = MistySimulator(latency_ms=10, endpoint_latency_ms={"/api/tts/speak": 350},
+                                   events=True).start()
+        base_url, events_url = simulator.base_url, simulator.event_server.url
+        print(f"Simulated Misty at {base_url}")
+
+    session_log = SessionLogger(args.session_log) if args.session_log else None
+    daemon = ControlDaemon(base_url, args.socket, events=not args.no_events, events_url=events_url,
+                           warm_decoder=not args.no_decoder, session_log=session_log)
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down")
+    finally:
+        if session_log is not None:
+            session_log.close()
+        if simulator is not None:
+            simulator.stop()
+    return 0
+
+
+def main():
+    # ============ CONFIGURATION - CHANGE THESE ============
+    BASE_URL = "http://192.168.0.111"  # Misty Robot IP Address; None = local simulator
+    SOCKET_PATH = None                 # None = $MISTY_SOCKET or /tmp/misty-<uid>.sock
+    SESSION_LOG = None                 # e.g. "session_log.jsonl"
+
+    argv = [BASE_URL] if BASE_URL else []
+    if SOCKET_PATH:
+        argv += ["--socket", SOCKET_PATH]
+    if SESSION_LOG:
+        argv += ["--session-log", SESSION_LOG]
+    return run_daemon(argv)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,460 @@
+#!/usr/bin/env python3
+"""
+Pipelined dialogue turns for Misty
+Runs capture -> download + transcribe -> respond -> speak with a latency budget per stage,
+overlapping stages where it can and falling back to filler speech when a stage runs over
+"""
+
+import json
+import os
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Any, List, Callable
+
+import requests
+
+from audio_api_client import APIClient
+from events import MistyEventStream
+from resilience import Resilience
+from session_log import SessionLogger
+from utterance_cache import UtteranceCache
+
+GREETING = "Hi! What can I get for you today?"
+
+# Responders map a transcript (None if nothing was understood) to the reply text
+Responder = Callable[[Optional[str]], str]
+
+FILLER_THINKING = "Hmm, let me see."
+FILLER_REPEAT = "Sorry, could you say that one more time?"
+
+DEFAULT_MENU = {
+    "coffee": 3.00,
+    "latte": 4.50,
+    "tea": 2.50,
+    "sandwich": 7.00,
+    "salad": 6.50,
+    "muffin": 2.75,
+}
+
+# Add-on suggested for each item by the upselling strategy
+DEFAULT_ADD_ONS = {
+    "coffee": "a muffin",
+    "latte": "an extra shot",
+    "tea": "a muffin",
+    "sandwich": "a side salad",
+    "salad": "a sandwich",
+    "muffin": "a coffee",
+}
+
+
+class ScriptedResponder:
+    def __init__(self, strategy: str = "reinforcement", menu: Optional[Dict[str, float]] = None,
+                 add_ons: Optional[Dict[str, str]] = None):
+        """
+        Local stand-in for a response generator: keyword-matches menu items in the transcript
+
+        Args:
+            strategy: 'reinforcement' (affirm the choice) or 'upsell' (suggest an add-on)
+            menu: Item name -> price
+            add_ons: Item name -> add-on suggested by the upsell strategy
+        """
+        if strategy not in ("reinforcement", "upsell"):
+            raise ValueError(f"Unknown strategy: {strategy}")
+        self.strategy = strategy
+        self.menu = menu or DEFAULT_MENU
+        self.add_ons = add_ons or DEFAULT_ADD_ONS
+
+    def __call__(self, transcript: Optional[str]) -> str:
+        words = (transcript or "").lower()
+        items = [item for item in self.menu if item in words]
+        if not items:
+            return FILLER_REPEAT
+        order = " and ".join(items)
+        if self.strategy == "upsell":
+            add_on = self.add_ons.get(items[0])
+            if add_on:
+                return f"One {order}, coming up. Would you like to add {add_on} with that?"
+        return f"Excellent choice! One {order}, coming right up."
+
+    def phrases(self) -> List[str]:
+        """
+        Every line this responder can say for a single-item order, plus the fillers
+
+        Returns:
+            Texts to pre-render with APIClient.warm_utterances
+        """
+        lines = [FILLER_THINKING, FILLER_REPEAT]
+        lines.extend(self(item) for item in self.menu)
+        return lines
+
+
+@dataclass
+class StageBudgets:
+    capture_s: float = 15.0        # Longest the participant may talk (waiting for end of speech)
+    transcribe_ms: float = 1200.0  # Download + decode after end of speech
+    respond_ms: float = 400.0      # Response generation before the thinking filler is spoken
+    late_reply_ms: float = 2000.0  # Extra wait for a reply after the filler
+    speak_ms: float = 300.0        # Until the robot acknowledges the TTS request
+    target_ms: float = 2000.0      # Goal from end of speech to start of reply
+
+
+@dataclass
+class StageTrace:
+    name: str
+    start_ms: float
+    end_ms: float
+    budget_ms: Optional[float]
+    outcome: str = "ok"            # ok, timeout, error, fallback or skipped
+    detail: Optional[str] = None
+
+    @property
+    def duration_ms(self) -> float:
+        return self.end_ms - self.start_ms
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "start_ms": round(self.start_ms, 3),
+            "end_ms": round(self.end_ms, 3),
+            "duration_ms": round(self.duration_ms, 3),
+            "budget_ms": self.budget_ms,
+            "outcome": self.outcome,
+            "detail": self.detail,
+        }
+
+
+@dataclass
+class TurnTrace:
+    turn: int
+    started_at: float
+    stages: List[StageTrace] = field(default_factory=list)
+    transcript: Optional[str] = None
+    reply: Optional[str] = None
+    filler: Optional[str] = None
+    end_of_speech_ms: Optional[float] = None
+    reply_started_ms: Optional[float] = None
+
+    @property
+    def response_latency_ms(self) -> Optional[float]:
+        """
+        Time from end of speech to the first thing the robot said (filler or reply)
+        """
+        if self.end_of_speech_ms is None or self.reply_started_ms is None:
+            return None
+        return self.reply_started_ms - self.end_of_speech_ms
+
+    def to_dict(self) -> Dict[str, Any]:
+        latency = self.response_latency_ms
+        return {
+            "turn": self.turn,
+            "started_at": self.started_at,
+            "transcript": self.transcript,
+            "reply": self.reply,
+            "filler": self.filler,
+            "end_of_speech_ms": self.end_of_speech_ms,
+            "reply_started_ms": self.reply_started_ms,
+            "response_latency_ms": round(latency, 3) if latency is not None else None,
+            "stages": [stage.to_dict() for stage in self.stages],
+        }
+
+
+class DialogueOrchestrator:
+    def __init__(self, client: APIClient, events: Optional[MistyEventStream] = None,
+                 responder: Optional[Responder] = None, budgets: Optional[StageBudgets] = None,
+                 filename: str = "capture_Dialogue.wav", work_dir: str = ".",
+                 transcriber_factory: Optional[Callable[[], Any]] = None,
+                 max_speech_length_ms: int = 10000, silence_timeout_ms: int = 1500,
+                 trace_file: Optional[str] = None):
+        """
+        Initialize an orchestrator for one robot
+
+        The decoder is loaded while the participant is still talking, and the recording is
+        decoded chunk by chunk as it downloads, so transcription finishes shortly after
+        the last byte arrives.
+
+        Args:
+            client: Audio API client for the robot
+            events: Connected event stream, used to learn the moment speech capture ends
+                    (without it each turn waits the full capture budget)
+            responder: Maps the transcript to the reply (defaults to ScriptedResponder())
+            budgets: Per-stage latency budgets and fallbacks
+            filename: Name the robot saves each capture under
+            work_dir: Where downloaded captures are kept
+            transcriber_factory: Returns an object with feed(chunk) and finish() for each turn, and
+                                 optionally abort() (called if the download fails) and a deadline
+                                 attribute (set to the time.monotonic() finish() should return by,
+                                 e.g. menu_grammar.MenuTranscriber skips a late full-model fallback)
+                                 (defaults to speech_to_text.StreamingTranscriber on the warm decoder)
+            max_speech_length_ms: Longest capture the robot records
+            silence_timeout_ms: Silence that ends the capture (directly adds to turn latency)
+            trace_file: Append each turn's trace to this JSON lines file
+        """
+        self.client = client
+        self.events = events
+        if events is not None and client.cache is not None:
+            # Each capture adds a file to the audio listing when it ends
+            client.cache.follow(events)
+        self.responder = responder or ScriptedResponder()
+        self.budgets = budgets or StageBudgets()
+        self.filename = filename
+        self.save_path = os.path.join(work_dir, filename)
+        self.transcriber_factory = transcriber_factory
+        self.max_speech_length_ms = max_speech_length_ms
+        self.silence_timeout_ms = silence_timeout_ms
+        self.trace_file = trace_file
+        self.turns = 0
+        self._pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="dialogue")
+        self._warm: Optional[Future] = None
+        # A transcription that overran its budget still owns the decoder until it finishes
+        self._pending_transcription: Optional[Future] = None
+
+    def _new_transcriber(self):
+        if self.transcriber_factory is not None:
+            return self.transcriber_factory()
+        from speech_to_text import StreamingTranscriber
+        return StreamingTranscriber()
+
+    def _warm_up(self):
+        if self.transcriber_factory is None:
+            from speech_to_text import get_decoder
+            get_decoder()
+
+    def _transcribe(self, deadline: Optional[float] = None) -> Optional[str]:
+        if self._warm is not None:
+            self._warm.result()
+        transcriber = self._new_transcriber()
+        if deadline is not None and hasattr(transcriber, "deadline"):
+            transcriber.deadline = deadline
+        try:
+            if not self.client.download_audio_recording(self.filename, self.save_path,
+                                                        resume=False, on_chunk=transcriber.feed):
+                raise RuntimeError(f"Download of {self.filename} failed")
+            text = transcriber.finish()
+        except BaseException:
+            # A half-fed transcriber holds the decoder; give it back for the next turn
+            abort = getattr(transcriber, "abort", None)
+            if abort is not None:
+                abort()
+            raise
+        # Grammar transcribers (menu_grammar.MenuTranscriber) also fill order slots
+        slots = getattr(transcriber, "result", None)
+        if slots is not None:
+            self.client.log_event("order_slots", turn=self.turns, **slots.to_dict())
+        return text
+
+    def _speak(self, trace: TurnTrace, t0: float, name: str, text: str) -> bool:
+        start = (time.perf_counter() - t0) * 1000
+        stage = StageTrace(name, start, start, self.budgets.speak_ms)
+        try:
+            response = self.client.speak(text, timeout=(self.budgets.speak_ms / 1000, self.budgets.speak_ms / 1000))
+            if not response.ok:
+                stage.outcome, stage.detail = "error", f"HTTP {response.status_code}"
+        except requests.Timeout:
+            stage.outcome = "timeout"
+        except requests.RequestException as e:
+            stage.outcome, stage.detail = "error", type(e).__name__
+        stage.end_ms = (time.perf_counter() - t0) * 1000
+        trace.stages.append(stage)
+        if stage.outcome == "ok" and trace.reply_started_ms is None:
+            trace.reply_started_ms = stage.end_ms
+        return stage.outcome == "ok"
+
+    def _elapsed(self, t0: float) -> float:
+        return (time.perf_counter() - t0) * 1000
+
+    def run_turn(self) -> TurnTrace:
+        """
+        Listen to one utterance and answer it
+
+        Returns:
+            Trace of the turn, with stage timings relative to the start of the turn
+        """
+        self.turns += 1
+        budgets = self.budgets
+        trace = TurnTrace(self.turns, time.time())
+        t0 = time.perf_counter()
+
+        # ---- capture: subscribe first so the end-of-speech event cannot be missed ----
+        if self._warm is None:
+            self._warm = self._pool.submit(self._warm_up)
+        capture_done = self.events.recording_complete(self.filename) if self.events is not None else None
+        stage = StageTrace("capture", 0.0, 0.0, budgets.capture_s * 1000)
+        try:
+            response = self.client.start_recording(self.filename, self.max_speech_length_ms,
+                                                   self.silence_timeout_ms)
+            if not response.ok:
+                stage.outcome, stage.detail = "error", f"HTTP {response.status_code}"
+        except requests.RequestException as e:
+            stage.outcome, stage.detail = "error", type(e).__name__
+
+        if stage.outcome == "ok":
+            if capture_done is None:
+                time.sleep(budgets.capture_s)
+                stage.outcome, stage.detail = "fallback", "no event stream, waited the full budget"
+            else:
+                try:
+                    message = capture_done.result(timeout=budgets.capture_s)
+                    if not message.get("success", True):
+                        stage.outcome, stage.detail = "error", message.get("errorMessage")
+                except FutureTimeoutError:
+                    capture_done.cancel()
+                    stage.outcome = "timeout"
+                    try:
+                        self.client.stop_recording()
+                    except requests.RequestException as e:
+                        # Misty stops on its own at MaxSpeechLength; still transcribe what was captured
+                        stage.detail = f"stop_recording failed: {type(e).__name__}"
+        elif capture_done is not None:
+            capture_done.cancel()
+        stage.end_ms = trace.end_of_speech_ms = self._elapsed(t0)
+        trace.stages.append(stage)
+        self.client.log_event("recording_complete", filename=self.filename, outcome=stage.outcome)
+
+        if stage.outcome == "error":
+            self._speak(trace, t0, "speak", FILLER_REPEAT)
+            trace.filler = FILLER_REPEAT
+            return self._finish(trace)
+
+        # ---- download + transcribe, overlapped chunk by chunk ----
+        start = self._elapsed(t0)
+        stage = StageTrace("transcribe", start, start, budgets.transcribe_ms)
+        pending = self._pending_transcription
+        if pending is not None and not pending.done():
+            stage.detail = "waited for the previous turn's decode"
+            wait([pending], timeout=budgets.transcribe_ms / 1000)
+        if pending is not None and not pending.done():
+            # A second decode would share its (not thread-safe) decoder and its download path
+            stage.outcome, stage.detail = "timeout", "previous turn's decode still running"
+        else:
+            self._pending_transcription = None
+            remaining_s = max(0.0, budgets.transcribe_ms - (self._elapsed(t0) - start)) / 1000
+            # Less a little for handing the transcript back, so a bounded decode lands inside the budget
+            deadline = time.monotonic() + max(0.0, remaining_s - 0.1)
+            transcription = self._pool.submit(self._transcribe, deadline)
+            try:
+                trace.transcript = transcription.result(timeout=remaining_s)
+            except FutureTimeoutError:
+                stage.outcome = "timeout"
+                self._pending_transcription = transcription
+            except Exception as e:
+                stage.outcome, stage.detail = "error", str(e)
+        stage.end_ms = self._elapsed(t0)
+        trace.stages.append(stage)
+        self.client.log_event("transcription", file=self.save_path, mode="stream",
+                              text=trace.transcript, outcome=stage.outcome,
+                              elapsed_ms=round(stage.duration_ms, 3))
+
+        # ---- respond, with a filler if generation runs over ----
+        start = self._elapsed(t0)
+        stage = StageTrace("respond", start, start, budgets.respond_ms)
+        if trace.stages[-1].outcome != "ok":
+            stage.outcome, stage.detail = "skipped", "no transcript"
+            trace.reply = FILLER_REPEAT
+        else:
+            reply = self._pool.submit(self.responder, trace.transcript)
+            try:
+                trace.reply = reply.result(timeout=budgets.respond_ms / 1000)
+            except FutureTimeoutError:
+                stage.outcome = "fallback"
+                trace.filler = FILLER_THINKING
+                self._speak(trace, t0, "speak_filler", FILLER_THINKING)
+                try:
+                    trace.reply = reply.result(timeout=budgets.late_reply_ms / 1000)
+                except FutureTimeoutError:
+                    stage.outcome, stage.detail = "timeout", "no reply after the filler"
+                    trace.reply = FILLER_REPEAT
+                except Exception as e:
+                    stage.outcome, stage.detail = "error", str(e)
+                    trace.reply = FILLER_REPEAT
+            except Exception as e:
+                stage.outcome, stage.detail = "error", str(e)
+                trace.reply = FILLER_REPEAT
+        stage.end_ms = self._elapsed(t0)
+        trace.stages.append(stage)
+
+        # ---- speak ----
+        self._speak(trace, t0, "speak", trace.reply)
+        return self._finish(trace)
+
+    def _finish(self, trace: TurnTrace) -> TurnTrace:
+        self.client.log_event("turn", **trace.to_dict())
+        latency = trace.response_latency_ms
+        over = [s.name for s in trace.stages if s.outcome != "ok"]
+        self.client.log(f"Turn {trace.turn}: {trace.transcript!r} -> {trace.reply!r} "
+                        f"({'no reply' if latency is None else f'{latency:.0f} ms'}"
+                        f"{', ' + ', '.join(over) + ' fell back' if over else ''})")
+        if latency is not None and latency > self.budgets.target_ms:
+            print(f"Warning: turn {trace.turn} took {latency:.0f} ms from end of speech to reply "
+                  f"(target {self.budgets.target_ms:.0f} ms)")
+        if self.trace_file:
+            with open(self.trace_file, 'a') as f:
+                f.write(json.dumps(trace.to_dict()) + "\n")
+        return trace
+
+    def run(self, turns: int) -> List[TurnTrace]:
+        """
+        Run several turns back to back
+
+        Args:
+            turns: Number of turns
+
+        Returns:
+            One trace per turn
+        """
+        return [self.run_turn() for _ in range(turns)]
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def main():
+    # ============ CONFIGURATION - CHANGE THESE ============
+    BASE_URL = "http://192.168.0.111"  # Misty Robot IP Address
+    STRATEGY = "reinforcement"         # or "upsell"
+    TURNS = 3
+    TRACE_FILE = "dialogue_trace.jsonl"
+    SESSION_LOG = "session_log.jsonl"     # Every request, recording and transcription this session
+    MENU_GRAMMAR = True                   # Decode against the menu instead of general English
+
+    session_log = SessionLogger(SESSION_LOG)
+    # Scripted lines are rendered once and played back as audio assets; a stalled call or a
+    # robot that dropped off the Wi-Fi fails its stage instead of hanging the turn
+    client = APIClient(BASE_URL, quiet=True, session_log=session_log, utterances=UtteranceCache(),
+                       resilience=Resilience())
+    responder = ScriptedResponder(STRATEGY)
+    client.warm_utterances([GREETING, *responder.phrases()])
+    events = MistyEventStream(BASE_URL)
+    try:
+        events.connect()
+    except Exception as e:
+        print(f"Could not open the event stream ({e}), every turn will wait the full capture budget")
+        events = None
+
+    transcriber_factory = None
+    if MENU_GRAMMAR:
+        from menu_grammar import MenuGrammar
+
+        grammar = MenuGrammar(responder.menu, responder.add_ons.values())
+        grammar.get_decoder()
+        transcriber_factory = grammar.transcriber
+
+    with DialogueOrchestrator(client, events, responder, trace_file=TRACE_FILE,
+                              transcriber_factory=transcriber_factory) as dialogue:
+        client.speak(GREETING)
+        dialogue.run(TURNS)
+
+    if events is not None:
+        events.close()
+    session_log.close()
+    print(f"\nTraces saved to: {TRACE_FILE}, session log to: {SESSION_LOG}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+Misty WebSocket event subscriptions
+Subscribe to named robot events (VoiceRecord, BatteryCharge, FaceRecognition, ...)
+instead of polling or sleeping, plus a local stand-in server for offline testing
+"""
+
+import itertools
+import json
+import threading
+from concurrent.futures import Future, InvalidStateError, TimeoutError as FutureTimeoutError
+from typing import Optional, Dict, Any, List, Callable
+
+from websockets.exceptions import ConnectionClosed
+from websockets.sync.client import connect
+from websockets.sync.server import serve
+
+EventCallback = Callable[[Dict[str, Any]], None]
+EventFilter = Callable[[Dict[str, Any]], bool]
+
+_event_ids = itertools.count(1)
+
+
+def websocket_url(base_url: str) -> str:
+    """
+    Get Misty's pub/sub WebSocket URL from the REST base URL
+
+    Args:
+        base_url: REST base URL (e.g., 'http://192.168.0.111')
+
+    Returns:
+        WebSocket URL (e.g., 'ws://192.168.0.111/pubsub')
+    """
+    base_url = base_url.rstrip('/')
+    if base_url.startswith("https://"):
+        return "wss://" + base_url[len("https://"):] + "/pubsub"
+    if base_url.startswith("http://"):
+        return "ws://" + base_url[len("http://"):] + "/pubsub"
+    return base_url + "/pubsub"
+
+
+def _settle(future: Future, result: Any = None, exception: Optional[BaseException] = None):
+    # A waiter can be cancelled from another thread (e.g. a capture that timed out) between
+    # a done() check and set_result(), which would raise here and kill the reader thread
+    try:
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+    except InvalidStateError:
+        pass
+
+
+class Subscription:
+    def __init__(self, event_type: str, event_name: str,
+                 callback: Optional[EventCallback], event_filter: Optional[EventFilter]):
+        self.event_type = event_type
+        self.event_name = event_name
+        self.callback = callback
+        self.event_filter = event_filter
+        self._waiters: List[Future] = []
+
+    def matches(self, message: Dict[str, Any]) -> bool:
+        return self.event_filter is None or self.event_filter(message)
+
+
+class MistyEventStream:
+    def __init__(self, base_url: str, open_timeout: float = 5.0):
+        """
+        Initialize an event stream for one robot (call connect() before subscribing)
+
+        Args:
+            base_url: REST base URL of the robot (e.g., 'http://192.168.0.111')
+                      or a ws:// URL to connect to directly
+            open_timeout: Seconds to wait for the WebSocket handshake
+        """
+        if base_url.startswith(("ws://", "wss://")):
+            self.url = base_url
+        else:
+            self.url = websocket_url(base_url)
+        self.open_timeout = open_timeout
+        self.subscriptions: Dict[str, Subscription] = {}
+        self._lock = threading.Lock()
+        self._ws = None
+        self._reader: Optional[threading.Thread] = None
+
+    def connect(self) -> "MistyEventStream":
+        """
+        Open the WebSocket and start dispatching events on a background thread
+
+        Returns:
+            self, so it can be used as `with MistyEventStream(url).connect() as events:`
+        """
+        self._ws = connect(self.url, open_timeout=self.open_timeout)
+        self._reader = threading.Thread(target=self._read_loop, name="misty-events", daemon=True)
+        self._reader.start()
+        return self
+
+    def subscribe(self, event_type: str, event_name: Optional[str] = None,
+                  callback: Optional[EventCallback] = None,
+                  event_filter: Optional[EventFilter] = None,
+                  debounce_ms: int = 100,
+                  event_conditions: Optional[List[Dict[str, Any]]] = None,
+                  return_property: Optional[str] = None) -> Subscription:
+        """
+        Subscribe to a Misty event
+
+        Args:
+            event_type: Misty event type (e.g., 'VoiceRecord', 'BatteryCharge')
+            event_name: Unique name for this subscription (generated if not given)
+            callback: Called with each event message; runs on the reader thread, so keep it short
+            event_filter: Local predicate; messages it rejects are dropped
+            debounce_ms: Minimum time between events from the robot
+            event_conditions: Robot-side filters, e.g. [{"Property": "filename", "Inequality": "=", "Value": "x.wav"}]
+            return_property: Only send this property of the event
+
+        Returns:
+            The subscription
+        """
+        if event_name is None:
+            event_name = f"{event_type}-{next(_event_ids)}"
+        subscription = Subscription(event_type, event_name, callback, event_filter)
+        with self._lock:
+            self.subscriptions[event_name] = subscription
+
+        self._send({
+            "Operation": "subscribe",
+            "Type": event_type,
+            "DebounceMs": debounce_ms,
+            "EventName": event_name,
+            "ReturnProperty": return_property,
+            "EventConditions": event_conditions or [],
+        })
+        return subscription
+
+    def unsubscribe(self, event_name: str):
+        """
+        Stop receiving an event
+
+        Args:
+            event_name: Name the subscription was registered under
+        """
+        with self._lock:
+            subscription = self.subscriptions.pop(event_name, None)
+        if subscription is None:
+            return
+        for waiter in subscription._waiters:
+            waiter.cancel()
+        try:
+            self._send({"Operation": "unsubscribe", "EventName": event_name, "Message": ""})
+        except ConnectionClosed:
+            pass
+
+    def next_event(self, event_type: str, event_filter: Optional[EventFilter] = None,
+                   debounce_ms: int = 100,
+                   event_conditions: Optional[List[Dict[str, Any]]] = None) -> Future:
+        """
+        Subscribe and get a future for the first matching event
+
+        Subscribe before triggering the action so the event cannot be missed.
+        The subscription is removed once the future completes. Use
+        asyncio.wrap_future() to await it from a coroutine.
+
+        Args:
+            event_type: Misty event type
+            event_filter: Local predicate the message must satisfy
+            debounce_ms: Minimum time between events from the robot
+            event_conditions: Robot-side filters
+
+        Returns:
+            Future resolving to the event message
+        """
+        subscription = self.subscribe(event_type, event_filter=event_filter,
+                                      debounce_ms=debounce_ms, event_conditions=event_conditions)
+        future: Future = Future()
+        subscription._waiters.append(future)
+        future.add_done_callback(lambda _: self.unsubscribe(subscription.event_name))
+        return future
+
+    def recording_complete(self, filename: Optional[str] = None) -> Future:
+        """
+        Get a future for the next VoiceRecord event, i.e. the end of a speech capture
+
+        Args:
+            filename: Only match the capture saved under this name
+
+        Returns:
+            Future resolving to the VoiceRecord message
+        """
+        event_filter = None
+        if filename is not None:
+            event_filter = lambda message: message.get("filename") in (None, filename)
+        return self.next_event("VoiceRecord", event_filter=event_filter)
+
+    def wait_for_recording_complete(self, filename: Optional[str] = None,
+                                    timeout: Optional[float] = None,
+                                    on_complete: Optional[EventCallback] = None,
+                                    future: Optional[Future] = None) -> Optional[Dict[str, Any]]:
+        """
+        Block until Misty reports that a speech capture has finished
+
+        Args:
+            filename: Only match the capture saved under this name
+            timeout: Seconds to wait before giving up (None waits forever)
+            on_complete: Called with the VoiceRecord message as soon as it arrives,
+                         e.g. to start the download
+            future: A future from recording_complete() taken before start_recording,
+                    so an event that arrives early is not missed
+
+        Returns:
+            The VoiceRecord message, or None on timeout
+        """
+        if future is None:
+            future = self.recording_complete(filename)
+        try:
+            message = future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            return None
+        if on_complete is not None:
+            on_complete(message)
+        return message
+
+    def close(self):
+        """
+        Unsubscribe from everything and close the WebSocket
+        """
+        for event_name in list(self.subscriptions):
+            self.unsubscribe(event_name)
+        if self._ws is not None:
+            self._ws.close()
+        if self._reader is not None:
+            self._reader.join(timeout=1.0)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _send(self, payload: Dict[str, Any]):
+        if self._ws is None:
+            raise RuntimeError("Event stream is not connected, call connect() first")
+        self._ws.send(json.dumps(payload))
+
+    def _read_loop(self):
+        try:
+            for raw in self._ws:
+                try:
+                    data = json.loads(raw)
+                except (TypeError, json.JSONDecodeError):
+                    continue
+                if isinstance(data, dict):
+                    self._dispatch(data)
+        except ConnectionClosed:
+            pass
+        finally:
+            with self._lock:
+                subscriptions = list(self.subscriptions.values())
+            for subscription in subscriptions:
+                for waiter in subscription._waiters:
+                    _settle(waiter, exception=ConnectionError("Event stream closed"))
+
+    def _dispatch(self, data: Dict[str, Any]):
+        with self._lock:
+            subscription = self.subscriptions.get(data.get("eventName"))
+        message = data.get("message")
+        # Misty acknowledges a subscription with a plain "Registration Status" string
+        if subscription is None or not isinstance(message, dict):
+            return
+        if not subscription.matches(message):
+            return
+        if subscription.callback is not None:
+            try:
+                subscription.callback(message)
+            except Exception as e:
+                print(f"Error in {subscription.event_name} callback: {e}")
+        for waiter in list(subscription._waiters):
+            _settle(waiter, result=message)
+
+
+class LocalEventServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        """
+        Stand-in for Misty's /pubsub WebSocket, for testing without the robot
+
+        Args:
+            host: Interface to listen on
+            port: Port to listen on (0 picks a free port)
+        """
+        self._server = serve(self._handle, host, port)
+        self.host, self.port = self._server.socket.getsockname()[:2]
+        self.url = f"ws://{self.host}:{self.port}/pubsub"
+        self._subscriptions: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._server.serve_forever, name="misty-event-server",
+                                        daemon=True)
+        self._thread.start()
+
+    def _handle(self, connection):
+        for raw in connection:
+            request = json.loads(raw)
+            name = request.get("EventName")
+            if request.get("Operation") == "subscribe":
+                with self._lock:
+                    self._subscriptions[name] = {"type": request.get("Type"), "connection": connection}
+                connection.send(json.dumps({
+                    "eventName": name,
+                    "message": f"Registration Status: API event registered: {name}",
+                }))
+            elif request.get("Operation") == "unsubscribe":
+                with self._lock:
+                    self._subscriptions.pop(name, None)
+        with self._lock:
+            for name in [n for n, s in self._subscriptions.items() if s["connection"] is connection]:
+                del self._subscriptions[name]
+
+    def subscribed(self, event_type: str) -> bool:
+        """
+        Check whether any client is subscribed to an event type
+
+        Args:
+            event_type: Misty event type
+
+        Returns:
+            True if at least one subscription is registered
+        """
+        with self._lock:
+            return any(s["type"] == event_type for s in self._subscriptions.values())
+
+    def publish(self, event_type: str, message: Dict[str, Any]) -> int:
+        """
+        Send an event to every client subscribed to its type
+
+        Args:
+            event_type: Misty event type (e.g., 'VoiceRecord')
+            message: Event message body
+
+        Returns:
+            Number of subscriptions the event was delivered to
+        """
+        with self._lock:
+            targets = [(n, s["connection"]) for n, s in self._subscriptions.items() if s["type"] == event_type]
+        delivered = 0
+        for name, connection in targets:
+            try:
+                connection.send(json.dumps({"eventName": name, "message": message}))
+                delivered += 1
+            except ConnectionClosed:
+                pass
+        return delivered
+
+    def close(self):
+        """
+        Stop the server
+        """
+        self._server.shutdown()
+        self._thread.join(timeout=1.0)
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Fleet controller for several Misty robots
+One client, connection pool and event stream per robot; commands are broadcast or targeted
+concurrently, and a slow or offline robot can't hold up the others
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Optional, Dict, Any, List, Iterable
+
+import requests
+
+from audio_api_client import APIClient
+from events import MistyEventStream
+from instrumentation import Instrumentation
+from transport import Transport
+
+# Consecutive failed commands before a robot is marked offline and skipped
+OFFLINE_AFTER_FAILURES = 3
+
+
+@dataclass
+class CommandResult:
+    robot: str
+    outcome: str                    # ok, error, timeout, busy or offline
+    status: Optional[int] = None
+    latency_ms: Optional[float] = None
+    body: Any = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.outcome == "ok"
+
+
+class Robot:
+    def __init__(self, name: str, base_url: str, pool_size: int = 4,
+                 connect_timeout: float = 1.0, read_timeout: float = 5.0, max_in_flight: int = 4):
+        """
+        One robot in the fleet, with its own connection pool and instrumentation
+
+        Args:
+            name: Name used to target the robot (e.g., 'room-a')
+            base_url: Robot's base URL
+            pool_size: Connections kept open to this robot
+            connect_timeout: Seconds to wait for a TCP connection (keep short so an
+                             unreachable robot fails fast)
+            read_timeout: Seconds to wait for a response
+            max_in_flight: Commands that may be pending on this robot before new ones are
+                           refused as 'busy' instead of queueing behind a stuck robot
+        """
+        self.name = name
+        self.base_url = base_url
+        self.transport = Transport(pool_size=pool_size, connect_timeout=connect_timeout,
+                                   read_timeout=read_timeout, max_retries=0)
+        self.instrumentation = Instrumentation()
+        self.client = APIClient(base_url, transport=self.transport, quiet=True,
+                                instrumentation=self.instrumentation)
+        self.events: Optional[MistyEventStream] = None
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+        self.last_seen: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def online(self) -> bool:
+        return self.failures < OFFLINE_AFTER_FAILURES
+
+    def connect_events(self, open_timeout: float = 2.0) -> bool:
+        """
+        Open the robot's event stream
+
+        Returns:
+            True if connected
+        """
+        try:
+            self.events = MistyEventStream(self.base_url, open_timeout=open_timeout).connect()
+            return True
+        except Exception as e:
+            self.last_error = f"event stream: {e}"
+            self.events = None
+            return False
+
+    def send(self, method: str, endpoint: str, data: Optional[Dict[str, Any]] = None) -> CommandResult:
+        """
+        Send one command to this robot
+
+        Args:
+            method: HTTP verb
+            endpoint: API endpoint
+            data: Request body (POST) or query parameters (GET/DELETE)
+
+        Returns:
+            Result of the command
+        """
+        with self._lock:
+            if self.in_flight >= self.max_in_flight:
+                return CommandResult(self.name, "busy", error=f"{self.in_flight} commands still pending")
+            self.in_flight += 1
+        started = time.perf_counter()
+        try:
+            kwargs = {"json": data} if method == "POST" else {"params": data}
+            response = self.client.request(method, endpoint, **kwargs)
+            latency_ms = (time.perf_counter() - started) * 1000
+            try:
+                body = response.json()
+            except ValueError:
+                body = response.text
+            result = CommandResult(self.name, "ok" if response.ok else "error", response.status_code,
+                                   latency_ms, body, None if response.ok else f"HTTP {response.status_code}")
+        except requests.RequestException as e:
+            result = CommandResult(self.name, "error", latency_ms=(time.perf_counter() - started) * 1000,
+                                   error=type(e).__name__)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+        with self._lock:
+            if result.status is not None:
+                # Any HTTP answer means the robot is reachable
+                self.failures = 0
+                self.last_seen = time.time()
+            else:
+                self.failures += 1
+            if not result.ok:
+                self.last_error = result.error
+        return result
+
+    def close(self):
+        if self.events is not None:
+            self.events.close()
+            self.events = None
+        self.transport.close()
+
+
+class Fleet:
+    def __init__(self, robots: Dict[str, str], max_workers: Optional[int] = None,
+                 events: bool = False, **robot_options):
+        """
+        Initialize a fleet
+
+        Args:
+            robots: Robot name -> base URL
+            max_workers: Threads for dispatch (defaults to 4 per robot)
+            events: Open an event stream to every robot
+            **robot_options: Passed to Robot (pool_size, connect_timeout, read_timeout, max_in_flight)
+        """
+        self.robots: Dict[str, Robot] = {name: Robot(name, url, **robot_options)
+                                         for name, url in robots.items()}
+        self._pool = ThreadPoolExecutor(max_workers=max_workers or 4 * max(1, len(robots)),
+                                        thread_name_prefix="fleet")
+        if events:
+            self.connect_events()
+
+    def connect_events(self) -> Dict[str, bool]:
+        """
+        Open every robot's event stream concurrently
+
+        Returns:
+            Robot name -> whether its stream connected
+        """
+        futures = {name: self._pool.submit(robot.connect_events) for name, robot in self.robots.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+    def __getitem__(self, name: str) -> Robot:
+        return self.robots[name]
+
+    def dispatch(self, method: str, endpoint: str, data: Optional[Dict[str, Any]] = None,
+                 robots: Optional[Iterable[str]] = None, timeout: Optional[float] = 5.0,
+                 include_offline: bool = False) -> Dict[str, CommandResult]:
+        """
+        Send a command to several robots at once
+
+        Args:
+            method: HTTP verb
+            endpoint: API endpoint
+            data: Request body (POST) or query parameters (GET/DELETE)
+            robots: Names to target (defaults to the whole fleet)
+            timeout: Seconds to wait for all answers; robots that haven't answered by then are
+                     reported as 'timeout' (their request finishes in the background)
+            include_offline: Also try robots marked offline (e.g. to see if they are back)
+
+        Returns:
+            Robot name -> result
+        """
+        names = list(robots) if robots is not None else list(self.robots)
+        results: Dict[str, CommandResult] = {}
+        futures = {}
+        for name in names:
+            robot = self.robots[name]
+            if not robot.online and not include_offline:
+                results[name] = CommandResult(name, "offline", error=robot.last_error)
+            else:
+                futures[name] = self._pool.submit(robot.send, method, endpoint, data)
+
+        wait(futures.values(), timeout=timeout)
+        for name, future in futures.items():
+            if future.done():
+                results[name] = future.result()
+            else:
+                results[name] = CommandResult(name, "timeout", error=f"No answer within {timeout}s")
+        return {name: results[name] for name in names}
+
+    def broadcast(self, method: str, endpoint: str, data: Optional[Dict[str, Any]] = None,
+                  timeout: Optional[float] = 5.0) -> Dict[str, CommandResult]:
+        return self.dispatch(method, endpoint, data, timeout=timeout)
+
+    def send(self, robot: str, method: str, endpoint: str, data: Optional[Dict[str, Any]] = None,
+             timeout: Optional[float] = 5.0) -> CommandResult:
+        return self.dispatch(method, endpoint, data, robots=[robot], timeout=timeout,
+                             include_offline=True)[robot]
+
+    def health(self, timeout: float = 3.0) -> Dict[str, Any]:
+        """
+        Check every robot (offline ones included) and aggregate health, latency and battery
+
+        Args:
+            timeout: Seconds to wait for the robots to answer
+
+        Returns:
+            Dict with per-robot status and fleet totals
+        """
+        batteries = self.dispatch("GET", "/api/battery", timeout=timeout, include_offline=True)
+        robots = {}
+        for name, robot in self.robots.items():
+            result = batteries[name]
+            battery = result.body.get("result") if result.ok and isinstance(result.body, dict) else None
+            stats = robot.instrumentation.snapshot()["endpoints"]
+            latencies = [s["total_ms"] for s in stats.values() if s["total_ms"]["count"]]
+            requests_sent = sum(s["requests"] for s in stats.values())
+            errors = sum(s["errors"] for s in stats.values())
+            robots[name] = {
+                "base_url": robot.base_url,
+                # Same rule as dispatch: reachable unless the last OFFLINE_AFTER_FAILURES commands got no answer
+                "online": robot.online,
+                "outcome": result.outcome,
+                "health_check_ms": round(result.latency_ms, 3) if result.latency_ms is not None else None,
+                "battery": battery.get("chargePercent") if isinstance(battery, dict) else None,
+                "charging": battery.get("isCharging") if isinstance(battery, dict) else None,
+                "requests": requests_sent,
+                "error_rate": round(errors / requests_sent, 3) if requests_sent else 0.0,
+                "p95_ms": max((l["p95"] for l in latencies), default=None),
+                "events": robot.events is not None,
+                "last_error": robot.last_error,
+            }
+        online = [r for r in robots.values() if r["online"]]
+        charges = [r["battery"] for r in online if r["battery"] is not None]
+        return {
+            "robots": robots,
+            "online": len(online),
+            "total": len(robots),
+            "lowest_battery": min(charges, default=None),
+            "slowest_health_check_ms": max((r["health_check_ms"] for r in online), default=None),
+        }
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        for robot in self.robots.values():
+            robot.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def print_health(health: Dict[str, Any]):
+    print(f"{'robot':<10} {'online':<7} {'check ms':>9} {'battery':>8} {'requests':>9} {'err%':>6}  last error")
+    print("-" * 72)
+    for name, r in health["robots"].items():
+        check = f"{r['health_check_ms']:.1f}" if r["health_check_ms"] is not None else "-"
+        battery = f"{r['battery']:.0%}" if r["battery"] is not None else "-"
+        print(f"{name:<10} {str(r['online']):<7} {check:>9} {battery:>8} {r['requests']:>9} "
+              f"{r['error_rate'] * 100:>5.1f}%  {r['last_error'] or ''}")
+    print(f"\n{health['online']}/{health['total']} online, lowest battery: "
+          f"{'-' if health['lowest_battery'] is None else format(health['lowest_battery'], '.0%')}")
+
+
+def main():
+    from misty_simulator import MistySimulator
+
+    # ============ CONFIGURATION - CHANGE THESE ============
+    ROBOTS: Optional[Dict[str, str]] = None  # e.g. {"room-a": "http://192.168.0.111", "room-b": "http://192.168.0.112"}
+
+    simulators: List[MistySimulator] = []
+    robots = ROBOTS
+    if robots is None:
+        # Three simulated rooms: one fast, one slow, one that goes offline
+        simulators = [MistySimulator(latency_ms=5).start(),
+                      MistySimulator(latency_ms=400).start(),
+                      MistySimulator(latency_ms=5).start()]
+        robots = {f"room-{chr(ord('a') + i)}": sim.base_url for i, sim in enumerate(simulators)}
+        simulators[2].stop()
+
+    try:
+        with Fleet(robots) as fleet:
+            for name, result in fleet.broadcast("POST", "/api/led", {"Red": 0, "Green": 255, "Blue": 0},
+                                                timeout=0.25).items():
+                print(f"LED on {name}: {result.outcome} ({result.error or result.status})")
+            fleet.send("room-a", "POST", "/api/tts/speak", {"Text": "Welcome to room A"})
+            print()
+            print_health(fleet.health())
+    finally:
+        for simulator in simulators[:2]:
+            simulator.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Low-overhead request instrumentation for APIClient
+Per-endpoint counters and latency histograms, per-request hooks and a sampled debug log,
+exportable as JSON at the end of a session
+"""
+
+import bisect
+import json
+import logging
+import random
+import threading
+import time
+from typing import Optional, Dict, Any, List, Callable
+
+from transport import RequestTiming
+
+# Histogram bucket upper bounds in milliseconds; the last bucket catches everything slower
+DEFAULT_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+logger = logging.getLogger("misty.api")
+
+
+class RequestRecord:
+    __slots__ = ("method", "endpoint", "status", "timing", "error", "timestamp")
+
+    def __init__(self, method: str, endpoint: str, status: Optional[int],
+                 timing: Optional[RequestTiming], error: Optional[str], timestamp: float):
+        self.method = method
+        self.endpoint = endpoint
+        self.status = status
+        self.timing = timing
+        self.error = error
+        self.timestamp = timestamp
+
+    def to_dict(self) -> Dict[str, Any]:
+        timing = self.timing
+        return {
+            "method": self.method,
+            "endpoint": self.endpoint,
+            "status": self.status,
+            "error": self.error,
+            "timestamp": self.timestamp,
+            "connect_ms": round(timing.connect_ms, 3) if timing else None,
+            "ttfb_ms": round(timing.ttfb_ms, 3) if timing else None,
+            "total_ms": round(timing.total_ms, 3) if timing else None,
+        }
+
+
+class Histogram:
+    def __init__(self, bounds_ms=DEFAULT_BUCKETS_MS):
+        self.bounds = tuple(bounds_ms)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+
+    def add(self, value_ms: float):
+        self.counts[bisect.bisect_left(self.bounds, value_ms)] += 1
+        self.count += 1
+        self.total += value_ms
+        if value_ms < self.min:
+            self.min = value_ms
+        if value_ms > self.max:
+            self.max = value_ms
+
+    def percentile(self, pct: float) -> float:
+        """
+        Estimate a percentile as the upper bound of the bucket it falls in
+
+        Args:
+            pct: Percentile between 0 and 100
+
+        Returns:
+            Estimated value in ms (capped at the observed maximum)
+        """
+        if not self.count:
+            return 0.0
+        rank = pct / 100.0 * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                upper = self.bounds[i] if i < len(self.bounds) else self.max
+                return min(upper, self.max)
+        return self.max
+
+    def to_dict(self) -> Dict[str, Any]:
+        labels = [f"<={b}" for b in self.bounds] + [f">{self.bounds[-1]}"]
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 3) if self.count else 0.0,
+            "min": round(self.min, 3) if self.count else 0.0,
+            "max": round(self.max, 3),
+            "p50": round(self.percentile(50), 3),
+            "p95": round(self.percentile(95), 3),
+            "p99": round(self.percentile(99), 3),
+            "buckets": {label: n for label, n in zip(labels, self.counts) if n},
+        }
+
+
+class EndpointStats:
+    def __init__(self, bounds_ms=DEFAULT_BUCKETS_MS):
+        self.requests = 0
+        self.errors = 0
+        self.new_connections = 0
+        self.status: Dict[str, int] = {}
+        self.total_ms = Histogram(bounds_ms)
+        self.ttfb_ms = Histogram(bounds_ms)
+        self.connect_ms = Histogram(bounds_ms)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "new_connections": self.new_connections,
+            "status": dict(self.status),
+            "total_ms": self.total_ms.to_dict(),
+            "ttfb_ms": self.ttfb_ms.to_dict(),
+            "connect_ms": self.connect_ms.to_dict(),
+        }
+
+
+class Instrumentation:
+    def __init__(self, debug_sample_rate: float = 0.0, bounds_ms=DEFAULT_BUCKETS_MS):
+        """
+        Collect per-endpoint request stats
+
+        Args:
+            debug_sample_rate: Fraction of requests (0.0 - 1.0) written to the 'misty.api'
+                               logger at DEBUG level; errors are always logged
+            bounds_ms: Histogram bucket upper bounds in milliseconds
+        """
+        self.debug_sample_rate = debug_sample_rate
+        self.bounds_ms = bounds_ms
+        self.started_at = time.time()
+        self.endpoints: Dict[str, EndpointStats] = {}
+        self.hooks: List[Callable[[RequestRecord], None]] = []
+        self._lock = threading.Lock()
+        self._random = random.Random()
+
+    def add_hook(self, hook: Callable[[RequestRecord], None]):
+        """
+        Call a function after every request (keep it cheap; it runs on the request path)
+
+        Args:
+            hook: Called with the RequestRecord of each finished request
+        """
+        self.hooks.append(hook)
+
+    def record(self, method: str, endpoint: str, status: Optional[int] = None,
+               timing: Optional[RequestTiming] = None, error: Optional[str] = None):
+        """
+        Record one finished request
+
+        Args:
+            method: HTTP verb
+            endpoint: API endpoint (without query string)
+            status: HTTP status code, or None if no response arrived
+            timing: Timing from the transport, or None if the request failed before a response
+            error: Exception text if the request raised
+        """
+        key = f"{method} {endpoint}"
+        failed = error is not None or status is None or status >= 400
+        with self._lock:
+            stats = self.endpoints.get(key)
+            if stats is None:
+                stats = self.endpoints[key] = EndpointStats(self.bounds_ms)
+            stats.requests += 1
+            if failed:
+                stats.errors += 1
+            status_key = str(status) if status is not None else "exception"
+            stats.status[status_key] = stats.status.get(status_key, 0) + 1
+            if timing is not None:
+                stats.total_ms.add(timing.total_ms)
+                stats.ttfb_ms.add(timing.ttfb_ms)
+                if timing.connect_ms > 0:
+                    stats.new_connections += 1
+                    stats.connect_ms.add(timing.connect_ms)
+
+        if self.hooks or failed or self.debug_sample_rate:
+            record = RequestRecord(method, endpoint, status, timing, error, time.time())
+            for hook in self.hooks:
+                hook(record)
+            if failed:
+                logger.warning("%s %s failed: status=%s error=%s", method, endpoint, status, error)
+            elif self.debug_sample_rate and self._random.random() < self.debug_sample_rate:
+                logger.debug("%s", json.dumps(record.to_dict()))
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Get the current stats
+
+        Returns:
+            Dict with session start, duration and per-endpoint counters and histograms
+        """
+        with self._lock:
+            endpoints = {key: stats.to_dict() for key, stats in sorted(self.endpoints.items())}
+        return {
+            "started_at": self.started_at,
+            "duration_s": round(time.time() - self.started_at, 3),
+            "endpoints": endpoints,
+        }
+
+    def export_json(self, path: str):
+        """
+        Write the stats to a JSON file
+
+        Args:
+            path: Output file path
+        """
+        with open(path, 'w') as f:
+            json.dump(self.snapshot(), f, indent=2)
+
+    def reset(self):
+        with self._lock:
+            self.endpoints = {}
+            self.started_at = time.time()
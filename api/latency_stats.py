@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Small helpers for summarizing latency samples
+"""
+
+import math
+from typing import Dict, Sequence
+
+
+def percentile(samples: Sequence[float], pct: float) -> float:
+    """
+    Nearest-rank percentile of a list of samples
+
+    Args:
+        samples: Latency samples (any order)
+        pct: Percentile between 0 and 100
+
+    Returns:
+        The percentile value, or 0.0 if there are no samples
+    """
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def summarize(samples: Sequence[float], digits: int = 3) -> Dict[str, float]:
+    """
+    Summarize latency samples
+
+    Args:
+        samples: Latency samples (any order)
+        digits: Decimal places to round to
+
+    Returns:
+        Dict with count, mean, p50, p95, p99 and max
+    """
+    if not samples:
+        return {"count": 0, "mean": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    ordered = sorted(samples)
+    n = len(ordered)
+
+    def rank(pct: float) -> float:
+        return ordered[min(max(1, math.ceil(pct / 100.0 * n)), n) - 1]
+
+    return {
+        "count": n,
+        "mean": round(sum(ordered) / n, digits),
+        "p50": round(rank(50), digits),
+        "p95": round(rank(95), digits),
+        "p99": round(rank(99), digits),
+        "max": round(ordered[-1], digits),
+    }
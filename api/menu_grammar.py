@@ -0,0 +1,446 @@
+#!/usr/bin/env python3
+"""
+Menu-constrained speech recognition for order taking
+Builds a JSGF grammar from the menu (items, quantities, add-ons, yes/no replies), decodes
+against it instead of the general English model, and returns the order as slots with a
+confidence; speech a filler-word loop explains better than the menu is rejected, and
+low-confidence results are decoded again with the full model
+"""
+
+import hashlib
+import re
+import threading
+import time
+from dataclasses import dataclass, field, asdict
+from typing import Optional, Dict, Any, List, Iterable, Tuple
+
+from pocketsphinx import Decoder
+
+from audio_ingest import DECODER_SAMPLE_RATE, iter_decoder_pcm
+from speech_to_text import StreamingTranscriber, create_decoder, decoder_lock, get_decoder
+
+QUANTITIES = {"a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5}
+YES_WORDS = ("yes", "yeah", "yep", "sure", "okay")
+NO_WORDS = ("no", "nope", "nah")
+LEAD_INS = ("i would like", "i'd like", "i want", "i'll have", "can i have", "can i get", "could i get")
+CLOSINGS = ("please", "thanks", "thank you")
+# Out-of-grammar path for the rejection search: short common words none of the other rules use,
+# so speech that isn't an order or a reply decodes as a run of these instead of a menu phrase
+FILLER_WORDS = ("the", "of", "to", "it", "is", "was", "what", "that", "in", "oh")
+
+# Decoder options for the grammar search: with a vocabulary this small, scoring every
+# other frame loses little accuracy and halves the acoustic model work
+DEFAULT_GRAMMAR_OPTIONS: Dict[str, Any] = {"ds": 2}
+GRAMMAR_NAME = "menu"
+# The rejection search (grammar plus filler loop) runs on its own decoder without the lattice
+# pass: only its best path is needed, and word posteriors with the loop in it take tens of seconds
+REJECTION_OPTIONS: Dict[str, Any] = {"bestpath": False}
+
+# Audio fed to the fallback decoder between deadline checks (0.25 s at 16 kHz 16-bit)
+FALLBACK_BLOCK_BYTES = 8000
+# Seconds the full model takes per second of audio until a fallback has been timed
+# (about 9.5 s for the 30 s bundled capture); a fallback that wouldn't meet its deadline isn't started
+FALLBACK_REALTIME_FACTOR = 0.35
+
+# Pocketsphinx marks alternate pronunciations as word(2); fillers look like <sil> or [NOISE]
+_ALTERNATE = re.compile(r"\(\d+\)$")
+
+
+@dataclass
+class OrderSlots:
+    items: List[Dict[str, Any]] = field(default_factory=list)   # {"item", "quantity", "confidence"}
+    add_on: Optional[str] = None
+    answer: Optional[str] = None                                 # 'yes', 'no' or None
+    text: str = ""
+    confidence: float = 0.0
+    mode: str = "grammar"                                        # 'grammar' or 'fallback'
+    decode_ms: float = 0.0
+
+    @property
+    def empty(self) -> bool:
+        return not self.items and self.add_on is None and self.answer is None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def hypothesis_words(decoder: Decoder) -> List[Tuple[str, float]]:
+    """
+    Get the words of the last utterance with their posterior probabilities
+
+    Args:
+        decoder: Decoder after end_utt()
+
+    Returns:
+        (word, posterior) pairs, fillers and silences removed
+    """
+    words = []
+    for segment in decoder.seg():
+        word = _ALTERNATE.sub("", segment.word)
+        if word and word[0] not in "<[":
+            words.append((word, float(segment.prob)))
+    return words
+
+
+class MenuGrammar:
+    def __init__(self, items: Iterable[str], add_ons: Iterable[str] = (),
+                 min_confidence: float = 0.7, decoder_options: Optional[Dict[str, Any]] = None):
+        """
+        Initialize a grammar for one menu
+
+        Args:
+            items: Menu item names (e.g. the keys of dialogue.DEFAULT_MENU)
+            add_ons: Add-on phrases offered with an order (e.g. "a muffin", "an extra shot")
+            min_confidence: Mean word posterior below which an utterance is decoded
+                            again with the full language model
+            decoder_options: Pocketsphinx options for the grammar decoder
+                             (defaults to DEFAULT_GRAMMAR_OPTIONS)
+        """
+        self.items = [" ".join(item.lower().split()) for item in items]
+        # Add-ons are matched without their article ("a muffin" -> "muffin")
+        self.add_ons = {}
+        for add_on in add_ons:
+            words = add_on.lower().split()
+            if words and words[0] in ("a", "an", "some"):
+                words = words[1:]
+            if words:
+                self.add_ons[" ".join(words)] = add_on
+        self.min_confidence = min_confidence
+        self.decoder_options = dict(DEFAULT_GRAMMAR_OPTIONS if decoder_options is None else decoder_options)
+        self._decoder: Optional[Decoder] = None
+        self._rejection_decoder: Optional[Decoder] = None
+        self._fallback_factor = FALLBACK_REALTIME_FACTOR
+        self._decoder_lock = threading.Lock()
+
+        # Longest phrases first, so "side salad" wins over "salad"
+        self._phrases = sorted({tuple(p.split()) for p in (*self.items, *self.add_ons)}, key=lambda p: -len(p))
+
+    def jsgf(self, known_words: Optional[Iterable[str]] = None, filler: bool = False) -> str:
+        """
+        Build the JSGF grammar
+
+        Args:
+            known_words: Words the decoder's dictionary has; phrases using any other word
+                         are left out (defaults to keeping everything)
+            filler: Also accept any run of FILLER_WORDS (the rejection search)
+
+        Returns:
+            Grammar source
+        """
+        known = set(known_words) if known_words is not None else None
+
+        def alternatives(phrases: Iterable[str]) -> str:
+            kept = [p for p in phrases if known is None or all(w in known for w in p.split())]
+            return " | ".join(kept)
+
+        items = alternatives(self.items)
+        if not items:
+            raise ValueError("None of the menu items are in the decoder's dictionary")
+        add_ons = alternatives(self.add_ons)
+        with_add_on = " [with <add_on>]" if add_ons else ""
+        yes_add_on = " [<add_on>]" if add_ons else ""
+        rules = [
+            "#JSGF V1.0;",
+            f"grammar {GRAMMAR_NAME};",
+            "public <utterance> = <order> | <answer>" + (" | <filler>;" if filler else ";"),
+            f"<order> = [<lead>] <item_phrase> (and <item_phrase>)*{with_add_on} [<closing>];",
+            f"<answer> = <yes> [<closing>]{yes_add_on} | <no> [<closing>];",
+            "<item_phrase> = [<quantity>] <item>;",
+            f"<quantity> = {alternatives(QUANTITIES)};",
+            f"<item> = {items};",
+            f"<yes> = {alternatives(YES_WORDS)};",
+            f"<no> = {alternatives(NO_WORDS)};",
+            f"<lead> = {alternatives(LEAD_INS)};",
+            f"<closing> = {alternatives(CLOSINGS)};",
+        ]
+        if filler:
+            rules.append(f"<filler> = ({alternatives(FILLER_WORDS)})+;")
+        if add_ons:
+            rules.append(f"<add_on> = [a | an | some] ({add_ons});")
+        return "\n".join(rules) + "\n"
+
+    @property
+    def digest(self) -> str:
+        """
+        Identifies the grammar and decoder settings (e.g. for transcription cache keys)
+        """
+        source = self.jsgf(filler=True) + repr(sorted(self.decoder_options.items())) + repr(self.min_confidence)
+        return hashlib.sha1(source.encode("utf-8")).hexdigest()
+
+    def get_decoder(self) -> Decoder:
+        """
+        Get this grammar's decoder, loading the models on first use
+
+        Returns:
+            Decoder with the menu grammar as its active search
+        """
+        with self._decoder_lock:
+            if self._decoder is None:
+                decoder = create_decoder(**self.decoder_options)
+                vocabulary = {w for phrase in (*self.items, *self.add_ons, *QUANTITIES, *YES_WORDS,
+                                               *NO_WORDS, *LEAD_INS, *CLOSINGS, *FILLER_WORDS,
+                                               "and", "with", "some")
+                              for w in phrase.split()}
+                missing = sorted(w for w in vocabulary if decoder.lookup_word(w) is None)
+                if missing:
+                    print(f"Warning: not in the pronunciation dictionary, left out of the grammar: {missing}")
+                decoder.add_jsgf_string(GRAMMAR_NAME, self.jsgf(vocabulary - set(missing)))
+                decoder.activate_search(GRAMMAR_NAME)
+                rejection = create_decoder(**{**self.decoder_options, **REJECTION_OPTIONS})
+                rejection.add_jsgf_string(GRAMMAR_NAME, self.jsgf(vocabulary - set(missing), filler=True))
+                rejection.activate_search(GRAMMAR_NAME)
+                self._decoder, self._rejection_decoder = decoder, rejection
+            return self._decoder
+
+    def parse(self, words: List[Tuple[str, float]], complete: bool = True) -> OrderSlots:
+        """
+        Fill order slots from recognized words
+
+        Works on grammar hypotheses and on free transcripts (items are spotted by keyword).
+
+        Args:
+            words: (word, posterior) pairs
+            complete: False if the hypothesis stopped partway through the grammar
+                      (its confidence is then 0, so it falls back)
+
+        Returns:
+            Slots, with confidence = mean posterior of the words that filled them
+        """
+        slots = OrderSlots(text=" ".join(w for w, _ in words))
+        tokens = [w for w, _ in words]
+        slot_probs: List[float] = []
+        quantity: Optional[Tuple[int, float]] = None
+        after_with = False
+        i = 0
+        while i < len(tokens):
+            word, prob = words[i]
+            phrase = next((p for p in self._phrases if tuple(tokens[i:i + len(p)]) == p), None)
+
+            if phrase is not None:
+                key = " ".join(phrase)
+                probs = [p for _, p in words[i:i + len(phrase)]]
+                # "muffin" may be an item or an add-on; after "with" or "yes" it is the add-on
+                if key in self.add_ons and (after_with or slots.answer == "yes" or key not in self.items):
+                    slots.add_on = self.add_ons[key]
+                else:
+                    count, count_prob = quantity if quantity is not None else (1, None)
+                    if count_prob is not None:
+                        probs.append(count_prob)
+                    slots.items.append({"item": key, "quantity": count,
+                                        "confidence": round(sum(probs) / len(probs), 3)})
+                slot_probs.extend(probs)
+                quantity, after_with = None, False
+                i += len(phrase)
+                continue
+
+            if word in QUANTITIES:
+                quantity = (QUANTITIES[word], prob)
+            elif word in YES_WORDS and slots.answer is None:
+                slots.answer = "yes"
+                slot_probs.append(prob)
+            elif word in NO_WORDS and slots.answer is None:
+                slots.answer = "no"
+                slot_probs.append(prob)
+            elif word == "with":
+                after_with = True
+            i += 1
+
+        if complete and slot_probs:
+            slots.confidence = round(sum(slot_probs) / len(slot_probs), 3)
+        return slots
+
+    def decode(self, pcm: bytes, fallback: bool = True, deadline: Optional[float] = None) -> OrderSlots:
+        """
+        Decode one utterance of 16 kHz mono 16-bit PCM
+
+        Audio the filler loop explains better than the menu fills no slots (and falls back).
+
+        Args:
+            pcm: Audio samples
+            fallback: Decode again with the full model if the grammar result is not confident
+            deadline: time.monotonic() the fallback must finish by; past it the grammar
+                      result is returned as is
+
+        Returns:
+            Order slots
+        """
+        started = time.perf_counter()
+        decoder = self.get_decoder()
+        with decoder_lock(decoder):
+            decoder.start_utt()
+            decoder.process_raw(pcm, False, True)
+            decoder.end_utt()
+            # Checked first: reading the word posteriors of a rejected utterance can take seconds
+            words = [] if self.out_of_grammar(pcm) else hypothesis_words(decoder)
+        return self._result(words, pcm, started, fallback, deadline)
+
+    def decode_file(self, wav_file_path: str) -> OrderSlots:
+        """
+        Decode a WAV file of any PCM/float format
+
+        Args:
+            wav_file_path: Path to the WAV file
+
+        Returns:
+            Order slots
+        """
+        return self.decode(b"".join(bytes(block) for block in iter_decoder_pcm(wav_file_path)))
+
+    def transcriber(self) -> "MenuTranscriber":
+        """
+        Streaming transcriber on the grammar decoder, e.g. a DialogueOrchestrator transcriber_factory
+        """
+        return MenuTranscriber(self)
+
+    def out_of_grammar(self, pcm: bytes) -> bool:
+        """
+        Check whether filler words explain an utterance better than any order or reply
+
+        Args:
+            pcm: Audio samples (16 kHz mono 16-bit)
+
+        Returns:
+            True if the best path with the filler loop allowed is only filler words
+        """
+        self.get_decoder()
+        decoder = self._rejection_decoder
+        with decoder_lock(decoder):
+            decoder.start_utt()
+            decoder.process_raw(pcm, False, True)
+            decoder.end_utt()
+            hyp = decoder.hyp()
+        words = [_ALTERNATE.sub("", w) for w in (hyp.hypstr.split() if hyp is not None else [])]
+        return all(w in FILLER_WORDS for w in words)
+
+    def _result(self, words: List[Tuple[str, float]], pcm: bytes, started: float,
+                fallback: bool = True, deadline: Optional[float] = None) -> OrderSlots:
+        # words: the grammar decoder's hypothesis for pcm ([] if out of grammar)
+        # A search that ran out of audio partway through the grammar leaves a dangling connective
+        complete = bool(words) and words[-1][0] not in ("and", "with")
+        slots = self.parse(words, complete)
+        if fallback and slots.confidence < self.min_confidence:
+            # Out of time, the (possibly rejected) grammar result stands
+            slots = self.fallback(pcm, deadline) or slots
+        slots.decode_ms = round((time.perf_counter() - started) * 1000, 3)
+        return slots
+
+    def fallback(self, pcm: bytes, deadline: Optional[float] = None) -> Optional[OrderSlots]:
+        """
+        Decode with the shared full-vocabulary decoder and spot menu words in the transcript
+
+        Args:
+            pcm: Audio samples (16 kHz mono 16-bit)
+            deadline: time.monotonic() to give up at (the full model decodes several
+                      times slower than the grammar)
+
+        Returns:
+            Order slots with mode 'fallback', or None if it couldn't finish by the deadline
+        """
+        audio_s = len(pcm) / (2 * DECODER_SAMPLE_RATE)
+        if deadline is not None and time.monotonic() + audio_s * self._fallback_factor > deadline:
+            return None
+        decoder = get_decoder()
+        lock = decoder_lock(decoder)
+        if not lock.acquire(timeout=-1 if deadline is None else max(0.0, deadline - time.monotonic())):
+            return None
+        started = time.perf_counter()
+        try:
+            decoder.start_utt()
+            if deadline is None:
+                decoder.process_raw(pcm, False, True)
+            else:
+                for offset in range(0, len(pcm), FALLBACK_BLOCK_BYTES):
+                    if time.monotonic() >= deadline:
+                        decoder.end_utt()
+                        return None
+                    decoder.process_raw(pcm[offset:offset + FALLBACK_BLOCK_BYTES], False, False)
+            decoder.end_utt()
+            words = hypothesis_words(decoder)
+        finally:
+            lock.release()
+        if audio_s > 0:
+            # Running estimate, so the next deadline check matches this machine
+            self._fallback_factor = (self._fallback_factor + (time.perf_counter() - started) / audio_s) / 2
+        slots = self.parse(words)
+        slots.mode = "fallback"
+        return slots
+
+
+class MenuTranscriber(StreamingTranscriber):
+    def __init__(self, grammar: MenuGrammar):
+        """
+        StreamingTranscriber that decodes against a menu grammar
+
+        finish() returns the recognized text (from the full model if the grammar result
+        was not confident); the order slots are left in .result.
+
+        Args:
+            grammar: Grammar to decode with
+        """
+        super().__init__(grammar.get_decoder())
+        self.grammar = grammar
+        self.result: Optional[OrderSlots] = None
+        self._pcm: List[bytes] = []
+        self._words: List[Tuple[str, float]] = []
+        self._started_at: Optional[float] = None
+        # time.monotonic() finish() must return by (e.g. set from a dialogue stage budget)
+        self.deadline: Optional[float] = None
+
+    def _process(self, pcm):
+        if self._started_at is None:
+            self._started_at = time.perf_counter()
+        # Kept for a fallback decode; a spoken order is a few hundred KB at most
+        self._pcm.append(bytes(pcm))
+        super()._process(pcm)
+
+    def _finish(self) -> Optional[str]:
+        self._end_utt()
+        # Read while the grammar decoder is still ours; the fallback decode happens after it is
+        # released. Not decoder.hyp(): that computes the posteriors too, seconds for rejected audio
+        self._words = [] if self.grammar.out_of_grammar(b"".join(self._pcm)) else hypothesis_words(self.decoder)
+        return None
+
+    def finish(self) -> Optional[str]:
+        if not self._started:
+            return None
+        super().finish()
+        self.result = self.grammar._result(self._words, b"".join(self._pcm),
+                                           self._started_at or time.perf_counter(), deadline=self.deadline)
+        self._pcm = []
+        return self.result.text or None
+
+    def abort(self):
+        super().abort()
+        self._pcm = []
+
+
+def main():
+    from dialogue import DEFAULT_MENU, DEFAULT_ADD_ONS
+
+    # ============ CONFIGURATION - CHANGE THESE ============
+    WAV_FILE = "./capture_Dialogue.wav"
+    MIN_CONFIDENCE = 0.7
+
+    grammar = MenuGrammar(DEFAULT_MENU, DEFAULT_ADD_ONS.values(), min_confidence=MIN_CONFIDENCE)
+    print(grammar.jsgf())
+
+    # Load both decoders up front so the timings below are decode time only
+    grammar.get_decoder()
+    get_decoder()
+    pcm = b"".join(bytes(block) for block in iter_decoder_pcm(WAV_FILE))
+
+    started = time.perf_counter()
+    full = grammar.fallback(pcm)
+    print(f"Full model: {(time.perf_counter() - started) * 1000:.0f} ms  {full.text!r}")
+
+    constrained = grammar.decode(pcm, fallback=False)
+    print(f"Grammar:    {constrained.decode_ms:.0f} ms  {constrained.text!r} "
+          f"(confidence {constrained.confidence:.2f})")
+
+    result = grammar.decode(pcm)
+    print(f"\nResult ({result.mode}, {result.decode_ms:.0f} ms): items={result.items} "
+          f"add_on={result.add_on} answer={result.answer} confidence={result.confidence:.2f}")
+
+
+if __name__ == "__main__":
+    main()
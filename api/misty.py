@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Command-line front end for the Misty control daemon
+Sends the command line to a running control_daemon over a local socket and prints the answer;
+only the standard library is imported, so a command costs interpreter start-up plus a round trip
+
+    python misty.py daemon http://192.168.0.111    # start the daemon (keep it running)
+    python misty.py led 255 0 0
+    python misty.py say "Excellent choice!"
+    python misty.py record --download --transcribe
+    python misty.py help
+    python misty.py --json status                  # the daemon's full JSON reply
+
+(alias misty="python /path/to/api/misty.py" for the short form)
+"""
+
+import json
+import os
+import socket
+import sys
+from typing import Optional, Dict, Any, List
+
+
+def default_socket_path() -> str:
+    """
+    Get the daemon's socket path: $MISTY_SOCKET, or a per-user file in the temp directory
+    """
+    return os.environ.get("MISTY_SOCKET") or os.path.join(
+        os.environ.get("TMPDIR", "/tmp"), f"misty-{os.getuid()}.sock")
+
+
+def send(argv: List[str], socket_path: Optional[str] = None, timeout: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Run one command on the daemon
+
+    Args:
+        argv: Command and its arguments (e.g. ['led', '255', '0', '0'])
+        socket_path: Daemon socket (defaults to default_socket_path())
+        timeout: Seconds to wait for the answer (None waits as long as the command runs,
+                 e.g. a recording)
+
+    Returns:
+        Dict with ok, output, result and elapsed_ms
+
+    Raises:
+        OSError: If the daemon isn't running
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path or default_socket_path())
+        # Relative paths (e.g. where a recording is saved) are relative to the caller
+        request = {"argv": argv, "cwd": os.getcwd()}
+        sock.sendall(json.dumps(request).encode("utf-8") + b"\n")
+        with sock.makefile("rb") as f:
+            line = f.readline()
+    if not line:
+        raise ConnectionError("Daemon closed the connection without answering")
+    return json.loads(line)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    as_json = bool(argv) and argv[0] == "--json"
+    if as_json:
+        argv = argv[1:]
+    if argv and argv[0] == "daemon":
+        # The only command that loads the heavy modules, in the daemon process itself
+        from control_daemon import run_daemon
+        return run_daemon(argv[1:])
+
+    try:
+        reply = send(argv or ["help"])
+    except OSError as e:
+        print(f"Error: no control daemon at {default_socket_path()} ({e})\n"
+              f"Start one with: python misty.py daemon <robot base URL>", file=sys.stderr)
+        return 2
+    if as_json:
+        print(json.dumps(reply, indent=2))
+    elif reply.get("output"):
+        print(reply["output"], file=sys.stdout if reply.get("ok") else sys.stderr)
+    return 0 if reply.get("ok") else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,478 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for a Misty II robot's REST API
+Serves the endpoints APIClient uses with configurable latency, jitter and failure rates,
+so the client can be measured and tested without the physical robot
+"""
+
+import email.policy
+import hashlib
+import io
+import json
+import math
+import random
+import struct
+import threading
+import time
+import wave
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Dict, Any, Tuple
+from urllib.parse import urlparse, parse_qs
+
+
+def make_wav(duration_s: float = 1.0, sample_rate: int = 16000, tone_hz: float = 440.0) -> bytes:
+    """
+    Build a 16-bit mono WAV file in memory
+
+    Args:
+        duration_s: Length in seconds
+        sample_rate: Samples per second
+        tone_hz: Frequency of the sine tone (0 for silence)
+
+    Returns:
+        WAV file bytes
+    """
+    n = int(duration_s * sample_rate)
+    samples = [int(8000 * math.sin(2 * math.pi * tone_hz * i / sample_rate)) if tone_hz else 0
+               for i in range(n)]
+    buf = io.BytesIO()
+    with wave.open(buf, 'wb') as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(sample_rate)
+        w.writeframes(struct.pack(f"<{n}h", *samples))
+    return buf.getvalue()
+
+
+def _ok(result: Any) -> Dict[str, Any]:
+    # Misty wraps every successful reply this way
+    return {"result": result, "status": "Success"}
+
+
+class MistySimulator:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0,
+                 latency_ms: float = 0.0, jitter_ms: float = 0.0, failure_rate: float = 0.0,
+                 endpoint_latency_ms: Optional[Dict[str, float]] = None,
+                 spike_rate: float = 0.0, spike_ms: float = 0.0,
+                 capture_duration_s: float = 1.0, events: bool = False,
+                 telemetry_interval_s: Optional[float] = None,
+                 seed: Optional[int] = None):
+        """
+        Initialize a simulated robot (call start() to begin serving)
+
+        Args:
+            host: Interface to listen on
+            port: Port to listen on (0 picks a free port)
+            latency_ms: Delay added before every response
+            jitter_ms: Random extra delay, uniform in [0, jitter_ms]
+            failure_rate: Fraction of requests answered with 503 (0.0 - 1.0)
+            endpoint_latency_ms: Per-endpoint delay overriding latency_ms, e.g. {"/api/tts/speak": 120}
+            spike_rate: Fraction of requests that stall for an extra spike_ms, like the odd
+                        call that takes seconds on lab Wi-Fi (0.0 - 1.0)
+            spike_ms: Length of a latency spike
+            capture_duration_s: How long a speech capture "records" before the file appears
+            events: Also run a /pubsub stand-in (events.LocalEventServer) and publish VoiceRecord
+            telemetry_interval_s: With events, publish BatteryCharge (and FaceRecognition while face
+                                  detection is on and state["face_visible"] is set) this often
+            seed: Random seed for reproducible jitter and failures
+        """
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self.endpoint_latency_ms = endpoint_latency_ms or {}
+        self.spike_rate = spike_rate
+        self.spike_ms = spike_ms
+        self.capture_duration_s = capture_duration_s
+        self.telemetry_interval_s = telemetry_interval_s
+        self.random = random.Random(seed)
+        self._random_lock = threading.Lock()
+
+        self.lock = threading.Lock()
+        self.audio_files: Dict[str, bytes] = {"capture_Dialogue.wav": make_wav(2.0)}
+        self.image_files: Dict[str, bytes] = {"e_DefaultContent.jpg": b"\xff\xd8\xff\xd9"}
+        self.request_counts: Dict[str, int] = {}
+        self.state: Dict[str, Any] = {
+            "led": {"Red": 0, "Green": 0, "Blue": 0},
+            "head": {"Pitch": 0, "Roll": 0, "Yaw": 0},
+            "arms": {"left": 0, "right": 0},
+            "drive": {"LinearVelocity": 0, "AngularVelocity": 0},
+            "battery": {"chargePercent": 0.87, "isCharging": False, "voltage": 8.1},
+            "face_detection": False,
+            "face_visible": False,
+            "recording": None,
+            "spoken": [],
+            "played": [],
+        }
+
+        self.event_server = None
+        if events:
+            from events import LocalEventServer
+            self.event_server = LocalEventServer(host)
+
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.server.daemon_threads = True
+        self.server.simulator = self
+        self.host, self.port = self.server.server_address[:2]
+        self.base_url = f"http://{self.host}:{self.port}"
+        self._thread: Optional[threading.Thread] = None
+        self._telemetry_stop = threading.Event()
+
+    def start(self) -> "MistySimulator":
+        """
+        Serve requests on a background thread
+
+        Returns:
+            self
+        """
+        self._thread = threading.Thread(target=self.server.serve_forever, name="misty-simulator", daemon=True)
+        self._thread.start()
+        if self.event_server is not None and self.telemetry_interval_s:
+            threading.Thread(target=self._telemetry_loop, name="misty-simulator-telemetry",
+                             daemon=True).start()
+        return self
+
+    def stop(self):
+        """
+        Stop serving
+        """
+        self._telemetry_stop.set()
+        self.server.shutdown()
+        self.server.server_close()
+        if self.event_server is not None:
+            self.event_server.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def delay_for(self, endpoint: str) -> float:
+        """
+        Pick the injected delay for one request
+
+        Args:
+            endpoint: Request path
+
+        Returns:
+            Delay in seconds
+        """
+        base = self.endpoint_latency_ms.get(endpoint, self.latency_ms)
+        with self._random_lock:
+            jitter = self.random.uniform(0, self.jitter_ms) if self.jitter_ms else 0.0
+            if self.spike_rate and self.random.random() < self.spike_rate:
+                jitter += self.spike_ms
+        return (base + jitter) / 1000.0
+
+    def should_fail(self) -> bool:
+        if not self.failure_rate:
+            return False
+        with self._random_lock:
+            return self.random.random() < self.failure_rate
+
+    def count(self, method: str, endpoint: str):
+        key = f"{method} {endpoint}"
+        with self.lock:
+            self.request_counts[key] = self.request_counts.get(key, 0) + 1
+
+    def finish_capture(self, filename: str):
+        """
+        Save the "recorded" file and publish VoiceRecord, as the robot does when capture ends
+
+        Args:
+            filename: Name the capture was started with
+        """
+        with self.lock:
+            if self.state["recording"] != filename:
+                return
+            self.audio_files[filename] = make_wav(self.capture_duration_s, tone_hz=220.0)
+            self.state["recording"] = None
+        if self.event_server is not None:
+            self.event_server.publish("VoiceRecord", {
+                "filename": filename, "success": True, "errorCode": 0, "errorMessage": "",
+            })
+
+    def publish_telemetry(self):
+        """
+        Publish one round of the sensor events the robot streams while running
+        """
+        with self.lock:
+            battery = self.state["battery"]
+            if not battery["isCharging"]:
+                # Drain slowly so battery trends have something to show
+                battery["chargePercent"] = max(0.0, battery["chargePercent"] - 0.0005)
+            battery = dict(battery)
+            face = self.state["face_detection"] and self.state["face_visible"]
+        self.event_server.publish("BatteryCharge", battery)
+        if face:
+            with self._random_lock:
+                bearing = self.random.uniform(-5, 5)
+            self.event_server.publish("FaceRecognition", {
+                "label": "unknown person", "distance": 80, "bearing": bearing,
+                "elevation": 0, "confidence": 0.9,
+            })
+
+    def save_utterance(self, utterance_id: str, text: str):
+        """
+        Save synthesized speech as an audio asset, as the robot does for TTS with SaveToFile
+
+        Args:
+            utterance_id: Asset name without extension
+            text: Spoken text (sets the clip length, roughly 15 characters per second)
+        """
+        audio = make_wav(max(0.2, len(text) / 15.0), tone_hz=330.0)
+        with self.lock:
+            self.audio_files[f"{utterance_id}.wav"] = audio
+
+    def _telemetry_loop(self):
+        while not self._telemetry_stop.wait(self.telemetry_interval_s):
+            self.publish_telemetry()
+
+    # ---- endpoint handlers: each returns (status, body) ----
+
+    def handle_get(self, endpoint: str, query: Dict[str, str]) -> Tuple[int, Any]:
+        if endpoint == "/api/device":
+            return 200, _ok({"robotId": "SIM-0001", "robotVersion": "sim", "ipAddress": self.host})
+        if endpoint == "/api/battery":
+            return 200, _ok(dict(self.state["battery"]))
+        if endpoint == "/api/audio/list":
+            with self.lock:
+                listing = [{"name": n, "systemAsset": n.startswith("s_"), "size": len(data)}
+                           for n, data in sorted(self.audio_files.items())]
+            return 200, _ok(listing)
+        if endpoint == "/api/images/list":
+            with self.lock:
+                listing = [{"name": n, "systemAsset": n.startswith("e_"), "size": len(data)}
+                           for n, data in sorted(self.image_files.items())]
+            return 200, _ok(listing)
+        if endpoint == "/api/audio":
+            with self.lock:
+                data = self.audio_files.get(query.get("FileName", ""))
+            if data is None:
+                return 404, {"result": False, "status": "Failed", "error": "File not found"}
+            return 200, data
+        return 404, {"result": False, "status": "Failed", "error": f"Unknown endpoint: {endpoint}"}
+
+    def handle_post(self, endpoint: str, body: Dict[str, Any]) -> Tuple[int, Any]:
+        with self.lock:
+            if endpoint == "/api/led":
+                self.state["led"] = {k: body.get(k, 0) for k in ("Red", "Green", "Blue")}
+            elif endpoint == "/api/head":
+                self.state["head"] = {k: body.get(k, 0) for k in ("Pitch", "Roll", "Yaw")}
+            elif endpoint == "/api/arms":
+                self.state["arms"][str(body.get("Arm", "right")).lower()] = body.get("Position", 0)
+            elif endpoint == "/api/drive":
+                self.state["drive"] = {k: body.get(k, 0) for k in ("LinearVelocity", "AngularVelocity")}
+            elif endpoint == "/api/drive/stop":
+                self.state["drive"] = {"LinearVelocity": 0, "AngularVelocity": 0}
+            elif endpoint == "/api/tts/speak":
+                self.state["spoken"].append(body.get("Text", ""))
+                if body.get("SaveToFile") and body.get("UtteranceId"):
+                    # The file appears shortly after the request returns
+                    timer = threading.Timer(0.05, self.save_utterance,
+                                            args=(body["UtteranceId"], body.get("Text", "")))
+                    timer.daemon = True
+                    timer.start()
+            elif endpoint == "/api/audio/play":
+                if body.get("FileName") not in self.audio_files:
+                    return 404, {"result": False, "status": "Failed", "error": "File not found"}
+                self.state["played"].append(body.get("FileName"))
+            elif endpoint == "/api/faces/detection/start":
+                self.state["face_detection"] = True
+            elif endpoint == "/api/faces/detection/stop":
+                self.state["face_detection"] = False
+            elif endpoint == "/api/audio/speech/capture":
+                filename = body.get("FileName", "capture_speech.wav")
+                self.state["recording"] = filename
+                timer = threading.Timer(self.capture_duration_s, self.finish_capture, args=(filename,))
+                timer.daemon = True
+                timer.start()
+            elif endpoint == "/api/audio/recording/stop":
+                recording = self.state["recording"]
+                if recording is not None:
+                    threading.Thread(target=self.finish_capture, args=(recording,), daemon=True).start()
+            elif endpoint in ("/api/audio", "/api/images"):
+                files = self.audio_files if endpoint == "/api/audio" else self.image_files
+                name, data = body.get("FileName"), body.get("File")
+                if not name or not isinstance(data, bytes):
+                    return 400, {"result": False, "status": "Failed", "error": "FileName and File are required"}
+                if name in files and str(body.get("OverwriteExisting", "false")).lower() != "true":
+                    return 409, {"result": False, "status": "Failed", "error": "File already exists"}
+                files[name] = data
+            elif endpoint == "/api/cameras/photo":
+                self.image_files[body.get("FileName", "photo.jpg")] = b"\xff\xd8\xff\xd9"
+            elif endpoint in ("/api/led/transition", "/api/images/display", "/api/text/display"):
+                pass
+            else:
+                return 404, {"result": False, "status": "Failed", "error": f"Unknown endpoint: {endpoint}"}
+        return 200, _ok(True)
+
+    def handle_delete(self, endpoint: str, query: Dict[str, str]) -> Tuple[int, Any]:
+        files = {"/api/images": self.image_files, "/api/audio": self.audio_files}.get(endpoint)
+        if files is None:
+            return 404, {"result": False, "status": "Failed", "error": f"Unknown endpoint: {endpoint}"}
+        with self.lock:
+            removed = files.pop(query.get("FileName", ""), None)
+        if removed is None:
+            return 404, {"result": False, "status": "Failed", "error": "File not found"}
+        return 200, _ok(True)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without this, keep-alive
+    # clients wait on Nagle + delayed ACK (~40 ms) for every response
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def simulator(self) -> MistySimulator:
+        return self.server.simulator
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length", 0))
+        if not length:
+            return {}
+        if self.headers.get("Content-Type", "").startswith("multipart/form-data"):
+            return self._read_multipart(length)
+        try:
+            body = json.loads(self.rfile.read(length))
+            return body if isinstance(body, dict) else {}
+        except json.JSONDecodeError:
+            return {}
+
+    def _read_multipart(self, length: int) -> Dict[str, Any]:
+        # Form fields as strings, file fields as bytes (asset uploads)
+        raw = self.rfile.read(length)
+        message = BytesParser(policy=email.policy.HTTP).parsebytes(
+            b"Content-Type: " + self.headers["Content-Type"].encode() + b"\r\n\r\n" + raw)
+        body: Dict[str, Any] = {}
+        for part in message.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            payload = part.get_payload(decode=True) or b""
+            body[name] = payload if part.get_filename() else payload.decode()
+        return body
+
+    def _respond(self, method: str, handler):
+        parsed = urlparse(self.path)
+        endpoint = parsed.path
+        query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+        body = self._read_json() if method == "POST" else None
+
+        sim = self.simulator
+        sim.count(method, endpoint)
+        delay = sim.delay_for(endpoint)
+        if delay > 0:
+            time.sleep(delay)
+
+        if sim.should_fail():
+            status, payload = 503, {"result": False, "status": "Failed", "error": "Injected failure"}
+        elif method == "POST":
+            status, payload = handler(endpoint, body)
+        else:
+            status, payload = handler(endpoint, query)
+
+        if isinstance(payload, bytes):
+            self._send_bytes(status, payload)
+        else:
+            data = json.dumps(payload).encode()
+            etag = None
+            if method == "GET" and status == 200:
+                # Content hash, so clients can revalidate with If-None-Match
+                etag = '"' + hashlib.sha1(data).hexdigest()[:16] + '"'
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            if etag is not None:
+                self.send_header("ETag", etag)
+            self.end_headers()
+            self.wfile.write(data)
+
+    def _send_bytes(self, status: int, payload: bytes):
+        # Support Range (with If-Range) so resumable downloads can be exercised
+        start = 0
+        etag = '"' + hashlib.sha1(payload).hexdigest()[:16] + '"'
+        range_header = self.headers.get("Range")
+        if_range = self.headers.get("If-Range")
+        if range_header and if_range is not None and if_range != etag:
+            # The file changed since the client's partial copy: send all of it
+            range_header = None
+        if range_header and range_header.startswith("bytes="):
+            start = int(range_header[len("bytes="):].split("-")[0] or 0)
+            if start >= len(payload):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(payload)}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(payload) - 1}/{len(payload)}")
+        else:
+            self.send_response(status)
+        self.send_header("Content-Type", "audio/wav")
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(payload) - start))
+        self.end_headers()
+        self.wfile.write(payload[start:])
+
+    def handle_one_request(self):
+        try:
+            super().handle_one_request()
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up on a slow answer (timed out, or a hedged copy won)
+            self.close_connection = True
+
+    def end_headers(self):
+        super().end_headers()
+        if self.command == "HEAD":
+            # Same headers as GET (Content-Length, ETag), body discarded
+            self.wfile = io.BytesIO()
+
+    def do_HEAD(self):
+        wfile = self.wfile
+        try:
+            self._respond("HEAD", self.simulator.handle_get)
+        finally:
+            self.wfile = wfile
+
+    def do_GET(self):
+        self._respond("GET", self.simulator.handle_get)
+
+    def do_POST(self):
+        self._respond("POST", self.simulator.handle_post)
+
+    def do_DELETE(self):
+        self._respond("DELETE", self.simulator.handle_delete)
+
+
+def main():
+    # ============ CONFIGURATION - CHANGE THESE ============
+    PORT = 8111
+    LATENCY_MS = 20.0
+    JITTER_MS = 10.0
+    FAILURE_RATE = 0.0
+    SPIKE_RATE = 0.0        # e.g. 0.02 for the odd multi-second call on lab Wi-Fi
+    SPIKE_MS = 2000.0
+
+    simulator = MistySimulator(port=PORT, latency_ms=LATENCY_MS, jitter_ms=JITTER_MS,
+                               failure_rate=FAILURE_RATE, spike_rate=SPIKE_RATE, spike_ms=SPIKE_MS,
+                               events=True)
+    print(f"Simulated Misty at {simulator.base_url} (events at {simulator.event_server.url})")
+    print("Point BASE_URL at it to run the examples without the robot. Ctrl+C to stop.")
+    try:
+        simulator.server.serve_forever()
+    except KeyboardInterrupt:
+        simulator.stop()
+
+
+if __name__ == "__main__":
+    main()
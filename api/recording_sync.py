@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Incremental, parallel sync of Misty's audio recordings to a local folder
+Keeps a manifest of what has already been pulled so unchanged files are skipped
+"""
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Any, List
+
+import requests
+
+from audio_api_client import APIClient, file_sha256
+
+MANIFEST_NAME = ".sync_manifest.json"
+
+
+@dataclass
+class SyncSummary:
+    downloaded: List[str] = field(default_factory=list)
+    skipped: List[str] = field(default_factory=list)
+    failed: List[str] = field(default_factory=list)
+    bytes_moved: int = 0
+    elapsed_s: float = 0.0
+
+    def __str__(self) -> str:
+        mb = self.bytes_moved / (1024 * 1024)
+        rate = mb / self.elapsed_s if self.elapsed_s > 0 else 0.0
+        return (f"{len(self.downloaded)} downloaded ({mb:.2f} MB), "
+                f"{len(self.skipped)} unchanged, {len(self.failed)} failed "
+                f"in {self.elapsed_s:.2f}s ({rate:.2f} MB/s)")
+
+
+def recording_name(recording: Any) -> str:
+    """
+    Get the file name from an /api/audio/list entry
+
+    Args:
+        recording: Either a plain file name or a dict from the robot
+
+    Returns:
+        File name, or '' if the entry has none
+    """
+    # Handle both string filenames and dict objects
+    if isinstance(recording, str):
+        return recording
+    return recording.get('name', recording.get('fileName', ''))
+
+
+def is_safe_name(filename: str) -> bool:
+    """
+    Check that a robot-supplied file name stays inside the output directory
+
+    Args:
+        filename: Name from the listing
+
+    Returns:
+        False for an empty name, or one containing a path separator, '..' or a NUL byte
+    """
+    return (bool(filename) and ".." not in filename and "\0" not in filename
+            and not any(sep in filename for sep in ("/", "\\", os.sep, os.altsep) if sep))
+
+
+def recording_size(recording: Any) -> Optional[int]:
+    """
+    Get the size the robot reports for an /api/audio/list entry, if any
+
+    Args:
+        recording: Either a plain file name or a dict from the robot
+
+    Returns:
+        Size in bytes, or None if the listing does not include one
+    """
+    if isinstance(recording, dict):
+        for key in ('size', 'fileSize', 'length'):
+            if isinstance(recording.get(key), int):
+                return recording[key]
+    return None
+
+
+class RecordingSync:
+    def __init__(self, client: APIClient, output_dir: str = "./recordings",
+                 max_workers: int = 4, verify_hashes: bool = False):
+        """
+        Initialize a sync engine for one output folder
+
+        Args:
+            client: Client for the robot to pull recordings from
+            output_dir: Directory to save recordings in (created if doesn't exist)
+            max_workers: Number of downloads in flight at once
+            verify_hashes: Re-hash local files to detect local changes, not just compare sizes
+        """
+        self.client = client
+        self.output_dir = output_dir
+        self.max_workers = max_workers
+        self.verify_hashes = verify_hashes
+        self.manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+        self.manifest: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def load_manifest(self):
+        """
+        Load the manifest of previously synced files (empty if there is none yet)
+        """
+        try:
+            with open(self.manifest_path) as f:
+                self.manifest = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.manifest = {}
+
+    def save_manifest(self):
+        """
+        Write the manifest atomically next to the recordings
+        """
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def remote_fingerprint(self, filename: str) -> Optional[Dict[str, Any]]:
+        """
+        Ask the robot what it has under a name without downloading it (HEAD)
+
+        Args:
+            filename: Name of the recording
+
+        Returns:
+            Dict with whichever of etag, last_modified and size the robot sent,
+            or None if it sent none of them or the request failed
+        """
+        try:
+            response = self.client.request("HEAD", "/api/audio", params={"FileName": filename})
+        except requests.RequestException:
+            return None
+        if not response.ok:
+            return None
+        headers = response.headers
+        fingerprint: Dict[str, Any] = {}
+        if headers.get("ETag"):
+            fingerprint["etag"] = headers["ETag"]
+        if headers.get("Last-Modified"):
+            fingerprint["last_modified"] = headers["Last-Modified"]
+        if headers.get("Content-Length", "").isdigit():
+            fingerprint["size"] = int(headers["Content-Length"])
+        return fingerprint or None
+
+    def is_unchanged(self, filename: str, remote_size: Optional[int],
+                     fingerprint: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        Check whether a recording is already on disk and matches the manifest
+
+        Capture names are reused, and captures cut off at MaxSpeechLength all have the same
+        size, so the robot's ETag / Last-Modified decide whenever it sends one; a size (from the
+        listing or HEAD) alone is only trusted when there is nothing better.
+
+        Args:
+            filename: Name of the recording
+            remote_size: Size reported in the listing, if any
+            fingerprint: From remote_fingerprint()
+
+        Returns:
+            True if the local copy can be kept as is
+        """
+        entry = self.manifest.get(filename)
+        path = os.path.join(self.output_dir, filename)
+        if entry is None or not os.path.exists(path):
+            return False
+        if os.path.getsize(path) != entry['size']:
+            return False
+        fingerprint = fingerprint or {}
+        sizes = [size for size in (remote_size, fingerprint.get("size")) if size is not None]
+        if any(size != entry['size'] for size in sizes):
+            return False
+        validators = {key: fingerprint[key] for key in ("etag", "last_modified") if key in fingerprint}
+        if validators:
+            # A manifest entry without the robot's validator (older sync) re-downloads once
+            if any(entry.get(key) != value for key, value in validators.items()):
+                return False
+        elif not sizes:
+            return False
+        if self.verify_hashes and file_sha256(path) != entry['sha256']:
+            return False
+        return True
+
+    def _sync_one(self, recording: Any, summary: SyncSummary):
+        filename = recording_name(recording)
+        if not is_safe_name(filename):
+            print(f"Error: Refusing to save {filename!r} outside {self.output_dir}")
+            with self._lock:
+                summary.failed.append(filename)
+            return
+        remote_size = recording_size(recording)
+        # Taken before downloading, so a recording replaced mid-download differs next time
+        fingerprint = self.remote_fingerprint(filename)
+        if self.is_unchanged(filename, remote_size, fingerprint):
+            with self._lock:
+                summary.skipped.append(filename)
+            return
+        self._download(filename, summary, fingerprint)
+
+    def _download(self, filename: str, summary: SyncSummary,
+                  fingerprint: Optional[Dict[str, Any]] = None):
+        save_path = os.path.join(self.output_dir, filename)
+        if not self.client.download_audio_recording(filename, save_path):
+            with self._lock:
+                summary.failed.append(filename)
+            return
+
+        try:
+            size = os.path.getsize(save_path)
+            entry = {"size": size, "sha256": file_sha256(save_path), "synced_at": time.time()}
+            for key in ("etag", "last_modified"):
+                if fingerprint and key in fingerprint:
+                    entry[key] = fingerprint[key]
+        except OSError as e:
+            print(f"Error: Could not read {save_path} after download: {e}")
+            with self._lock:
+                summary.failed.append(filename)
+            return
+        with self._lock:
+            self.manifest[filename] = entry
+            summary.downloaded.append(filename)
+            summary.bytes_moved += size
+
+    def sync(self, recordings: Optional[list] = None) -> SyncSummary:
+        """
+        Pull every new or changed recording from the robot
+
+        Args:
+            recordings: Listing to sync against (fetched from the robot if not given)
+
+        Returns:
+            Summary of what was downloaded, skipped and failed, with bytes moved and time taken
+        """
+        started = time.perf_counter()
+        summary = SyncSummary()
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.load_manifest()
+
+        if recordings is None:
+            recordings = self.client.list_audio_recordings()
+        if not recordings:
+            print("No recordings found or failed to list recordings")
+            summary.elapsed_s = time.perf_counter() - started
+            return summary
+
+        recordings = [recording for recording in recordings if recording_name(recording)]
+        self.client.log(f"\n=== Syncing {len(recordings)} recordings to {self.output_dir} "
+                        f"({self.max_workers} workers) ===")
+
+        try:
+            # The change check may need a HEAD per file, so it runs on the workers too
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                futures = {pool.submit(self._sync_one, recording, summary): recording_name(recording)
+                           for recording in recordings}
+            for future, filename in futures.items():
+                error = future.exception()
+                if error is not None:
+                    print(f"Error: Could not sync {filename}: {error}")
+                    summary.failed.append(filename)
+        finally:
+            self.save_manifest()
+
+        summary.elapsed_s = time.perf_counter() - started
+        self.client.log(f"\n=== Sync Complete: {summary} ===")
+        return summary
+
+
+def main():
+    # ============ CONFIGURATION - CHANGE THESE ============
+    BASE_URL = "http://192.168.0.111"  # Misty Robot IP Address
+    OUTPUT_DIR = "./recordings"
+    MAX_WORKERS = 4
+
+    client = APIClient(BASE_URL)
+    RecordingSync(client, OUTPUT_DIR, max_workers=MAX_WORKERS).sync()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,423 @@
+#!/usr/bin/env python3
+"""
+Session replay and load harness
+Replays the requests recorded in session logs against the local simulator (or a robot) at
+recorded speed, accelerated or flat out, optionally as several sessions at once, and compares
+throughput and latency percentiles with a stored baseline to catch performance regressions
+"""
+
+import glob
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict
+from typing import Optional, Dict, Any, List, Callable, Iterable
+
+import requests
+
+from api_client import APIClient
+from latency_stats import summarize
+from session_log import SessionLogger
+from transport import Transport
+
+# Session logs don't record request bodies; replayed requests use these instead
+DEFAULT_BODIES: Dict[str, Dict[str, Any]] = {
+    "POST /api/led": {"Red": 0, "Green": 255, "Blue": 0},
+    "POST /api/led/transition": {"Red": 0, "Green": 255, "Blue": 0, "Red2": 0, "Green2": 0, "Blue2": 255,
+                                 "TransitionType": "Breathe", "TimeMs": 2000},
+    "POST /api/head": {"Pitch": 10, "Roll": 0, "Yaw": 0, "Velocity": 80},
+    "POST /api/arms": {"Arm": "right", "Position": 90, "Velocity": 50},
+    "POST /api/drive": {"LinearVelocity": 20, "AngularVelocity": 0},
+    "POST /api/tts/speak": {"Text": "Excellent choice! One coffee, coming right up."},
+    "POST /api/audio/play": {"FileName": "capture_Dialogue.wav"},
+    "POST /api/audio/speech/capture": {"FileName": "capture_Dialogue.wav", "OverwriteExisting": True,
+                                       "SilenceTimeout": 1500, "MaxSpeechLength": 10000,
+                                       "RequireKeyPhrase": False},
+    "POST /api/images/display": {"FileName": "e_DefaultContent.jpg"},
+    "POST /api/text/display": {"Text": "Hello!"},
+    "GET /api/audio": {"FileName": "capture_Dialogue.wav"},
+}
+
+# Multipart uploads and deletions can't be rebuilt from the log (and would change the
+# simulator's state for the requests after them), so they are left out
+SKIPPED = ("POST /api/audio", "POST /api/images", "DELETE /api/audio", "DELETE /api/images")
+
+# A metric counts as regressed when it is this much worse than the baseline
+DEFAULT_TOLERANCE = 0.15
+# ...and at least this many ms worse, so sub-millisecond noise on fast endpoints is ignored
+DEFAULT_MIN_DELTA_MS = 5.0
+# Samples needed before a percentile is compared at all (a p99 of 20 samples is just the max)
+MIN_SAMPLES = {"p50": 30, "p95": 50, "p99": 200}
+
+
+@dataclass
+class LoggedRequest:
+    session: str
+    offset_s: float                 # When the request was sent, relative to the session's first one
+    method: str
+    endpoint: str
+    status: Optional[int]
+    total_ms: Optional[float]
+
+    @property
+    def key(self) -> str:
+        return f"{self.method} {self.endpoint}"
+
+
+@dataclass
+class ReplayResult:
+    session: str
+    key: str
+    scheduled_ms: float
+    lateness_ms: float
+    latency_ms: Optional[float]
+    status: Optional[int]
+    expected_status: Optional[int]
+    error: Optional[str] = None
+
+
+def load_sessions(paths: Iterable[str]) -> Dict[str, List[LoggedRequest]]:
+    """
+    Read the request events of one or more session logs
+
+    Args:
+        paths: JSON lines files or glob patterns (e.g. 'logs/session_log.jsonl*' to include rotated files)
+
+    Returns:
+        Session id -> its requests in the order they were sent
+    """
+    # glob also returns plain paths as they are, if they exist
+    files = sorted({f for path in paths for f in glob.glob(path)})
+    sessions: Dict[str, List[LoggedRequest]] = {}
+    for path in files:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if event.get("event") != "request" or not event.get("endpoint"):
+                    continue
+                # Requests are logged when they finish; replay them from when they were sent
+                total_ms = event.get("total_ms")
+                sent = event["t"] - (total_ms or 0.0) / 1000.0
+                sessions.setdefault(event.get("session", "unknown"), []).append(LoggedRequest(
+                    event.get("session", "unknown"), sent, event["method"], event["endpoint"],
+                    event.get("status"), total_ms))
+
+    for requests_ in sessions.values():
+        requests_.sort(key=lambda r: r.offset_s)
+        first = requests_[0].offset_s
+        for r in requests_:
+            r.offset_s = round(r.offset_s - first, 6)
+    return sessions
+
+
+def _default_client(base_url: str) -> APIClient:
+    # Each replayed session gets its own pool, as each participant session had
+    return APIClient(base_url, transport=Transport(pool_size=4, max_retries=0), quiet=True)
+
+
+class ReplayReport:
+    def __init__(self, results: List[ReplayResult], elapsed_s: float, config: Dict[str, Any]):
+        self.results = results
+        self.elapsed_s = elapsed_s
+        self.config = config
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Aggregate the replay
+
+        Returns:
+            Dict with the run config, overall and per-endpoint latency percentiles (ms),
+            throughput, errors, status mismatches and schedule lateness
+        """
+        sent = [r for r in self.results if r.latency_ms is not None]
+        endpoints = {}
+        for key in sorted({r.key for r in self.results}):
+            rows = [r for r in self.results if r.key == key]
+            stats = summarize([r.latency_ms for r in rows if r.latency_ms is not None])
+            stats["errors"] = sum(1 for r in rows if r.error is not None)
+            endpoints[key] = stats
+
+        overall = summarize([r.latency_ms for r in sent])
+        overall["rps"] = round(len(sent) / self.elapsed_s, 1) if self.elapsed_s > 0 else 0.0
+        return {
+            "config": self.config,
+            "elapsed_s": round(self.elapsed_s, 3),
+            "requests": len(self.results),
+            "errors": sum(1 for r in self.results if r.error is not None),
+            "status_mismatches": sum(1 for r in self.results if r.error is None and r.expected_status
+                                     is not None and r.status != r.expected_status),
+            "lateness_ms": summarize([r.lateness_ms for r in self.results]),
+            "overall": overall,
+            "endpoints": endpoints,
+        }
+
+    def print_report(self):
+        summary = self.summary()
+        config = summary["config"]
+        speed = "max throughput" if config["speed"] is None else f"{config['speed']:g}x"
+        print(f"Replayed {summary['requests']} requests from {config['sessions']} session(s) "
+              f"x{config['parallel']} parallel x{config['repeat']} at {speed} in {summary['elapsed_s']:.2f}s")
+        print(f"{'endpoint':<34} {'n':>5} {'err':>4} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        print("-" * 72)
+        for key, s in summary["endpoints"].items():
+            print(f"{key:<34} {s['count']:>5} {s['errors']:>4} {s['p50']:>8.2f} {s['p95']:>8.2f} {s['p99']:>8.2f}")
+        o = summary["overall"]
+        print("-" * 72)
+        print(f"{'overall':<34} {o['count']:>5} {summary['errors']:>4} {o['p50']:>8.2f} {o['p95']:>8.2f} "
+              f"{o['p99']:>8.2f}  {o['rps']:.1f} req/s")
+        print(f"schedule lateness p95: {summary['lateness_ms']['p95']:.2f} ms, "
+              f"status mismatches: {summary['status_mismatches']}")
+
+    def save(self, path: str):
+        with open(path, 'w') as f:
+            json.dump(self.summary(), f, indent=2)
+
+    def to_dict(self) -> Dict[str, Any]:
+        summary = self.summary()
+        summary["results"] = [asdict(r) for r in self.results]
+        return summary
+
+
+class Replayer:
+    def __init__(self, base_url: str, speed: Optional[float] = 1.0, parallel: int = 1,
+                 repeat: int = 1, max_in_flight: int = 4, timeout: float = 10.0,
+                 client_factory: Callable[[str], APIClient] = _default_client):
+        """
+        Initialize a replayer
+
+        Args:
+            base_url: Simulator or robot to replay against
+            speed: 1.0 keeps the recorded timing, 10.0 runs ten times faster, None sends each
+                   session's requests back to back as fast as they are answered
+            parallel: Copies of every session to run at the same time
+            repeat: Times each copy replays its session back to back (more samples per
+                    endpoint make the percentiles steadier)
+            max_in_flight: Requests of one session that may be outstanding at once (timed
+                           replay keeps requests that overlapped in the recording overlapping)
+            timeout: Seconds to wait for each response
+            client_factory: Builds the client for each replayed session, e.g. to compare
+                            client configurations against the same recorded traffic (its
+                            transport is closed when the session ends)
+        """
+        if speed is not None and speed <= 0:
+            raise ValueError("speed must be positive, or None for max throughput")
+        self.base_url = base_url
+        self.speed = speed
+        self.parallel = parallel
+        self.repeat = repeat
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self.client_factory = client_factory
+
+    def _send(self, client: APIClient, request: LoggedRequest, name: str, scheduled: float,
+              t0: float) -> ReplayResult:
+        sent = time.perf_counter()
+        result = ReplayResult(name, request.key, round((scheduled - t0) * 1000, 3),
+                              round(max(0.0, sent - scheduled) * 1000, 3), None, None, request.status)
+        data = DEFAULT_BODIES.get(request.key)
+        kwargs = {"json": data} if request.method == "POST" else {"params": data}
+        try:
+            response = client.request(request.method, request.endpoint, timeout=self.timeout, **kwargs)
+            result.latency_ms = round((time.perf_counter() - sent) * 1000, 3)
+            result.status = response.status_code
+        except requests.RequestException as e:
+            result.latency_ms = round((time.perf_counter() - sent) * 1000, 3)
+            result.error = type(e).__name__
+        return result
+
+    def _replay_session(self, name: str, requests_: List[LoggedRequest], t0: float,
+                        results: List[ReplayResult], lock: threading.Lock):
+        client = self.client_factory(self.base_url)
+        session_results = []
+        try:
+            for _ in range(self.repeat):
+                if self.speed is None:
+                    for request in requests_:
+                        session_results.append(self._send(client, request, name, time.perf_counter(), t0))
+                    continue
+                start = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=self.max_in_flight,
+                                        thread_name_prefix=f"replay-{name}") as pool:
+                    futures = []
+                    for request in requests_:
+                        scheduled = start + request.offset_s / self.speed
+                        delay = scheduled - time.perf_counter()
+                        if delay > 0:
+                            time.sleep(delay)
+                        futures.append(pool.submit(self._send, client, request, name, scheduled, t0))
+                    session_results.extend(f.result() for f in futures)
+        finally:
+            client.transport.close()
+        with lock:
+            results.extend(session_results)
+
+    def replay(self, sessions: Dict[str, List[LoggedRequest]]) -> ReplayReport:
+        """
+        Replay every session (each `parallel` times, all at once)
+
+        Args:
+            sessions: Output of load_sessions()
+
+        Returns:
+            Report with one result per replayed request
+        """
+        results: List[ReplayResult] = []
+        lock = threading.Lock()
+        jobs = []
+        for session, requests_ in sessions.items():
+            kept = [r for r in requests_ if r.key not in SKIPPED]
+            for copy in range(self.parallel):
+                name = session if self.parallel == 1 else f"{session}#{copy + 1}"
+                jobs.append((name, kept))
+
+        t0 = time.perf_counter()
+        threads = [threading.Thread(target=self._replay_session, args=(name, kept, t0, results, lock),
+                                    name=f"replay-{name}", daemon=True) for name, kept in jobs]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - t0
+
+        config = {"base_url": self.base_url, "speed": self.speed, "parallel": self.parallel,
+                  "repeat": self.repeat, "sessions": len(sessions), "max_in_flight": self.max_in_flight}
+        return ReplayReport(results, elapsed, config)
+
+
+def compare_to_baseline(summary: Dict[str, Any], baseline: Dict[str, Any],
+                        tolerance: float = DEFAULT_TOLERANCE,
+                        min_delta_ms: float = DEFAULT_MIN_DELTA_MS) -> List[str]:
+    """
+    Find metrics that got worse than the baseline by more than the tolerance
+
+    Percentiles with too few samples behind them (see MIN_SAMPLES) are not compared.
+
+    Args:
+        summary: ReplayReport.summary() of the new run
+        baseline: Summary saved from a reference run with the same logs and settings
+        tolerance: Allowed relative slowdown (0.10 = 10%)
+        min_delta_ms: Latency increases smaller than this are never regressions
+
+    Returns:
+        One description per regression (empty if the run is within tolerance)
+    """
+    regressions = []
+
+    def check_latency(label: str, new: Dict[str, Any], old: Dict[str, Any]):
+        for pct, needed in MIN_SAMPLES.items():
+            if min(old.get("count", 0), new.get("count", 0)) < needed:
+                continue
+            delta = new[pct] - old[pct]
+            if delta > min_delta_ms and new[pct] > old[pct] * (1 + tolerance):
+                regressions.append(f"{label} {pct}: {old[pct]:.2f} -> {new[pct]:.2f} ms "
+                                   f"(+{delta / old[pct] * 100 if old[pct] else float('inf'):.0f}%)")
+
+    # The simulator listens on a new port every run, so the URL itself isn't compared
+    settings = {k: v for k, v in summary["config"].items() if k != "base_url"}
+    if settings != {k: v for k, v in baseline.get("config", {}).items() if k != "base_url"}:
+        print(f"Warning: replay settings differ from the baseline's ({baseline.get('config')})")
+    check_latency("overall", summary["overall"], baseline["overall"])
+    for key, stats in summary["endpoints"].items():
+        if key in baseline["endpoints"]:
+            check_latency(key, stats, baseline["endpoints"][key])
+
+    old_rps, new_rps = baseline["overall"]["rps"], summary["overall"]["rps"]
+    if summary["config"]["speed"] is None and new_rps < old_rps * (1 - tolerance):
+        # Throughput only means something when requests aren't paced by the recording
+        regressions.append(f"throughput: {old_rps:.1f} -> {new_rps:.1f} req/s")
+    if summary["errors"] > baseline["errors"]:
+        regressions.append(f"errors: {baseline['errors']} -> {summary['errors']}")
+    return regressions
+
+
+def record_demo_session(base_url: str, path: str, turns: int = 3) -> str:
+    """
+    Record a short scripted session (greeting, order turns, downloads) to a session log
+
+    Gives the harness something to replay before real sessions have been logged.
+
+    Args:
+        base_url: Simulator or robot to record against
+        path: Session log file to write
+        turns: Order-taking turns to script
+
+    Returns:
+        The session id
+    """
+    from audio_api_client import APIClient as AudioAPIClient
+
+    with SessionLogger(path) as session_log:
+        client = AudioAPIClient(base_url, quiet=True, session_log=session_log)
+        client.get("/api/device")
+        client.get("/api/battery")
+        client.post("/api/led", data=DEFAULT_BODIES["POST /api/led"])
+        client.post("/api/tts/speak", data={"Text": "Hi! What can I get for you today?"})
+        for _ in range(turns):
+            client.post("/api/audio/speech/capture", data=DEFAULT_BODIES["POST /api/audio/speech/capture"])
+            time.sleep(0.3)
+            client.download_audio_recording("capture_Dialogue.wav",
+                                            os.path.join(os.path.dirname(os.path.abspath(path)),
+                                                         ".replay_capture.wav"), resume=False)
+            client.post("/api/head", data=DEFAULT_BODIES["POST /api/head"])
+            client.post("/api/tts/speak", data=DEFAULT_BODIES["POST /api/tts/speak"])
+            client.get("/api/battery")
+        client.get("/api/audio/list")
+        return session_log.session_id
+
+
+def main():
+    from misty_simulator import MistySimulator
+
+    # ============ CONFIGURATION - CHANGE THESE ============
+    SESSION_LOGS = ["session_log.jsonl*"]   # Captured sessions (rotated files included)
+    BASE_URL = None                         # None = replay against a local simulator
+    SPEED: Optional[float] = None           # 1.0 = recorded timing, 10.0 = 10x faster, None = flat out
+    PARALLEL = 4                            # Copies of each session run at once
+    REPEAT = 10                             # Times each copy replays its session
+    BASELINE_FILE = "replay_baseline.json"  # Compared against if it exists, written if it doesn't
+    TOLERANCE = DEFAULT_TOLERANCE
+
+    simulator = None
+    base_url = BASE_URL
+    if base_url is None:
+        simulator = MistySimulator(latency_ms=10, jitter_ms=5, capture_duration_s=0.2,
+                                   endpoint_latency_ms={"/api/tts/speak": 120}, seed=1).start()
+        base_url = simulator.base_url
+
+    try:
+        sessions = load_sessions(SESSION_LOGS)
+        if not sessions:
+            print("No recorded sessions found, recording a demo session first")
+            record_demo_session(base_url, "session_log.jsonl")
+            sessions = load_sessions(SESSION_LOGS)
+        report = Replayer(base_url, speed=SPEED, parallel=PARALLEL, repeat=REPEAT).replay(sessions)
+    finally:
+        if simulator is not None:
+            simulator.stop()
+
+    report.print_report()
+    summary = report.summary()
+    if not os.path.exists(BASELINE_FILE):
+        report.save(BASELINE_FILE)
+        print(f"\nNo baseline yet, saved this run to: {BASELINE_FILE}")
+        return
+
+    with open(BASELINE_FILE) as f:
+        baseline = json.load(f)
+    regressions = compare_to_baseline(summary, baseline, TOLERANCE)
+    if regressions:
+        print(f"\nREGRESSIONS against {BASELINE_FILE}:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print(f"\nWithin {TOLERANCE:.0%} of {BASELINE_FILE}")
+
+
+if __name__ == "__main__":
+    main()
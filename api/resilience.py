@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+"""
+Tail-latency protection for APIClient
+Per-endpoint adaptive timeouts learned from observed latency, hedged duplicates of idempotent
+GETs that are slower than usual, and a circuit breaker that fails fast while the robot is unreachable
+"""
+
+import dataclasses
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Optional, Dict, Any, Iterable
+from urllib.parse import urlparse
+
+import requests
+from urllib3.exceptions import ReadTimeoutError
+
+from latency_stats import percentile, summarize
+from transport import IDEMPOTENT_METHODS, Transport, Timeout, DEFAULT_READ_TIMEOUT
+
+# Cheap, idempotent reads that are safe to send twice when the first copy is slow
+DEFAULT_HEDGED = ("/api/device", "/api/battery", "/api/audio/list", "/api/images/list")
+
+
+def _timed_out(error: requests.RequestException) -> bool:
+    if isinstance(error, requests.ReadTimeout):
+        return True
+    # A read timeout on a retried GET arrives as a ConnectionError wrapping urllib3's MaxRetryError
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(reason, ReadTimeoutError)
+
+
+class RobotUnreachable(requests.ConnectionError):
+    """
+    Raised without sending anything while the circuit breaker is open
+    """
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_after_s: float = 5.0):
+        """
+        Initialize a breaker for one robot
+
+        After failure_threshold consecutive connection errors or timeouts (on the adaptive
+        deadline; a caller's own deadline says nothing about the robot) the breaker opens and
+        every call fails at once. After reset_after_s one call is let through as a probe: if it
+        succeeds the breaker closes, if not it stays open for another reset_after_s.
+
+        Args:
+            failure_threshold: Consecutive failures that open the breaker
+            reset_after_s: Seconds to fail fast before probing the robot again
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_after_s = reset_after_s
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.fast_failures = 0
+        self._probe_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """
+        Check whether a call may be sent now
+
+        Returns:
+            False if the call should fail fast
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            now = time.monotonic()
+            if self.state == self.OPEN and now - self.opened_at >= self.reset_after_s:
+                self.state = self.HALF_OPEN
+                self._probe_at = None
+            # A probe that never reported back (e.g. it raised something else) doesn't block forever
+            if self.state == self.HALF_OPEN and (self._probe_at is None
+                                                 or now - self._probe_at >= self.reset_after_s):
+                self._probe_at = now
+                return True
+            self.fast_failures += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probe_at = None
+
+    def record_failure(self) -> bool:
+        """
+        Count a connection error or timeout (a hedged call counts once, when all its copies have failed)
+
+        Returns:
+            True if this failure opened the breaker
+        """
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED
+                                                and self.failures >= self.failure_threshold):
+                opened = self.state == self.CLOSED
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self._probe_at = None
+                if opened:
+                    self.times_opened += 1
+                return opened
+            return False
+
+    def retry_in(self) -> float:
+        """
+        Seconds until the next probe is allowed (0.0 unless open)
+        """
+        with self._lock:
+            if self.state != self.OPEN:
+                return 0.0
+            return max(0.0, self.reset_after_s - (time.monotonic() - self.opened_at))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "times_opened": self.times_opened,
+            "fast_failures": self.fast_failures,
+        }
+
+
+class _LatencyWindow:
+    # The most recent attempt latencies for one endpoint, with percentiles cached until the next sample
+    def __init__(self, size: int):
+        self.samples: deque = deque(maxlen=size)
+        self._cached: Dict[float, float] = {}
+
+    def add(self, ms: float):
+        self.samples.append(ms)
+        self._cached.clear()
+
+    def percentile(self, pct: float) -> float:
+        value = self._cached.get(pct)
+        if value is None:
+            value = self._cached[pct] = percentile(self.samples, pct)
+        return value
+
+
+class _Call:
+    # One caller's hedged request; its copies leave the breaker to it and note whether they failed
+    # because of the robot
+    __slots__ = ("robot_failed",)
+
+    def __init__(self):
+        self.robot_failed = False
+
+
+class Resilience:
+    def __init__(self, hedged_endpoints: Iterable[str] = DEFAULT_HEDGED,
+                 hedge_percentile: float = 95.0, min_hedge_delay_ms: float = 5.0,
+                 hedge_budget: float = 0.1, timeout_percentile: float = 99.0,
+                 timeout_multiplier: float = 3.0, min_timeout_s: float = 1.0,
+                 max_timeout_s: float = DEFAULT_READ_TIMEOUT, min_samples: int = 20,
+                 window: int = 200, breaker: Optional[CircuitBreaker] = None):
+        """
+        Initialize the tail-latency policy for one robot (pass it to APIClient as resilience=)
+
+        Args:
+            hedged_endpoints: GET endpoints that may be sent a second time when slow
+            hedge_percentile: Send the duplicate once the first copy is slower than this
+                              percentile of the endpoint's recent latencies
+            min_hedge_delay_ms: Never hedge sooner than this
+            hedge_budget: Maximum fraction of hedgeable calls that may be duplicated, so a
+                          robot that is slow across the board doesn't get twice the load
+            timeout_percentile: Percentile of recent latencies the read timeout is based on
+            timeout_multiplier: Read timeout = multiplier x that percentile
+            min_timeout_s: Lower bound on the read timeout
+            max_timeout_s: Upper bound (and the timeout until enough samples are seen)
+            min_samples: Latencies needed before an endpoint's timeout or hedge delay adapts
+            window: Latencies kept per endpoint
+            breaker: Circuit breaker (defaults to 5 failures, 5 s before probing)
+        """
+        self.hedged_endpoints = frozenset(hedged_endpoints)
+        self.hedge_percentile = hedge_percentile
+        self.min_hedge_delay_ms = min_hedge_delay_ms
+        self.hedge_budget = hedge_budget
+        self.timeout_percentile = timeout_percentile
+        self.timeout_multiplier = timeout_multiplier
+        self.min_timeout_s = min_timeout_s
+        self.max_timeout_s = max_timeout_s
+        self.min_samples = min_samples
+        self.window = window
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self.hedgeable = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.timeouts = 0
+        self._latency: Dict[str, _LatencyWindow] = {}
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def observe(self, endpoint: str, ms: float):
+        """
+        Record how long one attempt at an endpoint took
+
+        Args:
+            endpoint: API endpoint
+            ms: Attempt latency (for a timeout, the time waited)
+        """
+        with self._lock:
+            latency = self._latency.get(endpoint)
+            if latency is None:
+                latency = self._latency[endpoint] = _LatencyWindow(self.window)
+            latency.add(ms)
+
+    def _percentile(self, endpoint: str, pct: float) -> Optional[float]:
+        with self._lock:
+            latency = self._latency.get(endpoint)
+            if latency is None or len(latency.samples) < self.min_samples:
+                return None
+            return latency.percentile(pct)
+
+    def read_timeout(self, endpoint: str) -> float:
+        """
+        Get the read timeout for an endpoint
+
+        Returns:
+            Seconds, from the endpoint's recent latency (max_timeout_s until it has enough samples)
+        """
+        ms = self._percentile(endpoint, self.timeout_percentile)
+        if ms is None:
+            return self.max_timeout_s
+        return min(self.max_timeout_s, max(self.min_timeout_s, ms * self.timeout_multiplier / 1000))
+
+    def hedge_delay(self, method: str, endpoint: str) -> Optional[float]:
+        """
+        Get how long to wait for a call before sending a duplicate
+
+        Returns:
+            Seconds, or None if the call must not be hedged (not an idempotent GET on the
+            hedged list, or no latency history yet)
+        """
+        if method != "GET" or endpoint not in self.hedged_endpoints:
+            return None
+        ms = self._percentile(endpoint, self.hedge_percentile)
+        if ms is None:
+            return None
+        return max(ms, self.min_hedge_delay_ms) / 1000
+
+    def send(self, transport: Transport, method: str, url: str, endpoint: str,
+             timeout: Optional[Timeout] = None, **kwargs) -> requests.Response:
+        """
+        Send a request through the breaker, with an adaptive timeout and hedging where allowed
+
+        Args:
+            transport: Connection pool to send through
+            method: HTTP verb
+            url: Full request URL
+            endpoint: API endpoint the latency history is kept under
+            timeout: Explicit deadline; when given it is used as is, and running out of it
+                     isn't held against the robot (only idempotent calls get the adaptive one).
+                     Either way it bounds the whole attempt: the transport doesn't retry here
+            **kwargs: Passed to Transport.request
+
+        Returns:
+            Response object (from whichever copy answered first when hedged)
+
+        Raises:
+            RobotUnreachable: If the breaker is open
+        """
+        if not self.breaker.allow():
+            raise RobotUnreachable(f"{urlparse(url).netloc} is unreachable, failing fast "
+                                   f"(next attempt in {self.breaker.retry_in():.1f} s)")
+        # A POST that times out may still have been carried out; it keeps the transport's deadline
+        adaptive = timeout is None and not kwargs.get("stream") and method in IDEMPOTENT_METHODS
+        if adaptive:
+            timeout = (transport.timeout[0], self.read_timeout(endpoint))
+
+        delay = None if kwargs.get("stream") else self.hedge_delay(method, endpoint)
+        if delay is None:
+            return self._attempt(transport, method, url, endpoint, timeout, adaptive, **kwargs)
+        return self._hedged(delay, transport, method, url, endpoint, timeout, adaptive, **kwargs)
+
+    def _attempt(self, transport: Transport, method: str, url: str, endpoint: str,
+                 timeout: Optional[Timeout], adaptive: bool, call: Optional[_Call] = None,
+                 **kwargs) -> requests.Response:
+        started = time.perf_counter()
+        try:
+            # Retries inside the transport would each get the full adaptive timeout; hedging and
+            # the breaker take their place
+            response = transport.request(method, url, timeout=timeout, retry=False, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            robot_failed = self._failed(endpoint, started, e, adaptive)
+            if call is None:
+                if robot_failed:
+                    self._record_failure(url)
+            elif robot_failed:
+                call.robot_failed = True
+            raise
+        self.observe(endpoint, response.timing.total_ms)
+        if call is None:
+            self.breaker.record_success()
+        return response
+
+    def _failed(self, endpoint: str, started: float, error: requests.RequestException,
+                adaptive: bool) -> bool:
+        # Returns whether the failure is the robot's (and so counts against the breaker)
+        if _timed_out(error):
+            with self._lock:
+                self.timeouts += 1
+            if not adaptive:
+                # The caller's deadline (e.g. a 300 ms speech budget) ran out, not the robot
+                return False
+            # Waiting longer next time beats timing out forever on a link that got slower
+            self.observe(endpoint, (time.perf_counter() - started) * 1000)
+        return True
+
+    def _record_failure(self, url: str):
+        if self.breaker.record_failure():
+            print(f"Error: {urlparse(url).netloc} is unreachable ({self.breaker.failures} failed "
+                  f"calls in a row), failing fast for {self.breaker.reset_after_s:g} s")
+
+    def _hedged(self, delay: float, transport: Transport, method: str, url: str, endpoint: str,
+                timeout: Optional[Timeout], adaptive: bool, **kwargs) -> requests.Response:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=transport.pool_size,
+                                                        thread_name_prefix="misty-hedge")
+        started = time.perf_counter()
+        call = _Call()
+        attempt = lambda: self._attempt(transport, method, url, endpoint, timeout, adaptive, call, **kwargs)
+        futures = [self._executor.submit(attempt)]
+        done, _ = wait(futures, timeout=delay)
+        with self._lock:
+            self.hedgeable += 1
+            hedge = not done and self.hedges < self.hedge_budget * self.hedgeable
+            if hedge:
+                self.hedges += 1
+        if hedge:
+            futures.append(self._executor.submit(attempt))
+
+        pending = set(futures)
+        while True:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            # Take the first copy that answered; an error only counts once both have failed
+            for future in sorted(done, key=futures.index):
+                if future.exception() is None:
+                    # A copy still running is abandoned; whatever it ends with isn't recorded
+                    self.breaker.record_success()
+                    response = future.result()
+                    if future is not futures[0]:
+                        with self._lock:
+                            self.hedge_wins += 1
+                    # Report the latency the caller saw, not just the winning copy's
+                    response.timing = dataclasses.replace(
+                        response.timing, total_ms=(time.perf_counter() - started) * 1000)
+                    return response
+            if not pending:
+                if call.robot_failed:
+                    self._record_failure(url)
+                raise futures[-1].exception()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            endpoints = {endpoint: summarize(list(latency.samples))
+                         for endpoint, latency in self._latency.items()}
+            stats = {
+                "hedgeable": self.hedgeable,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "timeouts": self.timeouts,
+            }
+        stats["breaker"] = self.breaker.stats()
+        stats["read_timeout_s"] = {endpoint: round(self.read_timeout(endpoint), 3) for endpoint in endpoints}
+        stats["latency_ms"] = endpoints
+        return stats
+
+
+def main():
+    # Imported here: api_client imports this module
+    from api_client import APIClient
+    from misty_simulator import MistySimulator
+
+    # ============ CONFIGURATION - CHANGE THESE ============
+    REQUESTS = 400
+    ENDPOINTS = ["/api/battery", "/api/device", "/api/audio/list"]
+    LATENCY_MS = 20.0
+    JITTER_MS = 10.0
+    SPIKE_RATE = 0.03          # Fraction of calls that stall
+    SPIKE_MS = 1500.0
+
+    simulator = MistySimulator(latency_ms=LATENCY_MS, jitter_ms=JITTER_MS, spike_rate=SPIKE_RATE,
+                               spike_ms=SPIKE_MS, seed=7).start()
+    try:
+        for label, resilience in (("plain", None), ("resilient", Resilience())):
+            client = APIClient(simulator.base_url, quiet=True, resilience=resilience)
+            latencies = []
+            for i in range(REQUESTS):
+                started = time.perf_counter()
+                client.get(ENDPOINTS[i % len(ENDPOINTS)])
+                latencies.append((time.perf_counter() - started) * 1000)
+            stats = summarize(latencies, digits=1)
+            print(f"{label:10} p50 {stats['p50']:7.1f} ms  p95 {stats['p95']:7.1f} ms  "
+                  f"p99 {stats['p99']:7.1f} ms  max {stats['max']:7.1f} ms")
+        print(f"hedges sent {resilience.hedges}, won {resilience.hedge_wins} "
+              f"(of {resilience.hedgeable} hedgeable calls)")
+
+        # The robot goes away: after a few failures calls fail at once instead of each waiting
+        client.base_url = "http://127.0.0.1:9"
+        for i in range(8):
+            started = time.perf_counter()
+            try:
+                client.get("/api/battery")
+            except requests.ConnectionError as e:
+                kind = "fast fail" if isinstance(e, RobotUnreachable) else "failed"
+                print(f"{kind:9} after {(time.perf_counter() - started) * 1000:6.1f} ms")
+        print(resilience.breaker.stats())
+    finally:
+        simulator.stop()
+
+
+if __name__ == "__main__":
+    main()
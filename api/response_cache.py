@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Response cache for idempotent GETs
+Serves repeated reads of slow-changing endpoints (device info, file lists) from memory for a
+per-endpoint TTL, revalidates with ETag / Last-Modified when the robot supports it, and drops
+entries when a command changes the resource they describe
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple, Iterable, List
+
+import requests
+
+# Seconds a GET may be served from cache; endpoints not listed are never cached
+DEFAULT_TTLS: Dict[str, float] = {
+    "/api/device": 300.0,
+    "/api/audio/list": 30.0,
+    "/api/images/list": 30.0,
+    "/api/battery": 2.0,
+}
+
+# Mutating calls -> cached endpoints (or prefixes) they change; anything else, e.g. playing
+# a clip or speaking without saving, leaves the cache alone
+DEFAULT_INVALIDATES: Dict[str, Tuple[str, ...]] = {
+    "/api/audio": ("/api/audio/list",),     # upload (POST) and delete (DELETE)
+    "/api/images": ("/api/images/list",),
+    "/api/audio/speech/capture": ("/api/audio/list",),
+    "/api/audio/recording/stop": ("/api/audio/list",),
+    "/api/cameras/photo": ("/api/images/list",),
+    "/api/tts/speak": ("/api/audio/list",),
+    "/api/system/reboot": ("/api",),
+}
+
+# Endpoints that only create an asset when the request body sets SaveToFile
+SAVE_TO_FILE_ENDPOINTS = ("/api/tts/speak",)
+
+# Robot events -> cached endpoints (or prefixes) they change without a request of ours finishing,
+# e.g. a speech capture's file is written when it ends, often on the silence timeout
+DEFAULT_EVENT_INVALIDATES: Dict[str, Tuple[str, ...]] = {
+    "VoiceRecord": ("/api/audio/list",),
+}
+
+CacheKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+class _Entry:
+    __slots__ = ("response", "stored_at", "ttl", "etag", "last_modified")
+
+    def __init__(self, response: requests.Response, ttl: float):
+        self.response = response
+        self.stored_at = time.monotonic()
+        self.ttl = ttl
+        self.etag = response.headers.get("ETag")
+        self.last_modified = response.headers.get("Last-Modified")
+
+    def fresh(self, now: float) -> bool:
+        return now - self.stored_at < self.ttl
+
+
+class ResponseCache:
+    def __init__(self, ttls: Optional[Dict[str, float]] = None,
+                 invalidates: Optional[Dict[str, Iterable[str]]] = None, max_entries: int = 256):
+        """
+        Initialize an in-memory cache for one client
+
+        Args:
+            ttls: Endpoint -> seconds its GET responses stay fresh (defaults to DEFAULT_TTLS);
+                  stale entries are revalidated if the robot sent an ETag or Last-Modified
+            invalidates: Endpoint -> cached endpoints (or prefixes) a POST/DELETE to it changes
+                         (defaults to DEFAULT_INVALIDATES), e.g. DELETE /api/images -> /api/images/list
+            max_entries: Entries kept before the least recently used is dropped
+        """
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self.invalidates = {k: tuple(v) for k, v in (DEFAULT_INVALIDATES if invalidates is None
+                                                     else invalidates).items()}
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.invalidations = 0
+        # Bumped by every invalidation, so a GET that was in flight across one isn't stored
+        self.generation = 0
+        self._entries: "OrderedDict[CacheKey, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def cacheable(self, endpoint: str) -> bool:
+        return self.ttls.get(endpoint, 0) > 0
+
+    @staticmethod
+    def key(endpoint: str, params: Optional[Dict[str, Any]]) -> CacheKey:
+        return endpoint, tuple(sorted((str(k), str(v)) for k, v in (params or {}).items()))
+
+    def lookup(self, key: CacheKey) -> Tuple[Optional[requests.Response], Dict[str, str]]:
+        """
+        Look up a GET
+
+        Args:
+            key: Key from ResponseCache.key()
+
+        Returns:
+            (fresh response or None, conditional headers to revalidate a stale entry with)
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None, {}
+            self._entries.move_to_end(key)
+            if entry.fresh(now):
+                self.hits += 1
+                return entry.response, {}
+            self.misses += 1
+            headers = {}
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+            return None, headers
+
+    def revalidate(self, key: CacheKey) -> Optional[requests.Response]:
+        """
+        Mark a stale entry fresh again after the robot answered 304 Not Modified
+
+        Args:
+            key: Key from ResponseCache.key()
+
+        Returns:
+            The cached response, or None if it was invalidated in the meantime
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            entry.stored_at = time.monotonic()
+            self.revalidated += 1
+            return entry.response
+
+    def store(self, key: CacheKey, response: requests.Response, generation: Optional[int] = None):
+        """
+        Cache a successful GET response
+
+        Args:
+            key: Key from ResponseCache.key()
+            response: Response with its body already read
+            generation: ResponseCache.generation when the GET was sent; the response is
+                        dropped if an invalidation happened since
+        """
+        if response.status_code != 200:
+            return
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[key] = _Entry(response, self.ttls.get(key[0], 0))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, prefix: str) -> int:
+        """
+        Drop every entry whose endpoint is under a resource prefix
+
+        Args:
+            prefix: Resource prefix (e.g., '/api/images')
+
+        Returns:
+            Number of entries removed
+        """
+        with self._lock:
+            stale = [key for key in self._entries
+                     if key[0] == prefix or key[0].startswith(prefix.rstrip("/") + "/")]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+            self.generation += 1
+        return len(stale)
+
+    def invalidate_for(self, method: str, endpoint: str, body: Optional[Dict[str, Any]] = None) -> int:
+        """
+        Drop the entries a mutating request will make stale
+
+        Args:
+            method: HTTP verb of the request about to be sent
+            endpoint: Its endpoint
+            body: Its JSON body (decides whether e.g. TTS saves a file)
+
+        Returns:
+            Number of entries removed
+        """
+        if method in ("GET", "HEAD", "OPTIONS"):
+            return 0
+        if endpoint in SAVE_TO_FILE_ENDPOINTS and not (body or {}).get("SaveToFile"):
+            return 0
+        removed = 0
+        for prefix in self.invalidates.get(endpoint, ()):
+            removed += self.invalidate(prefix)
+        return removed
+
+    def follow(self, events: Any, event_invalidates: Optional[Dict[str, Iterable[str]]] = None) -> List[Any]:
+        """
+        Invalidate on robot events that change a cached resource
+
+        Args:
+            events: Connected events.MistyEventStream for the same robot
+            event_invalidates: Event type -> cached endpoints (or prefixes) it makes stale
+                               (defaults to DEFAULT_EVENT_INVALIDATES)
+
+        Returns:
+            The event subscriptions
+        """
+        subscriptions = []
+        for event_type, prefixes in (DEFAULT_EVENT_INVALIDATES if event_invalidates is None
+                                     else event_invalidates).items():
+            prefixes = tuple(prefixes)
+            subscriptions.append(events.subscribe(
+                event_type, callback=lambda message, prefixes=prefixes: [self.invalidate(p) for p in prefixes]))
+        return subscriptions
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidated": self.revalidated,
+            "invalidations": self.invalidations,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
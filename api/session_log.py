@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Append-only session log for Misty interaction sessions
+Records requests, recordings and transcriptions as JSON lines with monotonic timestamps;
+a background thread does the writing so the robot's request path never waits on disk
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from typing import Optional, Dict, Any
+
+from instrumentation import RequestRecord
+
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+
+# Sentinel telling the writer thread to drain and stop
+_STOP = object()
+
+
+class SessionLogger:
+    def __init__(self, path: str = "session_log.jsonl", session_id: Optional[str] = None,
+                 max_queue: int = 10000, batch_size: int = 256, fsync_interval_s: float = 1.0,
+                 max_bytes: int = DEFAULT_MAX_BYTES, backups: int = 5):
+        """
+        Initialize a session log and start its writer thread
+
+        log() only stamps the event and puts it on a bounded queue; JSON encoding, writes
+        and fsync happen on the writer thread. If the queue is full the event is dropped
+        and counted rather than blocking the caller.
+
+        Args:
+            path: JSON lines file to append to
+            session_id: Identifier written on every line (defaults to a random id)
+            max_queue: Events that may wait for the writer before new ones are dropped
+            batch_size: Most events written per batch
+            fsync_interval_s: Longest time written events may sit unsynced
+            max_bytes: Rotate the file once it grows past this size (0 to never rotate)
+            backups: Rotated files to keep (path.1 is the newest)
+        """
+        self.path = path
+        self.session_id = session_id or uuid.uuid4().hex[:12]
+        self.batch_size = batch_size
+        self.fsync_interval_s = fsync_interval_s
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.written = 0
+        self.dropped = 0
+        self.rotations = 0
+        self.started = time.monotonic()
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._closed = False
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._file = open(path, 'a', encoding='utf-8')
+        self._thread = threading.Thread(target=self._write_loop, name="session-log", daemon=True)
+        self._thread.start()
+        self.log("session_start", wall_time=time.time())
+
+    def log(self, event: str, **fields):
+        """
+        Record an event without blocking
+
+        Args:
+            event: Event name (e.g., 'request', 'recording_start', 'transcription')
+            **fields: JSON-serializable details
+        """
+        if self._closed:
+            return
+        try:
+            self._queue.put_nowait((time.monotonic(), event, fields))
+        except queue.Full:
+            self.dropped += 1
+
+    def log_request(self, record: RequestRecord):
+        """
+        Record a finished API request; pass to Instrumentation.add_hook()
+
+        Args:
+            record: Request record from the client's instrumentation
+        """
+        timing = record.timing
+        self.log("request", method=record.method, endpoint=record.endpoint, status=record.status,
+                 error=record.error,
+                 total_ms=round(timing.total_ms, 3) if timing else None,
+                 ttfb_ms=round(timing.ttfb_ms, 3) if timing else None,
+                 connect_ms=round(timing.connect_ms, 3) if timing else None)
+
+    def _encode(self, item) -> str:
+        t, event, fields = item
+        line = {"t": round(t - self.started, 6), "session": self.session_id, "event": event}
+        line.update(fields)
+        return json.dumps(line, default=str) + "\n"
+
+    def _rotate(self):
+        self._file.close()
+        if self.backups > 0:
+            for i in range(self.backups - 1, 0, -1):
+                source = f"{self.path}.{i}"
+                if os.path.exists(source):
+                    os.replace(source, f"{self.path}.{i + 1}")
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self.rotations += 1
+
+    def _write_loop(self):
+        last_sync = time.monotonic()
+        dirty = False
+        stopping = False
+        while not stopping:
+            timeout = max(0.0, self.fsync_interval_s - (time.monotonic() - last_sync)) if dirty else None
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            batch = []
+            while item is not None:
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(self._encode(item))
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    item = None
+
+            if batch:
+                self._file.write("".join(batch))
+                self._file.flush()
+                self.written += len(batch)
+                dirty = True
+                if self.max_bytes and self._file.tell() >= self.max_bytes:
+                    os.fsync(self._file.fileno())
+                    self._rotate()
+                    last_sync, dirty = time.monotonic(), False
+
+            if dirty and (stopping or time.monotonic() - last_sync >= self.fsync_interval_s):
+                os.fsync(self._file.fileno())
+                last_sync, dirty = time.monotonic(), False
+        self._file.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "session": self.session_id,
+            "written": self.written,
+            "dropped": self.dropped,
+            "queued": self._queue.qsize(),
+            "rotations": self.rotations,
+        }
+
+    def close(self, timeout: Optional[float] = 5.0):
+        """
+        Log the end of the session, write everything queued and sync the file
+
+        Args:
+            timeout: Seconds to wait for the writer thread
+        """
+        if self._closed:
+            return
+        self.log("session_end", duration_s=round(time.monotonic() - self.started, 3),
+                 dropped=self.dropped)
+        self._closed = True
+        # Unlike log(), this waits for room: the stop marker must not be dropped
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            # The writer is stuck (e.g. a hung disk); don't hang the caller with it
+            print(f"Error: Session log writer did not drain within {timeout}s "
+                  f"({self.dropped} events dropped, {self._queue.qsize()} still queued)")
+            return
+        self._thread.join(timeout)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -4,34 +4,152 @@ Simple Speech-to-Text converter for WAV files
 Uses Pocketsphinx (offline, free)
 """
 
-from pocketsphinx import AudioFile
+import os
+import struct
+import threading
+import time
+from typing import Optional, Dict, Iterable
 
-def wav_to_text(wav_file_path):
+import numpy as np
+from pocketsphinx import Decoder
+
+from audio_ingest import DECODER_SAMPLE_RATE, PolyphaseResampler, WavFile, WavInfo, iter_decoder_pcm, \
+    parse_wav_header, to_float, to_pcm16
+from session_log import SessionLogger
+
+_decoder: Optional[Decoder] = None
+_decoder_lock = threading.Lock()
+# id(decoder) -> lock held for the length of each utterance on it
+_utterance_locks: Dict[int, threading.Lock] = {}
+
+
+def create_decoder(**config) -> Decoder:
+    """
+    Create a pocketsphinx Decoder (loads the acoustic and language models)
+
+    Args:
+        **config: Pocketsphinx options (e.g., hmm=..., lm=..., dict=...); defaults to the bundled US English models
+
+    Returns:
+        New Decoder
+    """
+    config.setdefault("loglevel", "FATAL")
+    return Decoder(**config)
+
+
+def get_decoder() -> Decoder:
+    """
+    Get the long-lived default Decoder, loading the models on first use
+
+    Returns:
+        Decoder shared by streaming transcriptions in this process
+    """
+    global _decoder
+    with _decoder_lock:
+        if _decoder is None:
+            _decoder = create_decoder()
+        return _decoder
+
+
+def decoder_lock(decoder: Decoder) -> threading.Lock:
+    """
+    Get the lock that utterances on a decoder take turns with (a Decoder is not thread-safe)
+
+    Args:
+        decoder: Decoder about to be used
+
+    Returns:
+        Lock to hold from start_utt() until the hypothesis has been read
+    """
+    with _decoder_lock:
+        return _utterance_locks.setdefault(id(decoder), threading.Lock())
+
+
+def wav_to_text(wav_file_path, service_url: Optional[str] = None, vad: bool = False,
+                vad_workers: int = 0, use_cache: bool = True,
+                session_log: Optional[SessionLogger] = None, grammar=None):
     """
     Convert WAV file to text using speech recognition
 
     Args:
         wav_file_path: Path to the WAV file
+        service_url: URL of a running stt_service (e.g., 'http://127.0.0.1:8765') to use its
+                     warm decoders instead of loading the models here; decodes locally if unreachable
+        vad: Decode only the speech segments found by vad.detect_speech, skipping silence
+        vad_workers: With vad, decode segments on this many worker processes (0 = in this process)
+        use_cache: Reuse the result of an earlier decode of the same audio with the same settings
+                   (see transcription_cache)
+        session_log: Record the transcription (mode, text and time taken) in this session log
+        grammar: menu_grammar.MenuGrammar to decode against instead of the general English
+                 model (falls back to it when the grammar result is not confident)
 
     Returns:
         Transcribed text or error message
     """
     print(f"Loading audio file: {wav_file_path}")
+    started = time.monotonic()
 
     try:
-        print("Transcribing speech to text (using offline recognition)...")
+        text = None
+        mode = None
+        cache = None
+        cache_key = None
+        if use_cache:
+            from transcription_cache import get_default_cache
+
+            cache = get_default_cache()
+            audio_digest = cache.audio_digest(wav_file_path)
+            if grammar is not None:
+                requested = f"grammar:{grammar.digest[:16]}"
+            else:
+                requested = "service" if service_url is not None else ("vad" if vad else "stream")
+            decoder_config = grammar.decoder_options if grammar is not None else None
+            # Stored under the same key even when e.g. an unreachable service falls back to a local decode
+            cache_key = cache.key(audio_digest, {"mode": requested}, decoder_config)
+            cached = cache.get(cache_key)
+            if cached is not None:
+                print("Using cached transcription")
+                text = cached["text"] or ""
+                mode = "cached"
+
+        if text is None and grammar is not None:
+            print("Transcribing against the menu grammar (using offline recognition)...")
+            slots = grammar.decode_file(wav_file_path)
+            print(f"Order slots ({slots.mode}, confidence {slots.confidence:.2f}): items={slots.items} "
+                  f"add_on={slots.add_on} answer={slots.answer}")
+            text = slots.text
+            mode = f"grammar:{grammar.digest[:16]}"
 
-        # Process audio file with pocketsphinx
-        audio = AudioFile(audio_file=wav_file_path)
+        if text is None and service_url is not None:
+            text = _transcribe_with_service(wav_file_path, service_url)
+            mode = "service"
 
-        # Collect all transcribed text
-        text_parts = []
-        for phrase in audio:
-            if phrase:
-                text_parts.append(str(phrase))
+        if text is None and vad:
+            from vad import transcribe_with_vad
 
-        # Combine all parts
-        text = " ".join(text_parts)
+            print("Transcribing speech segments to text (using offline recognition)...")
+            segments = transcribe_with_vad(wav_file_path, max_workers=vad_workers)
+            for segment in segments:
+                print(f"  [{segment['start_s']:6.2f}s - {segment['end_s']:6.2f}s] {segment['text'] or ''}")
+            text = " ".join(segment['text'] for segment in segments if segment['text'])
+            mode = "vad"
+
+        if text is None:
+            with WavFile(wav_file_path) as wav:
+                decoder_ready = wav.info.decoder_ready
+            if decoder_ready:
+                print("Transcribing speech to text (using offline recognition)...")
+            else:
+                print("Converting to 16 kHz mono and transcribing (using offline recognition)...")
+            # Decoder-ready audio is fed straight from the mapped file; anything else is converted per block
+            text = transcribe_stream(iter_decoder_pcm(wav_file_path)) or ""
+            mode = "stream"
+
+        if cache_key is not None and mode != "cached":
+            cache.put(cache_key, {"text": text or None})
+        if session_log is not None:
+            session_log.log("transcription", file=str(wav_file_path), mode=mode, text=text or None,
+                            elapsed_ms=round((time.monotonic() - started) * 1000, 3))
 
         if text:
             print("\n" + "="*60)
@@ -55,6 +173,194 @@ def wav_to_text(wav_file_path):
         return None
 
 
+def _transcribe_with_service(wav_file_path, service_url: str) -> Optional[str]:
+    import requests
+    from stt_service import SttServiceClient
+
+    if not os.path.exists(wav_file_path):
+        raise FileNotFoundError(wav_file_path)
+    try:
+        print(f"Transcribing speech to text (using STT service at {service_url})...")
+        result = SttServiceClient(service_url).transcribe(wav_file_path)
+        print(f"Decoded in {result['decode_ms']:.0f} ms ({result['queue_ms']:.0f} ms queued)")
+        return result["text"] or ""
+    except requests.RequestException as e:
+        print(f"STT service unavailable ({e}), decoding locally")
+        return None
+
+
+class StreamingTranscriber:
+    def __init__(self, decoder: Optional[Decoder] = None):
+        """
+        Transcribe audio chunk by chunk as it arrives, e.g. while it is still downloading
+
+            transcriber = StreamingTranscriber()
+            client.download_audio_recording("capture_Dialogue.wav", on_chunk=transcriber.feed)
+            text = transcriber.finish()
+
+        Accepts a WAV stream (the header is parsed from the first chunks) or raw
+        16 kHz mono 16-bit PCM. WAV audio in any other PCM or float format is downmixed
+        and resampled as it arrives. Transcriptions on the same decoder take turns: each holds
+        decoder_lock() from its first audio until finish() or abort().
+
+        Args:
+            decoder: Decoder to feed (defaults to the shared warm decoder from get_decoder())
+        """
+        self.decoder = decoder if decoder is not None else get_decoder()
+        self.format: Optional[Dict[str, int]] = None
+        self.partial: Optional[str] = None
+        self._header = b""
+        self._remainder = b""
+        self._started = False
+        self._frame_size = 2
+        self._wav_info: Optional[WavInfo] = None
+        self._resampler: Optional[PolyphaseResampler] = None
+        self._lock = decoder_lock(self.decoder)
+
+    def feed(self, chunk: bytes) -> Optional[str]:
+        """
+        Decode the next piece of the audio stream
+
+        Args:
+            chunk: Next bytes of the WAV file or PCM stream
+
+        Returns:
+            Partial hypothesis so far, or None if nothing has been recognized yet
+        """
+        if self.format is None:
+            self._header += chunk
+            chunk = self._parse_header()
+            if self.format is None:
+                return None
+
+        if not self._started:
+            self._lock.acquire()
+            try:
+                self.decoder.start_utt()
+            except BaseException:
+                self._lock.release()
+                raise
+            self._started = True
+
+        # Chunks may be memoryviews into a mapped file; only copy when a partial frame is pending
+        data = self._remainder + chunk if self._remainder else chunk
+        # Only whole frames can be decoded; keep a trailing partial frame for the next chunk
+        usable = len(data) - (len(data) % self._frame_size)
+        self._remainder = bytes(data[usable:])
+        if usable:
+            pcm = data[:usable]
+            if self._resampler is not None:
+                frames = to_float(np.frombuffer(pcm, dtype=np.uint8), self._wav_info)
+                pcm = to_pcm16(self._resampler.process(frames.mean(axis=1, dtype=np.float32)))
+            self._process(pcm)
+            hyp = self.decoder.hyp()
+            if hyp is not None and hyp.hypstr:
+                self.partial = hyp.hypstr
+        return self.partial
+
+    def finish(self) -> Optional[str]:
+        """
+        End the utterance and get the final hypothesis
+
+        Returns:
+            Final transcription, or None if no speech was recognized
+        """
+        if not self._started:
+            return None
+        try:
+            return self._finish()
+        finally:
+            self._started = False
+            self._lock.release()
+
+    def abort(self):
+        """
+        Drop an unfinished utterance (e.g. its download failed) and free the decoder;
+        does nothing after finish()
+        """
+        if not self._started:
+            return
+        try:
+            self.decoder.end_utt()
+        finally:
+            self._started = False
+            self._lock.release()
+
+    def _finish(self) -> Optional[str]:
+        # Called with the decoder's lock held
+        self._end_utt()
+        hyp = self.decoder.hyp()
+        return hyp.hypstr if hyp is not None and hyp.hypstr else None
+
+    def _end_utt(self):
+        if self._resampler is not None:
+            self._process(to_pcm16(self._resampler.flush()))
+        self.decoder.end_utt()
+
+    def _process(self, pcm):
+        # Decoder-format PCM (16 kHz mono 16-bit) for the current utterance
+        self.decoder.process_raw(pcm, False, False)
+
+    def _parse_header(self) -> bytes:
+        data = self._header
+        if len(data) < 12:
+            return b""
+        if data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+            # Not a WAV file, treat as raw decoder-format PCM
+            self.format = {"channels": 1, "sample_rate": DECODER_SAMPLE_RATE, "bits": 16}
+            self._header = b""
+            return data
+
+        fmt = None
+        pos = 12
+        while pos + 8 <= len(data):
+            chunk_id, size = struct.unpack("<4sI", data[pos:pos + 8])
+            if chunk_id == b"fmt ":
+                if pos + 8 + 16 > len(data):
+                    return b""
+                if pos + 8 + size > len(data):
+                    return b""
+                # parse_wav_header validates the format (incl. WAVE_FORMAT_EXTENSIBLE)
+                info = parse_wav_header(data[:pos + 8 + size] + b"data\0\0\0\0")
+                fmt = {"channels": info.channels, "sample_rate": info.sample_rate, "bits": info.bits}
+            elif chunk_id == b"data":
+                if fmt is None:
+                    raise ValueError("WAV stream has no fmt chunk before its data")
+                if not info.decoder_ready:
+                    # Downmix and resample to the decoder's format as the audio arrives
+                    self._wav_info = info
+                    self._frame_size = info.frame_size
+                    self._resampler = PolyphaseResampler(info.sample_rate, DECODER_SAMPLE_RATE)
+                self.format = fmt
+                self._header = b""
+                return data[pos + 8:]
+            # Chunks are word-aligned
+            pos += 8 + size + (size % 2)
+        return b""
+
+
+def transcribe_stream(chunks: Iterable[bytes], decoder: Optional[Decoder] = None) -> Optional[str]:
+    """
+    Transcribe an iterable of audio chunks (WAV or raw PCM)
+
+    Args:
+        chunks: Audio bytes in order, e.g. response.iter_content()
+        decoder: Decoder to use (defaults to the shared warm decoder)
+
+    Returns:
+        Transcribed text, or None if no speech was recognized
+    """
+    transcriber = StreamingTranscriber(decoder)
+    try:
+        for chunk in chunks:
+            transcriber.feed(chunk)
+    except BaseException:
+        # The source failed partway (e.g. a dropped upload); free the decoder for the next caller
+        transcriber.abort()
+        raise
+    return transcriber.finish()
+
+
 def main():
     # Path to your WAV file
     wav_file = "./capture_Dialogue.wav"
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Persistent Speech-to-Text service
+Keeps Pocketsphinx decoders loaded and serves transcriptions over localhost HTTP
+
+Endpoints:
+    POST /transcribe   WAV bytes in the body, or JSON {"path": "/abs/path.wav"}
+    GET  /health       status, worker count and queue depth
+    GET  /stats        request counts and latency percentiles
+"""
+
+import json
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Dict, Any
+
+import requests
+
+from latency_stats import summarize
+from speech_to_text import create_decoder, transcribe_stream
+from transport import Transport, get_shared_transport
+
+DEFAULT_PORT = 8765
+STATS_WINDOW = 1000
+
+
+class SttService:
+    def __init__(self, host: str = "127.0.0.1", port: int = DEFAULT_PORT, workers: int = 1,
+                 max_queue: int = 32, decoder_config: Optional[Dict[str, Any]] = None):
+        """
+        Initialize the service and load one decoder per worker
+
+        Args:
+            host: Interface to listen on (keep it on localhost)
+            port: Port to listen on (0 picks a free port)
+            workers: Number of decoder threads (each holds its own models)
+            max_queue: Requests allowed to wait for a decoder before new ones get 503
+            decoder_config: Pocketsphinx options for every decoder (defaults to the bundled models)
+        """
+        self.jobs: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self.started_at = time.time()
+        self._stats_lock = threading.Lock()
+        self._requests = 0
+        self._errors = 0
+        self._rejected = 0
+        self._total_ms: deque = deque(maxlen=STATS_WINDOW)
+        self._queue_ms: deque = deque(maxlen=STATS_WINDOW)
+        self._decode_ms: deque = deque(maxlen=STATS_WINDOW)
+
+        print(f"Loading {workers} decoder(s)...")
+        self.workers = []
+        for i in range(workers):
+            decoder = create_decoder(**(decoder_config or {}))
+            worker = threading.Thread(target=self._work, args=(decoder,), name=f"stt-worker-{i}", daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.server.service = self
+        self.host, self.port = self.server.server_address[:2]
+        self.url = f"http://{self.host}:{self.port}"
+
+    def _work(self, decoder):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            future, audio, enqueued = job
+            dequeued = time.perf_counter()
+            try:
+                text = transcribe_stream(audio, decoder)
+                future.set_result((text, (dequeued - enqueued) * 1000, (time.perf_counter() - dequeued) * 1000))
+            except Exception as e:
+                future.set_exception(e)
+
+    def submit(self, audio) -> Future:
+        """
+        Queue audio for transcription
+
+        Args:
+            audio: Iterable of WAV/PCM chunks
+
+        Returns:
+            Future resolving to (text, queue_ms, decode_ms)
+
+        Raises:
+            queue.Full: If the queue is at capacity
+        """
+        future: Future = Future()
+        self.jobs.put_nowait((future, audio, time.perf_counter()))
+        return future
+
+    def record(self, total_ms: float, queue_ms: Optional[float], decode_ms: Optional[float],
+               error: bool = False, rejected: bool = False):
+        with self._stats_lock:
+            self._requests += 1
+            if error:
+                self._errors += 1
+            if rejected:
+                self._rejected += 1
+            if queue_ms is not None:
+                self._total_ms.append(total_ms)
+                self._queue_ms.append(queue_ms)
+                self._decode_ms.append(decode_ms)
+
+    def health(self) -> Dict[str, Any]:
+        return {
+            "status": "ok",
+            "workers": len(self.workers),
+            "queue_depth": self.jobs.qsize(),
+            "uptime_s": round(time.time() - self.started_at, 1),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                "requests": self._requests,
+                "errors": self._errors,
+                "rejected": self._rejected,
+                "total_ms": summarize(list(self._total_ms)),
+                "queue_ms": summarize(list(self._queue_ms)),
+                "decode_ms": summarize(list(self._decode_ms)),
+            }
+
+    def serve_forever(self):
+        """
+        Handle requests until interrupted
+        """
+        print(f"STT service listening on {self.url}")
+        self.server.serve_forever()
+
+    def start(self) -> "SttService":
+        """
+        Handle requests on a background thread
+
+        Returns:
+            self
+        """
+        threading.Thread(target=self.server.serve_forever, name="stt-service", daemon=True).start()
+        return self
+
+    def shutdown(self):
+        """
+        Stop accepting requests and stop the workers
+        """
+        self.server.shutdown()
+        self.server.server_close()
+        for _ in self.workers:
+            self.jobs.put(None)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without this, keep-alive
+    # clients wait on Nagle + delayed ACK (~40 ms) for every response
+    disable_nagle_algorithm = True
+
+    @property
+    def service(self) -> SttService:
+        return self.server.service
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body: Dict[str, Any]):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, self.service.health())
+        elif self.path == "/stats":
+            self._send_json(200, self.service.stats())
+        else:
+            self._send_json(404, {"error": f"Unknown endpoint: {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/transcribe":
+            self._send_json(404, {"error": f"Unknown endpoint: {self.path}"})
+            return
+
+        started = time.perf_counter()
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.headers.get("Content-Type", "").startswith("application/json"):
+            try:
+                path = json.loads(body)["path"]
+                with open(path, 'rb') as f:
+                    body = f.read()
+            except (KeyError, ValueError, OSError) as e:
+                self.service.record(0, None, None, error=True)
+                self._send_json(400, {"error": f"Could not read audio: {e}"})
+                return
+
+        try:
+            future = self.service.submit([body])
+        except queue.Full:
+            self.service.record(0, None, None, rejected=True)
+            self._send_json(503, {"error": "Transcription queue is full"})
+            return
+
+        try:
+            text, queue_ms, decode_ms = future.result()
+        except Exception as e:
+            self.service.record(0, None, None, error=True)
+            self._send_json(500, {"error": str(e)})
+            return
+
+        total_ms = (time.perf_counter() - started) * 1000
+        self.service.record(total_ms, queue_ms, decode_ms)
+        self._send_json(200, {
+            "text": text,
+            "queue_ms": round(queue_ms, 3),
+            "decode_ms": round(decode_ms, 3),
+            "total_ms": round(total_ms, 3),
+        })
+
+
+class SttServiceClient:
+    def __init__(self, url: str = f"http://127.0.0.1:{DEFAULT_PORT}",
+                 transport: Optional[Transport] = None):
+        """
+        Initialize a client for a running SttService
+
+        Args:
+            url: Base URL of the service
+            transport: Connection pool to use (defaults to the shared pool)
+        """
+        self.url = url.rstrip('/')
+        self.transport = transport if transport is not None else get_shared_transport()
+
+    def transcribe(self, wav_file_path: str, timeout: float = 60.0) -> Dict[str, Any]:
+        """
+        Transcribe a local WAV file
+
+        Args:
+            wav_file_path: Path to the WAV file
+            timeout: Seconds to wait for the result
+
+        Returns:
+            Dict with text, queue_ms, decode_ms and total_ms
+        """
+        with open(wav_file_path, 'rb') as f:
+            response = self.transport.request("POST", f"{self.url}/transcribe", data=f,
+                                              headers={"Content-Type": "audio/wav"}, timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def health(self) -> Dict[str, Any]:
+        return self.transport.request("GET", f"{self.url}/health").json()
+
+    def stats(self) -> Dict[str, Any]:
+        return self.transport.request("GET", f"{self.url}/stats").json()
+
+    def is_available(self) -> bool:
+        """
+        Check whether the service is up
+
+        Returns:
+            True if /health answers
+        """
+        try:
+            return self.transport.request("GET", f"{self.url}/health", timeout=(0.5, 1.0)).ok
+        except requests.RequestException:
+            return False
+
+
+def main():
+    # ============ CONFIGURATION - CHANGE THESE ============
+    HOST = "127.0.0.1"
+    PORT = DEFAULT_PORT
+    WORKERS = 1
+
+    service = SttService(HOST, PORT, workers=WORKERS)
+    try:
+        service.serve_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down")
+        service.shutdown()
+
+
+if __name__ == "__main__":
+    main()
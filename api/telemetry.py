@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+"""
+Telemetry ring buffers for Misty
+Keeps recent battery, face-detection and device-state samples in fixed-size NumPy buffers,
+fed by the robot's event stream (or by polling), so control logic can ask windowed questions
+like "was a face present in the last 3 s" without a network round trip
+"""
+
+import threading
+import time
+from typing import Optional, Dict, Any, List, Callable, Sequence, Tuple
+
+import numpy as np
+import requests
+
+from api_client import APIClient
+from events import MistyEventStream
+
+DEFAULT_CAPACITY = 4096
+
+BATTERY_FIELDS = ("charge_percent", "voltage", "is_charging")
+FACE_FIELDS = ("distance", "bearing", "elevation", "confidence")
+DEVICE_FIELDS = ("online", "response_ms")
+
+
+class RingBuffer:
+    def __init__(self, fields: Sequence[str], capacity: int = DEFAULT_CAPACITY):
+        """
+        Fixed-size buffer of timestamped samples; the oldest sample is overwritten when full
+
+        Args:
+            fields: Names of the values stored with each sample
+            capacity: Samples kept
+        """
+        self.fields = tuple(fields)
+        self.capacity = capacity
+        # Monotonic seconds; empty slots are -inf so time-window masks never select them
+        self.times = np.full(capacity, -np.inf)
+        self.values = np.zeros((capacity, len(self.fields)))
+        self.count = 0
+        self.last_time = -np.inf
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def append(self, values: Sequence[float], t: Optional[float] = None):
+        """
+        Add a sample
+
+        Args:
+            values: One value per field, in field order
+            t: Monotonic timestamp (defaults to now)
+        """
+        t = time.monotonic() if t is None else t
+        with self._lock:
+            i = self._next
+            self.times[i] = t
+            self.values[i] = values
+            self._next = (i + 1) % self.capacity
+            self.count = min(self.count + 1, self.capacity)
+            if t > self.last_time:
+                self.last_time = t
+
+    def window(self, seconds: float, now: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Get the samples from the last `seconds`, oldest first
+
+        Args:
+            seconds: Window length
+            now: Monotonic time the window ends at (defaults to now)
+
+        Returns:
+            (times, values) copies; values has one column per field
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            mask = (self.times >= now - seconds) & (self.times <= now)
+            times = self.times[mask]
+            values = self.values[mask]
+        order = np.argsort(times, kind="stable")
+        return times[order], values[order]
+
+    def latest(self) -> Optional[Dict[str, float]]:
+        """
+        Get the newest sample
+
+        Returns:
+            Dict of field -> value plus 't', or None if the buffer is empty
+        """
+        with self._lock:
+            if not self.count:
+                return None
+            i = (self._next - 1) % self.capacity
+            sample = dict(zip(self.fields, self.values[i].tolist()))
+            sample["t"] = float(self.times[i])
+        return sample
+
+    def column(self, field: str) -> int:
+        try:
+            return self.fields.index(field)
+        except ValueError:
+            raise KeyError(f"Unknown field {field!r}, expected one of {self.fields}") from None
+
+
+class Telemetry:
+    def __init__(self, client: APIClient, events: Optional[MistyEventStream] = None,
+                 capacity: int = DEFAULT_CAPACITY, battery_interval_s: float = 5.0,
+                 device_interval_s: float = 5.0):
+        """
+        Initialize telemetry for one robot (call start() to begin collecting)
+
+        Args:
+            client: Client for the robot (used to start face detection and to poll)
+            events: Connected event stream; without one, battery is polled and
+                    face detection is unavailable (it has no REST endpoint to poll)
+            capacity: Samples kept per channel
+            battery_interval_s: Seconds between battery samples
+            device_interval_s: Seconds between /api/device polls (there is no device-state event)
+        """
+        self.client = client
+        self.events = events
+        self.capacity = capacity
+        self.battery_interval_s = battery_interval_s
+        self.device_interval_s = device_interval_s
+        self.channels: Dict[str, RingBuffer] = {
+            "battery": RingBuffer(BATTERY_FIELDS, capacity),
+            "face": RingBuffer(FACE_FIELDS, capacity),
+            "device": RingBuffer(DEVICE_FIELDS, capacity),
+        }
+        # Last /api/device result (names and versions aren't numeric, so they aren't buffered)
+        self.device_info: Dict[str, Any] = {}
+        self._subscriptions: List[str] = []
+        self._pollers: List[threading.Thread] = []
+        self._detecting_faces = False
+        self._stop = threading.Event()
+
+    def channel(self, name: str, fields: Sequence[str]) -> RingBuffer:
+        """
+        Get a channel, creating it on first use
+
+        Args:
+            name: Channel name
+            fields: Value names, used if the channel is created
+
+        Returns:
+            The channel's ring buffer
+        """
+        buffer = self.channels.get(name)
+        if buffer is None:
+            buffer = self.channels[name] = RingBuffer(fields, self.capacity)
+        return buffer
+
+    # ---- ingestion ----
+
+    def on_battery(self, message: Dict[str, Any]):
+        self.channels["battery"].append((
+            float(message.get("chargePercent") or 0.0),
+            float(message.get("voltage") or 0.0),
+            1.0 if message.get("isCharging") else 0.0,
+        ))
+
+    def on_face(self, message: Dict[str, Any]):
+        self.channels["face"].append((
+            float(message.get("distance") or 0.0),
+            float(message.get("bearing") or 0.0),
+            float(message.get("elevation") or 0.0),
+            float(message.get("confidence") or 0.0),
+        ))
+
+    def poll_device(self):
+        """
+        Take one device-state sample: whether /api/device answered, and how fast
+        """
+        started = time.perf_counter()
+        online = False
+        try:
+            # Past the client's response cache: a cached answer says nothing about the robot now
+            response = self.client.get("/api/device", cached=False)
+            online = response.ok
+            if online:
+                self.device_info = response.json().get("result") or {}
+        except (requests.RequestException, ValueError) as e:
+            self.client.log(f"Telemetry poll of /api/device failed: {e}")
+        self.channels["device"].append((1.0 if online else 0.0, (time.perf_counter() - started) * 1000))
+
+    def subscribe(self, event_type: str, callback: Callable[[Dict[str, Any]], None],
+                  debounce_ms: int = 100):
+        """
+        Feed a channel from a Misty event
+
+        Args:
+            event_type: Misty event type
+            callback: Called with each message on the event reader thread (keep it short)
+            debounce_ms: Minimum time between events from the robot
+        """
+        subscription = self.events.subscribe(event_type, callback=callback, debounce_ms=debounce_ms)
+        self._subscriptions.append(subscription.event_name)
+
+    def poll(self, endpoint: str, callback: Callable[[Dict[str, Any]], None], interval_s: float):
+        """
+        Feed a channel by polling a GET endpoint on a background thread
+
+        Args:
+            endpoint: API endpoint returning Misty's {"result": ...} reply
+            callback: Called with the result of each successful poll
+            interval_s: Seconds between polls
+        """
+        def sample():
+            try:
+                response = self.client.get(endpoint)
+                if response.ok:
+                    callback(response.json().get("result") or {})
+            except (requests.RequestException, ValueError) as e:
+                self.client.log(f"Telemetry poll of {endpoint} failed: {e}")
+
+        self._every(interval_s, sample, f"telemetry-poll{endpoint.replace('/', '-')}")
+
+    def _every(self, interval_s: float, sample: Callable[[], None], name: str):
+        def run():
+            while not self._stop.is_set():
+                sample()
+                self._stop.wait(interval_s)
+
+        thread = threading.Thread(target=run, name=name, daemon=True)
+        thread.start()
+        self._pollers.append(thread)
+
+    def start(self, battery: bool = True, faces: bool = True, device: bool = True) -> "Telemetry":
+        """
+        Start collecting
+
+        Args:
+            battery: Collect BatteryCharge events (or poll /api/battery without an event stream)
+            faces: Start face detection and collect FaceRecognition events
+            device: Poll /api/device for reachability and response time
+
+        Returns:
+            self
+        """
+        self._stop.clear()
+        if battery:
+            if self.events is not None:
+                self.subscribe("BatteryCharge", self.on_battery,
+                               debounce_ms=int(self.battery_interval_s * 1000))
+            else:
+                self.poll("/api/battery", self.on_battery, self.battery_interval_s)
+        if faces:
+            if self.events is None:
+                print("Warning: face telemetry needs an event stream, skipping it")
+            else:
+                self.subscribe("FaceRecognition", self.on_face)
+                self.client.post("/api/faces/detection/start")
+                self._detecting_faces = True
+        if device:
+            self._every(self.device_interval_s, self.poll_device, "telemetry-poll-device")
+        return self
+
+    def stop(self):
+        """
+        Unsubscribe, stop polling and stop face detection
+        """
+        self._stop.set()
+        for thread in self._pollers:
+            thread.join(timeout=1.0)
+        self._pollers = []
+        for name in self._subscriptions:
+            self.events.unsubscribe(name)
+        self._subscriptions = []
+        if self._detecting_faces:
+            self._detecting_faces = False
+            try:
+                self.client.post("/api/faces/detection/stop")
+            except requests.RequestException:
+                pass
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    # ---- queries (local, no network) ----
+
+    def latest(self, channel: str) -> Optional[Dict[str, float]]:
+        return self.channels[channel].latest()
+
+    def age_s(self, channel: str, now: Optional[float] = None) -> float:
+        """
+        Seconds since the newest sample of a channel (inf if it has none)
+        """
+        now = time.monotonic() if now is None else now
+        return now - self.channels[channel].last_time
+
+    def face_present(self, within_s: float = 3.0, now: Optional[float] = None) -> bool:
+        """
+        Check whether a face was seen recently
+
+        Args:
+            within_s: Window in seconds
+            now: Monotonic time the window ends at (defaults to now)
+
+        Returns:
+            True if any FaceRecognition sample falls in the window
+        """
+        return self.age_s("face", now) <= within_s
+
+    def device_online(self, within_s: float = 15.0, now: Optional[float] = None) -> bool:
+        """
+        Check whether the robot answered its latest device poll, if that was recent
+
+        Args:
+            within_s: How old the latest sample may be
+            now: Monotonic time the window ends at (defaults to now)
+
+        Returns:
+            True if the newest device sample is in the window and online
+        """
+        latest = self.channels["device"].latest()
+        return (latest is not None and latest["online"] == 1.0
+                and self.age_s("device", now) <= within_s)
+
+    def count(self, channel: str, within_s: float, now: Optional[float] = None) -> int:
+        times, _ = self.channels[channel].window(within_s, now)
+        return len(times)
+
+    def mean(self, channel: str, field: str, within_s: float, now: Optional[float] = None) -> Optional[float]:
+        """
+        Average one field over a window
+
+        Returns:
+            The mean, or None if the window has no samples
+        """
+        buffer = self.channels[channel]
+        _, values = buffer.window(within_s, now)
+        if not len(values):
+            return None
+        return float(values[:, buffer.column(field)].mean())
+
+    def trend(self, channel: str, field: str, within_s: float,
+              now: Optional[float] = None) -> Optional[float]:
+        """
+        Least-squares slope of one field over a window
+
+        Returns:
+            Change per second, or None with fewer than two samples
+        """
+        buffer = self.channels[channel]
+        times, values = buffer.window(within_s, now)
+        if len(times) < 2:
+            return None
+        t = times - times.mean()
+        denominator = float(np.dot(t, t))
+        if denominator == 0.0:
+            return None
+        y = values[:, buffer.column(field)]
+        return float(np.dot(t, y - y.mean()) / denominator)
+
+    def battery_trend(self, within_s: float = 600.0, now: Optional[float] = None) -> Optional[float]:
+        """
+        Battery charge change over a window
+
+        Returns:
+            Charge fraction per minute (negative while draining), or None if too few samples
+        """
+        slope = self.trend("battery", "charge_percent", within_s, now)
+        return slope * 60.0 if slope is not None else None
+
+
+def main():
+    # ============ CONFIGURATION - CHANGE THESE ============
+    BASE_URL = "http://192.168.0.111"  # Misty Robot IP Address
+    DURATION_S = 30
+
+    client = APIClient(BASE_URL, quiet=True)
+    events = MistyEventStream(BASE_URL)
+    try:
+        events.connect()
+    except Exception as e:
+        print(f"Could not open the event stream ({e}), polling the battery instead")
+        events = None
+
+    with Telemetry(client, events, battery_interval_s=2.0) as telemetry:
+        deadline = time.monotonic() + DURATION_S
+        while time.monotonic() < deadline:
+            time.sleep(1.0)
+            battery = telemetry.latest("battery")
+            trend = telemetry.battery_trend()
+            print(f"online: {telemetry.device_online()!s:<5}  "
+                  f"face in last 3 s: {telemetry.face_present(3.0)!s:<5}  "
+                  f"battery: {battery['charge_percent'] if battery else '?'}  "
+                  f"trend: {'?' if trend is None else f'{trend:+.4f}/min'}")
+
+    if events is not None:
+        events.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Tests for the fleet controller against a few local MistySimulators
+"""
+
+import time
+import unittest
+
+from fleet import Fleet, OFFLINE_AFTER_FAILURES
+from misty_simulator import MistySimulator
+
+LED = {"Red": 0, "Green": 255, "Blue": 0}
+
+
+class FleetTest(unittest.TestCase):
+    def setUp(self):
+        # Two fast rooms (one answering 503 to everything), one slow room and one that is switched off
+        self.simulators = [MistySimulator(latency_ms=5).start(),
+                           MistySimulator(latency_ms=5, failure_rate=1.0).start(),
+                           MistySimulator(latency_ms=1500).start()]
+        self.off = MistySimulator()
+        self.off.server.server_close()
+        self.fleet = Fleet({"fast": self.simulators[0].base_url,
+                            "failing": self.simulators[1].base_url,
+                            "slow": self.simulators[2].base_url,
+                            "off": self.off.base_url},
+                           connect_timeout=0.5)
+
+    def tearDown(self):
+        self.fleet.close()
+        for simulator in self.simulators:
+            simulator.stop()
+
+    def test_broadcast_does_not_wait_for_slow_robot(self):
+        started = time.perf_counter()
+        results = self.fleet.broadcast("POST", "/api/led", LED, timeout=0.3)
+        elapsed = time.perf_counter() - started
+
+        self.assertLess(elapsed, 1.0)
+        self.assertEqual(results["fast"].outcome, "ok")
+        self.assertEqual(results["failing"].status, 503)
+        self.assertEqual(results["slow"].outcome, "timeout")
+        self.assertEqual(results["off"].outcome, "error")
+
+    def test_unreachable_robot_goes_offline(self):
+        for _ in range(OFFLINE_AFTER_FAILURES):
+            self.assertTrue(self.fleet["off"].online)
+            self.fleet.send("off", "POST", "/api/led", LED)
+        self.assertFalse(self.fleet["off"].online)
+        self.assertEqual(self.fleet.broadcast("POST", "/api/led", LED, timeout=0.3)["off"].outcome,
+                         "offline")
+        # An HTTP error still means the robot is there
+        self.assertTrue(self.fleet["failing"].online)
+
+    def test_health_totals(self):
+        for _ in range(OFFLINE_AFTER_FAILURES - 1):
+            self.fleet.send("off", "GET", "/api/battery")
+        health = self.fleet.health(timeout=3.0)
+        robots = health["robots"]
+
+        self.assertEqual(health["total"], 4)
+        self.assertEqual(health["online"], 3)
+        self.assertEqual({name for name, r in robots.items() if r["online"]}, {"fast", "failing", "slow"})
+        for name, robot in self.fleet.robots.items():
+            self.assertEqual(robots[name]["online"], robot.online)
+        self.assertEqual(robots["failing"]["outcome"], "error")
+        self.assertIsNone(robots["failing"]["battery"])
+        self.assertEqual(health["lowest_battery"], robots["fast"]["battery"])
+        self.assertGreaterEqual(health["slowest_health_check_ms"], 1500)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Content-addressed cache of transcriptions
+Keyed by a hash of the audio bytes plus the decoder configuration, bounded in size with LRU eviction
+"""
+
+import hashlib
+import json
+import os
+import threading
+from typing import Optional, Dict, Any, List
+
+DEFAULT_CACHE_DIR = os.environ.get("MISTY_STT_CACHE", "./.stt_cache")
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+READ_CHUNK_SIZE = 64 * 1024
+# Other processes may write to the same directory: re-measure it every this many puts
+RESCAN_EVERY_PUTS = 100
+# Eviction frees down to this fraction of max_bytes, so it isn't needed again on the next put
+EVICT_TO_FRACTION = 0.9
+
+_signatures: Dict[str, Dict[str, Any]] = {}
+_signatures_lock = threading.Lock()
+
+
+def _model_stamp(path: str) -> List[Any]:
+    # Size and modification time of a model file, or of every file in a model directory
+    if os.path.isdir(path):
+        stamps = []
+        for name in sorted(os.listdir(path)):
+            stat = os.stat(os.path.join(path, name))
+            stamps.append([name, stat.st_size, stat.st_mtime_ns])
+        return stamps
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _pocketsphinx_version() -> Optional[str]:
+    from importlib.metadata import version, PackageNotFoundError
+    try:
+        return version("pocketsphinx")
+    except PackageNotFoundError:
+        return None
+
+
+def decoder_signature(decoder_config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Describe what a decoder configuration decodes with, for cache keys
+
+    Args:
+        decoder_config: Options the Decoder is created with ({} for the bundled models)
+
+    Returns:
+        The options, the pocketsphinx version and a stamp of every model file they name
+        (of the bundled models when they name none), so a changed model changes the key
+    """
+    config_json = json.dumps(decoder_config, sort_keys=True, default=str)
+    with _signatures_lock:
+        signature = _signatures.get(config_json)
+    if signature is not None:
+        return signature
+
+    import pocketsphinx
+
+    models = {name: value for name, value in decoder_config.items()
+              if isinstance(value, str) and os.path.exists(value)}
+    if not any(name in decoder_config for name in ("hmm", "lm", "dict", "jsgf", "kws")):
+        models["default"] = pocketsphinx.get_model_path()
+    signature = {
+        "options": decoder_config,
+        "pocketsphinx": _pocketsphinx_version(),
+        "models": {name: _model_stamp(path) for name, path in models.items()},
+    }
+    with _signatures_lock:
+        _signatures[config_json] = signature
+    return signature
+
+
+class TranscriptionCache:
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        """
+        Initialize a cache stored as one small JSON file per entry
+
+        Recency is tracked with file modification times, so several processes
+        (e.g. batch workers) can share one cache directory.
+
+        Args:
+            cache_dir: Directory to keep entries in (created if doesn't exist)
+            max_bytes: Total size the entries may take before the least recently used are evicted
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._total_bytes: Optional[int] = None
+        self._puts = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def audio_digest(audio_path: str) -> str:
+        """
+        Hash the bytes of an audio file
+
+        Args:
+            audio_path: Path to the audio file (its bytes are hashed, not its name)
+
+        Returns:
+            Hex SHA-256 digest
+        """
+        digest = hashlib.sha256()
+        with open(audio_path, 'rb') as f:
+            for block in iter(lambda: f.read(READ_CHUNK_SIZE), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    @staticmethod
+    def key(audio_digest: str, config: Dict[str, Any],
+            decoder_config: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Build the cache key for a recording and decoder configuration
+
+        Args:
+            audio_digest: Digest from TranscriptionCache.audio_digest()
+            config: How the audio is decoded (mode, grammar, ...)
+            decoder_config: Options the decoder is created with (default: the bundled
+                            models); folded in with decoder_signature()
+
+        Returns:
+            Hex SHA-256 key
+        """
+        config = dict(config, decoder=decoder_signature(decoder_config or {}))
+        digest = hashlib.sha256(audio_digest.encode())
+        digest.update(b"\0")
+        digest.update(json.dumps(config, sort_keys=True, default=str).encode())
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + ".json")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up an entry and mark it as recently used
+
+        Args:
+            key: Key from TranscriptionCache.key()
+
+        Returns:
+            The stored result, or None on a miss
+        """
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+            os.utime(path)
+        except (FileNotFoundError, json.JSONDecodeError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return entry
+
+    def put(self, key: str, result: Dict[str, Any]):
+        """
+        Store a result, evicting the least recently used entries if over the size bound
+
+        Args:
+            key: Key from TranscriptionCache.key()
+            result: JSON-serializable result (e.g. {"text": ...})
+        """
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(result, f)
+        replaced = os.path.getsize(path) if os.path.exists(path) else 0
+        size = os.path.getsize(tmp_path)
+        os.replace(tmp_path, path)
+
+        # Kept as a running total, so the directory is only scanned when it may be over the bound
+        with self._lock:
+            self._puts += 1
+            if self._total_bytes is not None:
+                self._total_bytes += size - replaced
+            scan = (self._total_bytes is None or self._total_bytes > self.max_bytes
+                    or self._puts % RESCAN_EVERY_PUTS == 0)
+        if scan:
+            self.evict()
+
+    def evict(self) -> int:
+        """
+        Remove least recently used entries once the cache is over max_bytes, down to
+        EVICT_TO_FRACTION of it
+
+        Returns:
+            Number of entries removed
+        """
+        entries = []
+        total = 0
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".json"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        removed = 0
+        if total > self.max_bytes:
+            for _, size, path in sorted(entries):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                removed += 1
+                total -= size
+                if total <= self.max_bytes * EVICT_TO_FRACTION:
+                    break
+        with self._lock:
+            self._total_bytes = total
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+_default_cache: Optional[TranscriptionCache] = None
+
+
+def get_default_cache() -> TranscriptionCache:
+    """
+    Get the cache used by wav_to_text and batch_transcribe (in $MISTY_STT_CACHE or ./.stt_cache)
+
+    Returns:
+        The process-wide cache
+    """
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = TranscriptionCache()
+    return _default_cache
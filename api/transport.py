@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Pooled HTTP transport shared by the Misty API clients
+Keeps connections to the robot alive between commands and puts a deadline on every call
+"""
+
+import threading
+import time
+import requests
+from dataclasses import dataclass
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+from typing import Optional, Tuple, Union
+
+# (connect, read) deadlines in seconds
+Timeout = Union[float, Tuple[float, float]]
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_CONNECT_TIMEOUT = 3.05
+DEFAULT_READ_TIMEOUT = 10.0
+
+# Only verbs that are safe to send twice are retried; a retried POST could
+# make Misty speak, drive or record a second time.
+IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "OPTIONS", "PUT", "DELETE"])
+
+
+@dataclass
+class RequestTiming:
+    connect_ms: float   # DNS + TCP connect; 0.0 when a pooled connection was reused
+    ttfb_ms: float      # From sending the request until the response headers arrived (includes connect)
+    total_ms: float     # Whole call; with stream=True the body is not included
+
+
+# Time spent opening connections during the current request on this thread
+_connect_time = threading.local()
+
+
+class _TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            _connect_time.ms = getattr(_connect_time, "ms", 0.0) + (time.perf_counter() - started) * 1000
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            _connect_time.ms = getattr(_connect_time, "ms", 0.0) + (time.perf_counter() - started) * 1000
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class Transport:
+    def __init__(self,
+                 pool_size: int = DEFAULT_POOL_SIZE,
+                 connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout: float = DEFAULT_READ_TIMEOUT,
+                 max_retries: int = 2,
+                 backoff_factor: float = 0.2):
+        """
+        Initialize a keep-alive connection pool
+
+        Args:
+            pool_size: Maximum number of connections kept open to each host
+            connect_timeout: Seconds to wait for the TCP connection to the robot
+            read_timeout: Seconds to wait for the robot to send a response
+            max_retries: Retries for idempotent verbs (GET/DELETE/...); POST is never retried
+            backoff_factor: Backoff between retries (0.2 -> 0.2s, 0.4s, 0.8s, ...)
+        """
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+
+        retry = Retry(
+            total=max_retries,
+            connect=max_retries,
+            read=max_retries,
+            status=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=IDEMPOTENT_METHODS,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size,
+                              max_retries=retry, pool_block=False)
+        adapter.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
+
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        # Same connections, no retries: for callers whose deadline must cover the whole call
+        single = HTTPAdapter(max_retries=0)
+        single.poolmanager = adapter.poolmanager
+        self._single_session = requests.Session()
+        self._single_session.mount("http://", single)
+        self._single_session.mount("https://", single)
+
+    def request(self, method: str, url: str, timeout: Optional[Timeout] = None,
+                retry: bool = True, **kwargs) -> requests.Response:
+        """
+        Send a request over the pooled session
+
+        Args:
+            method: HTTP verb ('GET', 'POST', 'DELETE', ...)
+            url: Full request URL
+            timeout: Per-call deadline, either seconds or a (connect, read) tuple
+                     (defaults to the transport's deadlines)
+            retry: Retry idempotent verbs; when False the timeout bounds the whole call
+                   instead of each attempt
+            **kwargs: Passed through to requests (params, json, headers, stream, ...)
+
+        Returns:
+            Response object, with a RequestTiming in response.timing
+        """
+        if timeout is None:
+            timeout = self.timeout
+        _connect_time.ms = 0.0
+        started = time.perf_counter()
+        session = self.session if retry else self._single_session
+        response = session.request(method, url, timeout=timeout, **kwargs)
+        response.timing = RequestTiming(
+            connect_ms=_connect_time.ms,
+            ttfb_ms=response.elapsed.total_seconds() * 1000,
+            total_ms=(time.perf_counter() - started) * 1000,
+        )
+        return response
+
+    def close(self):
+        """
+        Close all pooled connections
+        """
+        self.session.close()
+        self._single_session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+_shared_transport: Optional[Transport] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_transport() -> Transport:
+    """
+    Get the process-wide transport, creating it on first use
+
+    Returns:
+        Transport shared by every APIClient that was not given its own
+    """
+    global _shared_transport
+    with _shared_lock:
+        if _shared_transport is None:
+            _shared_transport = Transport()
+        return _shared_transport
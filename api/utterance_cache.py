@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Pre-synthesized utterance cache for scripted speech
+Renders known phrases to audio assets on the robot once (TTS with SaveToFile) and lets
+APIClient.speak() play them with /api/audio/play instead of synthesizing them every time
+"""
+
+import hashlib
+import json
+import threading
+import time
+from typing import Optional, Dict, Any, Iterable, Callable, Set
+
+# Asset name prefix for rendered utterances, so they can be told apart from other audio
+UTTERANCE_PREFIX = "tts_"
+
+# /api/tts/speak parameters that change how an utterance sounds
+VOICE_PARAMS = ("Voice", "Pitch", "SpeechRate", "Language")
+
+
+def _asset_name(entry: Any) -> str:
+    # /api/audio/list entries are plain names or dicts (same as recording_sync.recording_name,
+    # which can't be imported here without a cycle through audio_api_client)
+    if isinstance(entry, str):
+        return entry
+    return entry.get('name', entry.get('fileName', ''))
+
+
+class UtteranceCache:
+    def __init__(self, voice: Optional[Dict[str, Any]] = None, warm_on_miss: bool = True,
+                 prefix: str = UTTERANCE_PREFIX, confirm_timeout_s: float = 10.0):
+        """
+        Initialize an utterance cache for one robot (pass it to APIClient as utterances=)
+
+        Each phrase is stored as an asset named after a hash of its text and voice settings,
+        so the same line with a different voice is a different asset and nothing needs to be
+        remembered locally: the robot's audio listing is the index.
+
+        Args:
+            voice: Default voice settings (Voice, Pitch, SpeechRate, Language) for every phrase
+            warm_on_miss: When a phrase isn't cached, ask the robot to save the audio while it
+                          speaks it live, so the next time it is played from the asset
+            prefix: Asset name prefix for rendered utterances
+            confirm_timeout_s: How long after a render to keep watching the robot's listing for it
+        """
+        self.voice = {k: v for k, v in (voice or {}).items() if k in VOICE_PARAMS}
+        self.warm_on_miss = warm_on_miss
+        self.prefix = prefix
+        self.confirm_timeout_s = confirm_timeout_s
+        self.hits = 0
+        self.misses = 0
+        self.fallbacks = 0
+        self.rendered = 0
+        self._ready: set = set()
+        # Filename -> monotonic time its render was claimed
+        self._pending: Dict[str, float] = {}
+        self._watching = False
+        self._lock = threading.Lock()
+
+    def speak_params(self, text: str, voice: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Build the /api/tts/speak body for a phrase
+
+        Args:
+            text: Text to speak
+            voice: Voice settings overriding the cache's defaults
+
+        Returns:
+            Request body
+        """
+        params = dict(self.voice)
+        params.update({k: v for k, v in (voice or {}).items() if k in VOICE_PARAMS})
+        params["Text"] = text
+        return params
+
+    def utterance_id(self, text: str, voice: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Get the asset name (without extension) a phrase is rendered under
+
+        Args:
+            text: Text to speak
+            voice: Voice settings overriding the cache's defaults
+
+        Returns:
+            Name derived from the normalized text and the voice settings
+        """
+        params = self.speak_params(" ".join(text.split()), voice)
+        digest = hashlib.sha1(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()
+        return f"{self.prefix}{digest[:16]}"
+
+    def filename(self, text: str, voice: Optional[Dict[str, Any]] = None) -> str:
+        return self.utterance_id(text, voice) + ".wav"
+
+    def lookup(self, filename: str) -> bool:
+        """
+        Check whether a rendered utterance is on the robot (a hit is only counted once
+        it has played, see record_hit)
+
+        Args:
+            filename: Name from filename()
+
+        Returns:
+            True if it can be played
+        """
+        with self._lock:
+            if filename in self._ready:
+                return True
+            self.misses += 1
+            return False
+
+    def record_hit(self):
+        with self._lock:
+            self.hits += 1
+
+    def claim(self, filename: str) -> bool:
+        """
+        Reserve a phrase for rendering, so it is only rendered once when spoken concurrently
+
+        Returns:
+            True if the caller should render it
+        """
+        with self._lock:
+            if filename in self._ready or filename in self._pending:
+                return False
+            self._pending[filename] = time.monotonic()
+            return True
+
+    def release(self, filename: str):
+        """
+        Give up a claim without the phrase becoming ready (e.g. the render request failed)
+        """
+        with self._lock:
+            self._pending.pop(filename, None)
+
+    def mark_ready(self, filename: str):
+        with self._lock:
+            self._pending.pop(filename, None)
+            if filename not in self._ready:
+                self._ready.add(filename)
+                self.rendered += 1
+
+    def forget(self, filename: str):
+        """
+        Drop a phrase the robot no longer has (e.g. playing it returned 404); it is spoken live instead
+        """
+        with self._lock:
+            self._ready.discard(filename)
+            self.fallbacks += 1
+            self.misses += 1
+
+    def pending(self) -> Set[str]:
+        with self._lock:
+            return set(self._pending)
+
+    def expire(self, timeout_s: float) -> Set[str]:
+        """
+        Give up renders that haven't shown up in the listing within timeout_s of being claimed
+
+        Returns:
+            Filenames given up
+        """
+        cutoff = time.monotonic() - timeout_s
+        with self._lock:
+            expired = {name for name, claimed in self._pending.items() if claimed <= cutoff}
+            for name in expired:
+                del self._pending[name]
+        return expired
+
+    def watch(self, confirm: Callable[[], Any]):
+        """
+        Run confirm on the cache's background worker until nothing is pending, starting
+        the worker unless it is already running (one per cache, however many renders)
+
+        Args:
+            confirm: Waits for pending renders, e.g. APIClient.confirm_utterances
+        """
+        with self._lock:
+            if self._watching:
+                return
+            self._watching = True
+        threading.Thread(target=self._watch, args=(confirm,), name="utterance-confirm", daemon=True).start()
+
+    def _watch(self, confirm: Callable[[], Any]):
+        try:
+            while True:
+                confirm()
+                with self._lock:
+                    # Decided and cleared under one lock, so a render claimed after this restarts the worker
+                    if not self._pending:
+                        self._watching = False
+                        return
+        except BaseException:
+            with self._lock:
+                self._watching = False
+            raise
+
+    def load_listing(self, listing: Iterable[Any]) -> int:
+        """
+        Replace the set of ready utterances with the robot's current audio listing
+
+        Args:
+            listing: Entries from /api/audio/list
+
+        Returns:
+            Number of rendered utterances on the robot
+        """
+        names = {name for name in map(_asset_name, listing)
+                 if name.startswith(self.prefix) and name.endswith(".wav")}
+        with self._lock:
+            self.rendered += len(self._pending.keys() & names)
+            self._ready = names
+            for name in names:
+                self._pending.pop(name, None)
+        return len(names)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "ready": len(self._ready),
+            "pending": len(self._pending),
+            "hits": self.hits,
+            "misses": self.misses,
+            "fallbacks": self.fallbacks,
+            "rendered": self.rendered,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+def main():
+    # Imported here: api_client imports this module
+    from api_client import APIClient
+    from misty_simulator import MistySimulator
+
+    # ============ CONFIGURATION - CHANGE THESE ============
+    BASE_URL = None                # None = run against a local simulator; or "http://192.168.0.111"
+    PHRASES = [
+        "Hi! What can I get for you today?",
+        "Excellent choice!",
+        "Would you like to add a drink with that?",
+    ]
+
+    simulator = None
+    base_url = BASE_URL
+    if base_url is None:
+        # Synthesis on the robot is the slow part; playing a stored clip is not
+        simulator = MistySimulator(latency_ms=10, endpoint_latency_ms={"/api/tts/speak": 350}).start()
+        base_url = simulator.base_url
+
+    try:
+        client = APIClient(base_url, quiet=True, utterances=UtteranceCache())
+        for text in PHRASES:
+            started = time.perf_counter()
+            client.post("/api/tts/speak", data={"Text": text})
+            live_ms = (time.perf_counter() - started) * 1000
+            print(f"live TTS    {live_ms:7.1f} ms  {text!r}")
+
+        client.warm_utterances(PHRASES)
+        for text in PHRASES:
+            started = time.perf_counter()
+            client.speak(text)
+            print(f"cached play {(time.perf_counter() - started) * 1000:7.1f} ms  {text!r}")
+        print(client.utterances.stats())
+    finally:
+        if simulator is not None:
+            simulator.stop()
+
+
+if __name__ == "__main__":
+    main()
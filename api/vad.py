@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Voice-activity segmentation with NumPy
+Splits a recording into speech segments so silence is never sent to the decoder
+"""
+
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Optional, Dict, Any, List, Tuple
+
+import numpy as np
+
+from audio_ingest import DECODER_SAMPLE_RATE, WavFile
+
+
+@dataclass
+class Segment:
+    start_s: float
+    end_s: float
+    start_sample: int
+    end_sample: int
+
+    @property
+    def duration_s(self) -> float:
+        return self.end_s - self.start_s
+
+
+def frame_features(samples: np.ndarray, sample_rate: int, frame_ms: int = 30) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Per-frame log energy and zero-crossing rate
+
+    Args:
+        samples: Mono PCM samples
+        sample_rate: Samples per second
+        frame_ms: Frame length in milliseconds
+
+    Returns:
+        (energy in dBFS, zero-crossing rate in crossings per sample) for each whole frame
+    """
+    frame_len = max(1, sample_rate * frame_ms // 1000)
+    n_frames = len(samples) // frame_len
+    if n_frames == 0:
+        return np.zeros(0), np.zeros(0)
+
+    frames = samples[:n_frames * frame_len].reshape(n_frames, frame_len).astype(np.float32) / 32768.0
+    energy_db = 10.0 * np.log10(np.mean(frames * frames, axis=1) + 1e-10)
+    signs = np.signbit(frames)
+    zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / float(frame_len - 1 or 1)
+    return energy_db, zcr
+
+
+def detect_speech(samples: np.ndarray, sample_rate: int,
+                  frame_ms: int = 30,
+                  threshold_db: Optional[float] = None,
+                  margin_db: float = 10.0,
+                  zcr_threshold: float = 0.25,
+                  min_speech_ms: int = 150,
+                  min_silence_ms: int = 300,
+                  padding_ms: int = 150) -> List[Segment]:
+    """
+    Find the speech segments in a recording
+
+    A frame is speech if its energy is well above the noise floor, or if it is
+    moderately loud with a high zero-crossing rate (unvoiced sounds like "s" and "f").
+    Gaps shorter than min_silence_ms are bridged, segments shorter than
+    min_speech_ms are dropped, and each segment is padded so word edges are kept.
+
+    Args:
+        samples: Mono 16-bit PCM samples
+        sample_rate: Samples per second
+        frame_ms: Analysis frame length in milliseconds
+        threshold_db: Fixed energy threshold in dBFS (default: noise floor + margin_db)
+        margin_db: How far above the estimated noise floor speech must be
+        zcr_threshold: Zero-crossing rate that marks a quieter frame as unvoiced speech
+        min_speech_ms: Shortest segment to keep
+        min_silence_ms: Shortest pause that splits two segments
+        padding_ms: Audio kept before and after each segment
+
+    Returns:
+        Speech segments in time order
+    """
+    energy_db, zcr = frame_features(samples, sample_rate, frame_ms)
+    if len(energy_db) == 0:
+        return []
+
+    if threshold_db is None:
+        # The quietest tenth of the recording is a good estimate of the room noise
+        threshold_db = np.percentile(energy_db, 10) + margin_db
+    speech = (energy_db > threshold_db) | ((energy_db > threshold_db - margin_db / 2) & (zcr > zcr_threshold))
+
+    # Bridge short pauses: a silent run shorter than min_silence_ms between speech frames becomes speech
+    gap_frames = max(1, min_silence_ms // frame_ms)
+    starts, ends = _runs(speech)
+    if len(starts) > 1:
+        short_gaps = (starts[1:] - ends[:-1]) < gap_frames
+        keep_start = np.concatenate(([True], ~short_gaps))
+        keep_end = np.concatenate((~short_gaps, [True]))
+        starts, ends = starts[keep_start], ends[keep_end]
+
+    min_frames = max(1, min_speech_ms // frame_ms)
+    long_enough = (ends - starts) >= min_frames
+    starts, ends = starts[long_enough], ends[long_enough]
+
+    frame_len = max(1, sample_rate * frame_ms // 1000)
+    pad = sample_rate * padding_ms // 1000
+    start_samples = np.maximum(starts * frame_len - pad, 0)
+    end_samples = np.minimum(ends * frame_len + pad, len(samples))
+
+    segments = []
+    for start, end in zip(start_samples.tolist(), end_samples.tolist()):
+        # Padding can make neighbours overlap; merge them
+        if segments and start <= segments[-1].end_sample:
+            segments[-1].end_sample = end
+            segments[-1].end_s = end / sample_rate
+        else:
+            segments.append(Segment(start / sample_rate, end / sample_rate, start, end))
+    return segments
+
+
+def _runs(mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # Start (inclusive) and end (exclusive) indices of each run of True
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+# Decoder processes kept across calls, so the models are loaded once per worker, not per file
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def get_pool(max_workers: int) -> ProcessPoolExecutor:
+    """
+    Get the module's segment-decoding process pool, starting it on first use
+
+    Args:
+        max_workers: Number of decoder processes (a different number replaces the pool)
+
+    Returns:
+        Pool whose workers each hold a loaded decoder
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != max_workers:
+            from batch_transcribe import _init_worker
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=({},))
+            _pool_workers = max_workers
+        return _pool
+
+
+def _decode_segment(pcm: bytes) -> Optional[str]:
+    from speech_to_text import get_decoder, transcribe_stream
+    return transcribe_stream([pcm], get_decoder())
+
+
+def transcribe_with_vad(wav_file_path: str, max_workers: int = 0,
+                        executor: Optional[Executor] = None,
+                        **vad_options) -> List[Dict[str, Any]]:
+    """
+    Transcribe only the speech segments of a recording
+
+    Args:
+        wav_file_path: Path to a WAV file (any PCM/float format; converted to 16 kHz mono)
+        max_workers: Decode segments on this many worker processes (0 decodes in this process);
+                     the pool is kept for later calls
+        executor: Decode segments on this pool instead; its workers must have run
+                  batch_transcribe._init_worker
+        **vad_options: Passed to detect_speech (threshold_db, min_silence_ms, ...)
+
+    Returns:
+        One dict per segment with start_s, end_s and text
+    """
+    with WavFile(wav_file_path) as wav:
+        samples = wav.read_pcm16(DECODER_SAMPLE_RATE)
+    sample_rate = DECODER_SAMPLE_RATE
+    segments = detect_speech(samples, sample_rate, **vad_options)
+    speech_s = sum(segment.duration_s for segment in segments)
+    print(f"Found {len(segments)} speech segment(s), {speech_s:.1f}s of {len(samples) / sample_rate:.1f}s")
+
+    pcm = [samples[s.start_sample:s.end_sample].tobytes() for s in segments]
+    if (executor is not None or max_workers) and len(segments) > 1:
+        from batch_transcribe import transcribe_pcm
+        pool = executor if executor is not None else get_pool(max_workers)
+        texts = list(pool.map(transcribe_pcm, pcm))
+    else:
+        texts = [_decode_segment(chunk) for chunk in pcm]
+
+    return [{"start_s": round(s.start_s, 3), "end_s": round(s.end_s, 3), "text": text}
+            for s, text in zip(segments, texts)]